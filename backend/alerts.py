@@ -0,0 +1,411 @@
+"""
+伺服器端警示規則引擎 — 以 (ticker, 欄位) 建索引，只評估受變動影響的規則。
+
+規則 = 「ticker 的 field 與 value（常數）或 ref（同一檔的另一欄位）比較」，例如：
+    close  >  ref=avwap           收盤站上 AVWAP
+    signal == "滿分買進"           訊號變成滿分買進
+    rsi    <= 30                  RSI 超賣
+    close  <= ref=stop_loss       跌破停損價
+觸發採邊緣觸發：條件由不成立變成成立時送出一次事件；建立規則時只記錄當下狀態、不觸發。
+
+資料來源：watch_hub 的背景輪詢。規則涉及的代號會釘選進 hub 的輪詢清單，
+hub 每輪算出的欄位變動（diff）交給 on_changes()；以索引找出「有欄位變動」的規則，
+評估成本與變動數成正比，與規則總數無關。
+
+送達：每位 owner 的事件環狀緩衝（/api/alerts/events 輪詢）、SSE（/api/alerts/stream），
+規則可另指定 webhook，由單一背景執行緒送出。webhook 以 urlsplit 解析後比對
+ALERT_WEBHOOK_ORIGINS（scheme + 主機名 + 連接埠；未寫連接埠者不限），含帳密（userinfo）者拒絕。
+
+owner 只是用戶端自訂的字串，無法據以限額；因此上限是全域的：
+規則總數 MAX_RULES、釘選進 watch_hub 輪詢的不同代號數 MAX_ALERT_TICKERS。
+
+規則存於 SQLite（ALERTS_DB_PATH，預設為本模組目錄下的 alerts.db），啟動時載入索引。
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import itertools
+import json
+import operator
+import os
+import queue
+import sqlite3
+import threading
+from collections import defaultdict, deque
+from dataclasses import asdict, dataclass, field
+from urllib.parse import urlsplit
+
+import requests
+
+import watch_hub
+
+ALERTS_DB = os.environ.get("ALERTS_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "alerts.db"))
+ALERT_WEBHOOK_ORIGINS = tuple(
+    o.strip() for o in os.environ.get("ALERT_WEBHOOK_ORIGINS", "http://localhost,http://127.0.0.1,http://[::1]").split(",")
+    if o.strip()
+)
+WEBHOOK_SCHEMES = ("http", "https")
+EVENT_BUFFER = 200          # 每位 owner 保留的最近事件數
+MAX_RULES = int(os.environ.get("ALERT_MAX_RULES", "2000"))
+MAX_ALERT_TICKERS = int(os.environ.get("ALERT_MAX_TICKERS", "200"))   # 釘選進 watch_hub 的不同代號數
+WEBHOOK_TIMEOUT = 5
+
+NUMERIC_FIELDS = ("close", "avwap", "zscore", "td_count", "rsi", "atr", "stop_loss",
+                  "rr_ratio", "ema8", "ema21", "macd_hist", "net_buy", "score")
+TEXT_FIELDS = ("signal",)
+OPS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+       "==": operator.eq, "!=": operator.ne}
+
+
+@dataclass
+class Rule:
+    id: int
+    owner: str
+    ticker: str
+    field: str
+    op: str
+    value: float | str | None = None
+    ref: str | None = None
+    webhook: str | None = None
+    created_at: str = ""
+
+    @property
+    def fields(self) -> tuple[str, ...]:
+        return (self.field, self.ref) if self.ref else (self.field,)
+
+    def check(self, row: dict) -> bool | None:
+        """條件是否成立；欄位缺值（None）時回傳 None（狀態未知，不觸發也不重設）。"""
+        left = row.get(self.field)
+        right = row.get(self.ref) if self.ref else self.value
+        if left is None or right is None:
+            return None
+        return bool(OPS[self.op](left, right))
+
+    def describe(self) -> str:
+        target = self.ref if self.ref else self.value
+        return f"{self.ticker} {self.field} {self.op} {target}"
+
+
+# ──────────────────────────────────────────
+# 規則儲存（SQLite）
+# ──────────────────────────────────────────
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(ALERTS_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_store() -> None:
+    conn = _connect()
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alert_rules (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            owner      TEXT NOT NULL,
+            ticker     TEXT NOT NULL,
+            field      TEXT NOT NULL,
+            op         TEXT NOT NULL,
+            value      TEXT,
+            ref        TEXT,
+            webhook    TEXT,
+            created_at TEXT NOT NULL
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alert_rules_owner ON alert_rules (owner)")
+    conn.commit()
+    conn.close()
+
+
+def _load_rules() -> list[Rule]:
+    init_store()
+    conn = _connect()
+    rows = conn.execute(
+        "SELECT id, owner, ticker, field, op, value, ref, webhook, created_at FROM alert_rules"
+    ).fetchall()
+    conn.close()
+    return [Rule(r[0], r[1], r[2], r[3], r[4], json.loads(r[5]) if r[5] else None, r[6], r[7], r[8]) for r in rows]
+
+
+def _insert_rule(rule: Rule) -> int:
+    init_store()
+    conn = _connect()
+    cur = conn.execute(
+        "INSERT INTO alert_rules (owner, ticker, field, op, value, ref, webhook, created_at) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (rule.owner, rule.ticker, rule.field, rule.op,
+         json.dumps(rule.value, ensure_ascii=False) if rule.value is not None else None,
+         rule.ref, rule.webhook, rule.created_at),
+    )
+    conn.commit()
+    rule_id = int(cur.lastrowid)
+    conn.close()
+    return rule_id
+
+
+def _delete_rule(rule_id: int) -> None:
+    conn = _connect()
+    conn.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id,))
+    conn.commit()
+    conn.close()
+
+
+def _origin(url: str) -> tuple[str, str, int | None]:
+    """URL → (scheme, 主機名, 連接埠 | None)；含帳密、缺主機或連接埠不合法時拋 ValueError。"""
+    parts = urlsplit(url.strip())
+    if parts.username is not None or parts.password is not None:
+        raise ValueError("webhook 不可包含帳號密碼")
+    if not parts.hostname:
+        raise ValueError("webhook 需為完整網址")
+    return parts.scheme.lower(), parts.hostname, parts.port   # port 不合法時 urlsplit 拋 ValueError
+
+
+def _webhook_allowed(url: str) -> bool:
+    try:
+        scheme, host, port = _origin(url)
+    except ValueError:
+        return False
+    if scheme not in WEBHOOK_SCHEMES:
+        return False
+    for allowed in ALERT_WEBHOOK_ORIGINS:
+        try:
+            a_scheme, a_host, a_port = _origin(allowed)
+        except ValueError:
+            continue
+        if scheme == a_scheme and host == a_host and (a_port is None or port == a_port):
+            return True
+    return False
+
+
+def validate(ticker: str, field: str, op: str, value=None, ref: str | None = None,
+             webhook: str | None = None) -> tuple[float | str | None, str | None]:
+    """檢查規則參數；回傳正規化後的 (value, ref)，不合法時拋 ValueError。"""
+    if not ticker:
+        raise ValueError("ticker 不可為空")
+    if webhook and not _webhook_allowed(webhook):
+        raise ValueError(f"webhook 只允許 {', '.join(ALERT_WEBHOOK_ORIGINS)}（不可含帳號密碼）")
+    if op not in OPS:
+        raise ValueError(f"op 需為 {' '.join(OPS)} 之一")
+    if (value is None) == (ref is None):
+        raise ValueError("value 與 ref 需擇一指定")
+    if field in TEXT_FIELDS:
+        if op not in ("==", "!="):
+            raise ValueError(f"{field} 只支援 == / !=")
+        if ref is not None:
+            raise ValueError(f"{field} 只能與常數比較")
+        return str(value), None
+    if field not in NUMERIC_FIELDS:
+        raise ValueError(f"不支援的欄位: {field}")
+    if ref is not None:
+        if ref not in NUMERIC_FIELDS:
+            raise ValueError(f"不支援的欄位: {ref}")
+        return None, ref
+    try:
+        return float(value), None
+    except (TypeError, ValueError):
+        raise ValueError("value 需為數字") from None
+
+
+# ──────────────────────────────────────────
+# 引擎
+# ──────────────────────────────────────────
+
+@dataclass(eq=False)
+class _Stream:
+    owner: str
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=watch_hub.QUEUE_SIZE))
+
+
+class AlertEngine:
+    def __init__(self, hub: watch_hub.WatchHub | None = None):
+        self.hub = hub
+        self.rules: dict[int, Rule] = {}
+        self.index: dict[tuple[str, str], set[int]] = defaultdict(set)   # (ticker, 欄位) → 規則 id
+        self.state: dict[int, bool | None] = {}                            # 規則上次的條件結果
+        self.rows: dict[str, dict] = {}                                     # 各檔最新欄位
+        self.events: dict[str, deque] = defaultdict(lambda: deque(maxlen=EVENT_BUFFER))
+        self.streams: dict[str, set[_Stream]] = defaultdict(set)
+        self._seq = itertools.count(1)
+        self._lock = threading.Lock()
+        self._webhooks: queue.Queue = queue.Queue()
+        self._webhook_thread: threading.Thread | None = None
+        self._loaded = False
+
+    # ── 規則 ─────────────────────────────
+    def load(self) -> None:
+        with self._lock:
+            if self._loaded:
+                return
+            for rule in _load_rules():
+                self._index_rule(rule)
+            self._loaded = True
+        self._pin()
+
+    def _index_rule(self, rule: Rule) -> None:
+        self.rules[rule.id] = rule
+        for f in rule.fields:
+            self.index[(rule.ticker, f)].add(rule.id)
+        row = self.rows.get(rule.ticker)
+        self.state[rule.id] = rule.check(row) if row else None
+
+    def add_rule(self, owner: str, ticker: str, field: str, op: str, value=None,
+                 ref: str | None = None, webhook: str | None = None) -> Rule:
+        self.load()
+        value, ref = validate(ticker, field, op, value, ref, webhook)
+        rule = Rule(0, owner, ticker, field, op, value, ref, webhook,
+                    datetime.datetime.now().isoformat(timespec="seconds"))
+        # 檢查上限與寫入在同一個鎖內，並行新增不會超額
+        with self._lock:
+            if len(self.rules) >= MAX_RULES:
+                raise ValueError(f"規則總數已達上限 {MAX_RULES}")
+            tickers = {r.ticker for r in self.rules.values()}
+            if ticker not in tickers and len(tickers) >= MAX_ALERT_TICKERS:
+                raise ValueError(f"警示涵蓋的代號已達上限 {MAX_ALERT_TICKERS} 檔")
+            rule.id = _insert_rule(rule)
+            self._index_rule(rule)
+        self._pin()
+        return rule
+
+    def remove_rule(self, rule_id: int, owner: str) -> bool:
+        self.load()
+        with self._lock:
+            rule = self.rules.get(rule_id)
+            if rule is None or rule.owner != owner:
+                return False
+            del self.rules[rule_id]
+            self.state.pop(rule_id, None)
+            for f in rule.fields:
+                ids = self.index.get((rule.ticker, f))
+                if ids is not None:
+                    ids.discard(rule_id)
+                    if not ids:
+                        del self.index[(rule.ticker, f)]
+        _delete_rule(rule_id)
+        self._pin()
+        return True
+
+    def list_rules(self, owner: str) -> list[dict]:
+        self.load()
+        with self._lock:
+            return [asdict(r) for r in self.rules.values() if r.owner == owner]
+
+    def tickers(self) -> list[str]:
+        with self._lock:
+            return list(dict.fromkeys(r.ticker for r in self.rules.values()))
+
+    def _pin(self) -> None:
+        """規則涉及的代號釘選進 watch_hub 的輪詢清單。"""
+        if self.hub is not None:
+            self.hub.pin("alerts", self.tickers())
+
+    # ── 評估 ─────────────────────────────
+    def on_changes(self, changes: dict[str, dict], results: dict[str, dict]) -> None:
+        """watch_hub 每輪的變動：只評估索引中與變動欄位相關的規則。"""
+        fired: list[tuple[Rule, dict]] = []
+        with self._lock:
+            for ticker, diff in changes.items():
+                if ticker not in results or results[ticker].get("error"):
+                    continue  # 掃描失敗的一輪不評估，保留上次狀態
+                self.rows[ticker] = results[ticker]
+                affected = set()
+                for f in diff:
+                    affected |= self.index.get((ticker, f), set())
+                for rule_id in affected:
+                    rule = self.rules[rule_id]
+                    now = rule.check(results[ticker])
+                    before = self.state.get(rule_id)
+                    if now is None:
+                        continue
+                    self.state[rule_id] = now
+                    if now and before is False:
+                        fired.append((rule, results[ticker]))
+            events = [self._event(rule, row) for rule, row in fired]
+        for rule, event in zip((r for r, _ in fired), events):
+            self._deliver(rule, event)
+
+    def _event(self, rule: Rule, row: dict) -> dict:
+        event = {
+            "id": next(self._seq),
+            "rule_id": rule.id,
+            "owner": rule.owner,
+            "ticker": rule.ticker,
+            "name": row.get("name"),
+            "rule": rule.describe(),
+            "field": rule.field,
+            "actual": row.get(rule.field),
+            "target": row.get(rule.ref) if rule.ref else rule.value,
+            "at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        self.events[rule.owner].append(event)
+        return event
+
+    # ── 送達 ─────────────────────────────
+    def _deliver(self, rule: Rule, event: dict) -> None:
+        with self._lock:
+            streams = list(self.streams.get(rule.owner, ()))
+        for stream in streams:
+            self._send(stream, event)
+        if rule.webhook:
+            self._webhooks.put((rule.webhook, event))
+            self._ensure_webhook_thread()
+
+    def _send(self, stream: _Stream, event: dict) -> None:
+        def put() -> None:
+            try:
+                stream.queue.put_nowait(event)
+            except asyncio.QueueFull:
+                pass  # 太慢的連線丟事件；仍可由 /api/alerts/events 補
+        try:
+            stream.loop.call_soon_threadsafe(put)
+        except RuntimeError:
+            with self._lock:
+                self.streams[stream.owner].discard(stream)
+
+    def _post_webhooks(self) -> None:
+        while True:
+            url, event = self._webhooks.get()
+            try:
+                requests.post(url, json=event, timeout=WEBHOOK_TIMEOUT)
+            except Exception:
+                pass
+
+    def _ensure_webhook_thread(self) -> None:
+        with self._lock:
+            if self._webhook_thread is None:
+                self._webhook_thread = threading.Thread(target=self._post_webhooks, name="alert-webhooks", daemon=True)
+                self._webhook_thread.start()
+
+    def recent_events(self, owner: str, since: int = 0) -> list[dict]:
+        with self._lock:
+            return [e for e in self.events.get(owner, ()) if e["id"] > since]
+
+    def subscribe(self, owner: str, loop: asyncio.AbstractEventLoop) -> _Stream:
+        stream = _Stream(owner, loop)
+        with self._lock:
+            self.streams[owner].add(stream)
+        return stream
+
+    def unsubscribe(self, stream: _Stream) -> None:
+        with self._lock:
+            self.streams[stream.owner].discard(stream)
+
+
+engine = AlertEngine(watch_hub.hub)
+watch_hub.hub.listeners.append(engine.on_changes)
+
+
+async def stream(owner: str):
+    """SSE 產生器：owner 的規則觸發時推送 event: alert。"""
+    engine.load()
+    sub = engine.subscribe(owner, asyncio.get_running_loop())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(sub.queue.get(), timeout=watch_hub.KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield watch_hub.format_event("alert", event)
+    finally:
+        engine.unsubscribe(sub)
@@ -0,0 +1,346 @@
+"""
+得分制模型回測 — 以向量化方式一次算出每檔每根 K 棒的指標、得分與訊號，再模擬進出場。
+
+- 指標與 scan_ticker 相同（位數、資料不足門檻、流動性門檻），但以完整歷史一次計算：
+  EMA/RSI/ATR 從序列起點遞迴，不像 scan_ticker 每天只看最近 120 天視窗，
+  兩者差異僅在遞迴初值的影響（隨時間指數衰減）。
+- 歷史投信買賣超無資料，回測中籌碼分數一律視為 None（0 分）。
+- 交易規則：收盤得分 >= entry_score 且通過流動性檢查 → 次一交易日開盤買進；
+  停損價取訊號當日的 stop_loss（收盤 - 2×ATR），盤中觸及即出場（跳空則以開盤價）；
+  收盤得分 <= exit_score（或持有滿 max_hold 根）→ 次一交易日開盤賣出。
+- 成本：買進手續費 FEE，賣出手續費 FEE + 證交稅 TAX。
+- 投組：每檔一份等額資金，投組日報酬為各檔日報酬平均（每日再平衡）。
+
+用法：python backtest.py 2330,2317,2454 [年數=10]
+"""
+from __future__ import annotations
+
+import sys
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import stock_monitor
+from stock_monitor import FEE, TAX
+
+TRADING_DAYS = 252
+ENTRY_SCORE = 5
+EXIT_SCORE = -3
+MIN_AVG_VOLUME = 1_000_000     # 同 _check_liquidity：20 日均量（股）
+AVWAP_LOOKBACK = 60
+MAX_TICKERS = 20               # /api/stock/backtest 單次最多檔數
+MAX_YEARS = 20
+
+OHLCV = ["Open", "High", "Low", "Close", "Volume"]
+
+
+@dataclass
+class Trade:
+    ticker: str
+    entry_date: str
+    entry_price: float
+    exit_date: str
+    exit_price: float
+    reason: str            # "訊號" / "停損" / "持有期滿" / "期末"
+    bars: int
+    ret: float             # 含交易成本
+
+
+# ──────────────────────────────────────────
+# 指標時間序列
+# ──────────────────────────────────────────
+
+def indicator_series(df: pd.DataFrame) -> dict[str, np.ndarray]:
+    """
+    每根 K 棒的指標（欄位同 _calc_panel_indicators，另含 liquid），長度 = len(df)。
+    df 需有 OHLCV 欄位且無缺值；資料不足處為 NaN。
+    """
+    close, high, low, volume = (df[c].astype(float) for c in ("Close", "High", "Low", "Volume"))
+    n = len(df)
+    length = np.arange(1, n + 1)
+    close_v, high_v, low_v, vol_v = close.to_numpy(), high.to_numpy(), low.to_numpy(), volume.to_numpy()
+
+    # ── Z-Score ───────────────────────────
+    ma20 = close.rolling(20).mean().to_numpy()
+    std20 = close.rolling(20).std().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(std20 != 0, (close_v - ma20) / std20, np.nan)
+
+    # ── TD Sequential ─────────────────────
+    td = stock_monitor.calc_td_sequential_matrix(close_v)[0]
+
+    # ── AVWAP（近 60 根最低點為錨）────────
+    padded = np.concatenate([np.full(AVWAP_LOOKBACK - 1, np.inf), low_v])
+    anchor = length - AVWAP_LOOKBACK + np.argmin(sliding_window_view(padded, AVWAP_LOOKBACK), axis=1)
+    tp = (high_v + low_v + close_v) / 3
+    cum_pv = np.concatenate([[0.0], np.cumsum(tp * vol_v)])
+    cum_vol = np.concatenate([[0.0], np.cumsum(vol_v)])
+    seg_vol = cum_vol[length] - cum_vol[anchor]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avwap = np.where((length >= 20) & (seg_vol != 0), (cum_pv[length] - cum_pv[anchor]) / seg_vol, np.nan)
+
+    # ── RSI (14) ──────────────────────────
+    delta = close.diff()
+    avg_gain = delta.clip(lower=0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().to_numpy()
+    avg_loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.round(100 - 100 / (1 + avg_gain / avg_loss), 2)
+    rsi = np.where(avg_loss == 0, 100.0, rsi)
+    rsi = np.where(length >= 15, rsi, np.nan)
+
+    # ── ATR (14) ──────────────────────────
+    prev_close = close.shift(1)
+    tr = pd.concat([high - low, (high - prev_close).abs(), (low - prev_close).abs()], axis=1).max(axis=1)
+    atr_raw = tr.ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().to_numpy()
+    atr = np.where(length >= 15, np.round(atr_raw, 4), np.nan)
+
+    # ── MACD (12, 26, 9) ──────────────────
+    macd_line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    histogram = macd_line - macd_line.ewm(span=9, adjust=False).mean()
+    has_macd = length >= 35
+    hist = np.round(histogram.to_numpy(), 4)
+
+    # ── EMA 8/21/55 ───────────────────────
+    has_emas = length >= 56
+    emas: dict[str, np.ndarray] = {}
+    for span in (8, 21, 55):
+        ema = np.round(close.ewm(span=span, adjust=False).mean().to_numpy(), 2)
+        emas[f"ema{span}"] = np.where(has_emas, ema, np.nan)
+        if span != 55:
+            emas[f"ema{span}_prev"] = np.where(has_emas, np.concatenate([[np.nan], ema[:-1]]), np.nan)
+
+    # ── 停損 / 風報比 ─────────────────────
+    close_r = np.round(close_v, 2)
+    # 停損價會直接用於成交，與 scan_ticker 同樣用內建 round（np.round 在 .xx5 邊界可能差一檔）
+    stop_loss = stock_monitor.round_vec(close_r - 2 * atr, 2)
+    recent_high = high.rolling(20, min_periods=1).max().to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rr = np.where((atr > 0) & (length >= 20), (recent_high - close_r) / (2 * atr), np.nan)
+
+    vol_ma20 = volume.rolling(20).mean().to_numpy()
+
+    return {
+        "close": close_r,
+        "zscore": np.round(z, 4),
+        "td_count": td,
+        "avwap": np.round(avwap, 2),
+        "rsi": rsi,
+        "atr": atr,
+        "stop_loss": stop_loss,
+        "rr_ratio": np.round(rr, 2),
+        "macd_line": np.where(has_macd, np.round(macd_line.to_numpy(), 4), np.nan),
+        "macd_hist": np.where(has_macd, hist, np.nan),
+        "macd_hist_prev": np.where(has_macd, np.concatenate([[np.nan], hist[:-1]]), np.nan),
+        **emas,
+        "liquid": (length >= 20) & (vol_ma20 >= MIN_AVG_VOLUME),
+    }
+
+
+def score_series(ind: dict[str, np.ndarray]) -> tuple[np.ndarray, np.ndarray]:
+    """每根 K 棒的 (score, signal)；歷史籌碼無資料，net_buy 一律 None。"""
+    net_buy = np.full(len(ind["close"]), np.nan)
+    return stock_monitor.calc_score_and_signal_vec(ind, net_buy)
+
+
+# ──────────────────────────────────────────
+# 交易模擬
+# ──────────────────────────────────────────
+
+def _first(mask: np.ndarray, start: int) -> int | None:
+    """mask[start:] 中第一個 True 的位置；沒有回傳 None。"""
+    if start >= len(mask):
+        return None
+    hit = int(np.argmax(mask[start:]))
+    return start + hit if mask[start + hit] else None
+
+
+def simulate(
+    ticker: str,
+    df: pd.DataFrame,
+    stop_loss: np.ndarray,
+    entry: np.ndarray,
+    exit_: np.ndarray,
+    max_hold: int | None = None,
+) -> tuple[list[Trade], np.ndarray, np.ndarray]:
+    """
+    單檔交易模擬。entry / exit_ 為每根收盤的進出場訊號（bool）。
+    回傳 (trades, 每日報酬, 是否持有)；只在訊號之間跳躍，迴圈次數 = 交易筆數。
+    """
+    open_, low, close = (df[c].to_numpy(dtype=float) for c in ("Open", "Low", "Close"))
+    # 當地日期；逐筆取 DatetimeIndex 元素很慢（參數掃描時會重複數千次）
+    local = df.index.tz_localize(None) if getattr(df.index, "tz", None) is not None else df.index
+    days = local.to_numpy().astype("datetime64[D]")
+    n = len(df)
+    returns = np.zeros(n)
+    held = np.zeros(n, dtype=bool)
+    trades: list[Trade] = []
+
+    i = 0
+    while True:
+        s = _first(entry, i)
+        if s is None or s + 1 >= n:
+            break
+        e = s + 1
+        entry_price = open_[e]
+        stop = stop_loss[s]
+
+        k_stop = _first(low <= stop, e) if not np.isnan(stop) else None
+        k_sig = _first(exit_, e)
+        hold_exit = False
+        if max_hold is not None:
+            k_hold = e + max_hold - 1
+            if k_hold < n and (k_sig is None or k_hold < k_sig):
+                k_sig, hold_exit = k_hold, True
+
+        if k_stop is not None and (k_sig is None or k_stop <= k_sig):
+            x, exit_price, reason = k_stop, min(open_[k_stop], stop), "停損"
+        elif k_sig is not None and k_sig + 1 < n:
+            x, exit_price, reason = k_sig + 1, open_[k_sig + 1], "持有期滿" if hold_exit else "訊號"
+        else:
+            x, exit_price, reason = n - 1, close[n - 1], "期末"
+
+        # 每日淨值：買進當日以含手續費成本為基準，出場日計入賣出成本
+        shares = 1 / (entry_price * (1 + FEE))
+        value = close[e:x + 1] * shares
+        value[-1] = exit_price * (1 - FEE - TAX) * shares
+        prev = np.concatenate([[1.0], value[:-1]])
+        returns[e:x + 1] = value / prev - 1
+        held[e:x + 1] = True
+
+        trades.append(Trade(
+            ticker=ticker,
+            entry_date=str(days[e]),
+            entry_price=round(float(entry_price), 2),
+            exit_date=str(days[x]),
+            exit_price=round(float(exit_price), 2),
+            reason=reason,
+            bars=x - e + 1,
+            ret=round(float(value[-1] - 1), 6),
+        ))
+        i = x
+    return trades, returns, held
+
+
+# ──────────────────────────────────────────
+# 統計
+# ──────────────────────────────────────────
+
+def _stats(returns: np.ndarray) -> dict:
+    if len(returns) == 0:
+        return {"total_return": None, "cagr": None, "volatility": None, "sharpe": None, "max_drawdown": None}
+    equity = np.cumprod(1 + returns)
+    years = len(returns) / TRADING_DAYS
+    std = returns.std()
+    drawdown = equity / np.maximum.accumulate(equity) - 1
+    return {
+        "total_return": round(float(equity[-1] - 1), 4),
+        "cagr": round(float(equity[-1] ** (1 / years) - 1), 4) if years > 0 and equity[-1] > 0 else None,
+        "volatility": round(float(std * np.sqrt(TRADING_DAYS)), 4),
+        "sharpe": round(float(returns.mean() / std * np.sqrt(TRADING_DAYS)), 2) if std > 0 else None,
+        "max_drawdown": round(float(drawdown.min()), 4),
+    }
+
+
+def _trade_stats(trades: list[Trade]) -> dict:
+    rets = np.array([t.ret for t in trades])
+    return {
+        "trades": len(trades),
+        "win_rate": round(float((rets > 0).mean()), 4) if len(rets) else None,
+        "avg_trade": round(float(rets.mean()), 4) if len(rets) else None,
+        "avg_bars": round(float(np.mean([t.bars for t in trades])), 1) if trades else None,
+    }
+
+
+# ──────────────────────────────────────────
+# 對外介面
+# ──────────────────────────────────────────
+
+def load_frames(tickers: list[str], years: int = 10) -> dict[str, pd.DataFrame | None]:
+    """經本地 K 棒庫取得 years 年日 K（含 Open，回測需要次日開盤價）。"""
+    symbols = {t: stock_monitor.yahoo_symbol(t) for t in tickers}
+    raw = stock_monitor.get_bars(list(symbols.values()), f"{years}y", "1d")
+    out: dict[str, pd.DataFrame | None] = {}
+    for t, sym in symbols.items():
+        df = raw.get(sym)
+        out[t] = df[OHLCV].dropna() if df is not None and not df.empty else None
+    return out
+
+
+def prepare(frames: dict[str, pd.DataFrame | None]) -> dict[str, dict[str, np.ndarray]]:
+    """各檔指標序列（只需算一次；參數掃描時重複使用）。"""
+    return {t: indicator_series(df) for t, df in frames.items() if df is not None and len(df) >= 2}
+
+
+def run_backtest(
+    tickers: list[str],
+    years: int = 10,
+    entry_score: int = ENTRY_SCORE,
+    exit_score: int = EXIT_SCORE,
+    max_hold: int | None = None,
+    frames: dict[str, pd.DataFrame | None] | None = None,
+    include_trades: bool = False,
+) -> dict:
+    """
+    回測多檔標的。frames 可預先提供（{ticker: OHLCV DataFrame}），否則經 K 棒庫下載。
+    回傳 {portfolio{...}, tickers{ticker: {...}}, trades[]?, params{...}}。
+    """
+    frames = frames if frames is not None else load_frames(tickers, years)
+    indicators = prepare(frames)
+    return evaluate(frames, indicators, entry_score, exit_score, max_hold, include_trades)
+
+
+def evaluate(
+    frames: dict[str, pd.DataFrame | None],
+    indicators: dict[str, dict[str, np.ndarray]],
+    entry_score: int = ENTRY_SCORE,
+    exit_score: int = EXIT_SCORE,
+    max_hold: int | None = None,
+    include_trades: bool = False,
+    scores: dict[str, np.ndarray] | None = None,
+) -> dict:
+    """以已算好的指標序列模擬交易並統計；scores 可替換得分序列（參數掃描用）。"""
+    per_ticker: dict[str, dict] = {}
+    all_trades: list[Trade] = []
+    sleeves: dict[str, pd.Series] = {}
+    for t, ind in indicators.items():
+        df = frames[t]
+        score = scores[t] if scores is not None else stock_monitor.calc_score_vec(ind, np.full(len(ind["close"]), np.nan))
+        entry = ind["liquid"] & (score >= entry_score)
+        exit_ = score <= exit_score
+        trades, returns, held = simulate(t, df, ind["stop_loss"], entry, exit_, max_hold)
+        all_trades.extend(trades)
+        sleeves[t] = pd.Series(returns, index=df.index)
+        close = df["Close"].to_numpy(dtype=float)
+        per_ticker[t] = {
+            **_trade_stats(trades),
+            **_stats(returns),
+            "exposure": round(float(held.mean()), 4),
+            "buy_hold": round(float(close[-1] / close[0] - 1), 4),
+        }
+
+    if sleeves:
+        portfolio_returns = pd.DataFrame(sleeves).sort_index().fillna(0.0).mean(axis=1).to_numpy()
+    else:
+        portfolio_returns = np.array([])
+    result = {
+        "portfolio": {**_trade_stats(all_trades), **_stats(portfolio_returns)},
+        "tickers": per_ticker,
+        "params": {"entry_score": entry_score, "exit_score": exit_score, "max_hold": max_hold},
+    }
+    if include_trades:
+        result["trades"] = [asdict(tr) for tr in all_trades]
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    codes = [c.strip() for c in sys.argv[1].split(",") if c.strip()]
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    out = run_backtest(codes, years=n_years)
+    print("投組:", out["portfolio"])
+    for code, stats in out["tickers"].items():
+        print(f"{code}:", stats)
@@ -0,0 +1,378 @@
+"""
+本地 OHLCV K 棒庫（SQLite）— 以 (symbol, interval, ts) 為鍵，增量更新。
+
+- 冷啟動：依 period 完整下載。
+- 已有資料：只從最後幾根 K 棒起抓（保留重疊以偵測還原權值變動），
+  重疊區間收盤價不一致（除權息 / 分割造成還原價改寫）時整段作廢重抓。
+- 最後一根（盤中未收盤）每次都以新值覆寫。
+
+下載函式由呼叫端注入（stock_monitor._fetch_bars），本模組不直接依賴 yfinance。
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+BAR_DB = os.environ.get("BAR_STORE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bars.db"))
+OVERLAP_BARS = 3           # 增量下載時往回重疊的根數
+ADJUST_TOLERANCE = 1e-6    # 重疊收盤價相對誤差上限，超過視為還原權值改寫
+
+# fetch(symbols, interval, period=..., start=...) -> {symbol: DataFrame | None}
+Fetcher = Callable[..., dict]
+
+_COLUMNS = ("Open", "High", "Low", "Close", "Volume")
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(BAR_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+_initialized: set[str] = set()     # 已建表的庫路徑（每個行程只執行一次 CREATE TABLE）
+_init_lock = threading.Lock()
+
+
+def init_store() -> None:
+    with _init_lock:
+        if BAR_DB in _initialized:
+            return
+        _create_tables()
+        _initialized.add(BAR_DB)
+
+
+def _create_tables() -> None:
+    conn = _connect()
+    c = conn.cursor()
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS bars (
+            symbol   TEXT    NOT NULL,
+            interval TEXT    NOT NULL,
+            ts       INTEGER NOT NULL,
+            open     REAL,
+            high     REAL,
+            low      REAL,
+            close    REAL,
+            volume   REAL,
+            PRIMARY KEY (symbol, interval, ts)
+        ) WITHOUT ROWID
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS bar_meta (
+            symbol       TEXT NOT NULL,
+            interval     TEXT NOT NULL,
+            tz           TEXT,
+            covered_from INTEGER,
+            fetched_at   REAL,
+            PRIMARY KEY (symbol, interval)
+        )
+    ''')
+    conn.commit()
+    conn.close()
+
+
+# ──────────────────────────────────────────
+# 時間工具
+# ──────────────────────────────────────────
+
+def period_start(period: str, now: pd.Timestamp | None = None) -> pd.Timestamp:
+    """yfinance period 字串（"7d" / "120d" / "6mo" / "1y"）→ 視窗起點（UTC）。"""
+    now = now if now is not None else pd.Timestamp.now(tz="UTC")
+    p = period.strip().lower()
+    if p.endswith("mo"):
+        return now - pd.DateOffset(months=int(p[:-2]))
+    if p.endswith("y"):
+        return now - pd.DateOffset(years=int(p[:-1]))
+    if p.endswith("wk"):
+        return now - pd.Timedelta(weeks=int(p[:-2]))
+    if p.endswith("d"):
+        return now - pd.Timedelta(days=int(p[:-1]))
+    raise ValueError(f"不支援的 period：{period}")
+
+
+def _to_ns(index: pd.DatetimeIndex) -> np.ndarray:
+    if index.tz is not None:
+        index = index.tz_convert("UTC")
+    return index.as_unit("ns").asi8
+
+
+def _from_ns(ts: np.ndarray, tz: str | None) -> pd.DatetimeIndex:
+    idx = pd.to_datetime(ts, unit="ns", utc=True)
+    return idx.tz_convert(tz) if tz else idx.tz_localize(None)
+
+
+# ──────────────────────────────────────────
+# 讀寫
+# ──────────────────────────────────────────
+
+def _meta(conn: sqlite3.Connection, symbols: list[str], interval: str) -> dict[str, tuple]:
+    out: dict[str, tuple] = {}
+    for sym in symbols:
+        row = conn.execute(
+            "SELECT tz, covered_from, fetched_at FROM bar_meta WHERE symbol = ? AND interval = ?",
+            (sym, interval),
+        ).fetchone()
+        if row:
+            out[sym] = row
+    return out
+
+
+def load_bars(symbol: str, interval: str, start: pd.Timestamp | None = None) -> pd.DataFrame | None:
+    """讀出 [start, 最新] 的 K 棒；無資料回傳 None。"""
+    conn = _connect()
+    try:
+        return _load_bars(conn, symbol, interval, start)
+    finally:
+        conn.close()
+
+
+def _load_bars(conn: sqlite3.Connection, symbol: str, interval: str, start: pd.Timestamp | None) -> pd.DataFrame | None:
+    meta = _meta(conn, [symbol], interval).get(symbol)
+    if meta is None:
+        return None
+    start_ns = int(start.value) if start is not None else 0
+    rows = conn.execute(
+        "SELECT ts, open, high, low, close, volume FROM bars "
+        "WHERE symbol = ? AND interval = ? AND ts >= ? ORDER BY ts",
+        (symbol, interval, start_ns),
+    ).fetchall()
+    if not rows:
+        return None
+    arr = np.array(rows, dtype=float)
+    df = pd.DataFrame(arr[:, 1:], columns=list(_COLUMNS),
+                      index=_from_ns(arr[:, 0].astype(np.int64), meta[0]))
+    df.index.name = "Datetime" if interval[-1] in ("m", "h") else "Date"
+    return df
+
+
+def last_bars(symbol: str, interval: str, n: int) -> list[tuple[int, float]]:
+    """最後 n 根的 (ts, close)，由舊到新。"""
+    conn = _connect()
+    try:
+        return _last_bars(conn, symbol, interval, n)
+    finally:
+        conn.close()
+
+
+def _last_bars(conn: sqlite3.Connection, symbol: str, interval: str, n: int) -> list[tuple[int, float]]:
+    rows = conn.execute(
+        "SELECT ts, close FROM bars WHERE symbol = ? AND interval = ? ORDER BY ts DESC LIMIT ?",
+        (symbol, interval, n),
+    ).fetchall()
+    return rows[::-1]
+
+
+def upsert_bars(
+    symbol: str,
+    interval: str,
+    df: pd.DataFrame,
+    covered_from: pd.Timestamp | None = None,
+) -> None:
+    """寫入（覆寫同 ts）K 棒並更新 meta；covered_from 給定時代表這次是完整視窗下載。"""
+    conn = _connect()
+    try:
+        _upsert_bars(conn, symbol, interval, df, covered_from)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _upsert_bars(
+    conn: sqlite3.Connection,
+    symbol: str,
+    interval: str,
+    df: pd.DataFrame,
+    covered_from: pd.Timestamp | None = None,
+) -> None:
+    df = df.dropna(subset=["Close"])
+    tz = str(df.index.tz) if df.index.tz is not None else ""
+    ts = _to_ns(df.index)
+    cols = [df[c].to_numpy(dtype=float) if c in df.columns else np.full(len(df), np.nan) for c in _COLUMNS]
+    rows = [
+        (symbol, interval, int(t), *(None if np.isnan(v) else float(v) for v in vals))
+        for t, *vals in zip(ts, *cols)
+    ]
+    conn.executemany(
+        "INSERT OR REPLACE INTO bars (symbol, interval, ts, open, high, low, close, volume) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        rows,
+    )
+    if covered_from is not None:
+        conn.execute(
+            "INSERT OR REPLACE INTO bar_meta (symbol, interval, tz, covered_from, fetched_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (symbol, interval, tz, int(covered_from.value), time.time()),
+        )
+    else:
+        conn.execute(
+            "UPDATE bar_meta SET fetched_at = ? WHERE symbol = ? AND interval = ?",
+            (time.time(), symbol, interval),
+        )
+
+
+def invalidate(symbol: str, interval: str) -> None:
+    """刪除某代號某週期的全部 K 棒（還原權值改寫時使用）。"""
+    conn = _connect()
+    try:
+        _invalidate(conn, symbol, interval)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def _invalidate(conn: sqlite3.Connection, symbol: str, interval: str) -> None:
+    conn.execute("DELETE FROM bars WHERE symbol = ? AND interval = ?", (symbol, interval))
+    conn.execute("DELETE FROM bar_meta WHERE symbol = ? AND interval = ?", (symbol, interval))
+
+
+def load_many(
+    symbols: list[str],
+    interval: str,
+    starts: dict[str, pd.Timestamp | None],
+) -> dict[str, pd.DataFrame | None]:
+    """以單一連線讀出多個代號各自 [starts[sym], 最新] 的 K 棒。"""
+    conn = _connect()
+    try:
+        return {sym: _load_bars(conn, sym, interval, starts.get(sym)) for sym in symbols}
+    finally:
+        conn.close()
+
+
+def window_marks(symbols: list[str], interval: str, start: pd.Timestamp) -> dict[str, tuple[int, int | None]]:
+    """
+    {symbol: (covered_from, 視窗內第一根 ts)}：任一值改變代表序列被整段替換或視窗起點移動，
+    依序列回放建立的狀態（indicator_state）需要重建。
+    """
+    conn = _connect()
+    try:
+        out: dict[str, tuple[int, int | None]] = {}
+        for sym, (_tz, covered_from, _fetched) in _meta(conn, symbols, interval).items():
+            first = conn.execute(
+                "SELECT MIN(ts) FROM bars WHERE symbol = ? AND interval = ? AND ts >= ?",
+                (sym, interval, int(start.value)),
+            ).fetchone()[0]
+            out[sym] = (covered_from, first)
+        return out
+    finally:
+        conn.close()
+
+
+def stored_symbols(symbols: list[str], interval: str) -> set[str]:
+    """庫內已同步過（有 K 棒）的代號。"""
+    conn = _connect()
+    try:
+        return set(_meta(conn, symbols, interval))
+    finally:
+        conn.close()
+
+
+def fetched_at(symbol: str, interval: str) -> float | None:
+    """最後一次成功同步的 epoch 秒。"""
+    conn = _connect()
+    try:
+        meta = _meta(conn, [symbol], interval).get(symbol)
+    finally:
+        conn.close()
+    return meta[2] if meta else None
+
+
+# ──────────────────────────────────────────
+# 同步
+# ──────────────────────────────────────────
+
+def _adjustment_changed(symbol: str, interval: str, new_df: pd.DataFrame, overlap: list[tuple[int, float]]) -> bool:
+    """比對重疊 K 棒（不含最後一根，可能尚未收盤）的收盤價；有分割欄位非零亦視為改寫。"""
+    if "Stock Splits" in new_df.columns and (new_df["Stock Splits"].fillna(0) != 0).any():
+        return True
+    new_close = pd.Series(new_df["Close"].to_numpy(dtype=float), index=_to_ns(new_df.index))
+    for ts, old_close in overlap[:-1]:
+        if ts not in new_close.index or old_close is None:
+            continue
+        nv = float(new_close.loc[ts])
+        if old_close == 0 or abs(nv / old_close - 1) > ADJUST_TOLERANCE:
+            return True
+    return False
+
+
+def _incremental_start(interval: str, overlap: list[tuple[int, float]], tz: str | None):
+    first = _from_ns(np.array([overlap[0][0]], dtype=np.int64), tz)[0]
+    return first.date().isoformat() if interval in ("1d", "5d", "1wk", "1mo") else first
+
+
+def sync_bars(
+    symbols: list[str],
+    interval: str,
+    period: str,
+    fetch: Fetcher,
+    is_fresh: Callable[[float], bool] | None = None,
+    load: bool = True,
+) -> dict[str, pd.DataFrame | None]:
+    """
+    讓本地庫涵蓋每個代號最近 period 的 K 棒，再從本地讀出回傳。
+    - 無資料或覆蓋不足 → fetch(period=period) 完整下載
+    - 已有資料 → fetch(start=最後 OVERLAP_BARS 根起點) 只抓新 K 棒；
+      起點已落在視窗外或增量下載沒有回傳資料時改為完整下載
+    - is_fresh(上次同步時間) 為 True 的代號不再連線（交易時段策略見 cache_policy）
+    load=False 時只同步不讀出（呼叫端自行以 load_bars 讀取需要的區段）。
+    """
+    init_store()
+    symbols = list(dict.fromkeys(symbols))
+    window_start = period_start(period)
+
+    # 整次同步共用一個連線（下載期間不持有交易，只在寫入時短暫鎖庫）
+    conn = _connect()
+    try:
+        meta = _meta(conn, symbols, interval)
+        full: list[str] = []
+        by_start: dict[object, list[str]] = {}
+        overlaps: dict[str, list[tuple[int, float]]] = {}
+        for sym in symbols:
+            m = meta.get(sym)
+            if m is None or m[1] is None or m[1] > window_start.value:
+                full.append(sym)
+                continue
+            if is_fresh is not None and m[2] is not None and is_fresh(m[2]):
+                continue
+            overlap = _last_bars(conn, sym, interval, OVERLAP_BARS)
+            if not overlap or overlap[0][0] < window_start.value:
+                # 太久沒同步：增量起點已在視窗外（例如 1m 只能抓最近 7 天），改為完整下載
+                full.append(sym)
+                continue
+            overlaps[sym] = overlap
+            by_start.setdefault(_incremental_start(interval, overlap, m[0]), []).append(sym)
+
+        for start, group in by_start.items():
+            fetched = fetch(group, interval, start=start)
+            for sym in group:
+                df = fetched.get(sym)
+                if df is None or df.empty:
+                    # 增量下載失敗（至少應含重疊的 K 棒）：改以完整下載重試
+                    full.append(sym)
+                    continue
+                if _adjustment_changed(sym, interval, df, overlaps[sym]):
+                    # 舊資料保留到完整重抓成功才整段替換；重抓失敗時仍可讀到舊序列
+                    full.append(sym)
+                    continue
+                _upsert_bars(conn, sym, interval, df)
+                conn.commit()
+
+        if full:
+            fetched = fetch(full, interval, period=period)
+            for sym in full:
+                df = fetched.get(sym)
+                if df is not None and not df.empty:
+                    _invalidate(conn, sym, interval)
+                    _upsert_bars(conn, sym, interval, df, covered_from=window_start)
+                    conn.commit()
+
+        if not load:
+            return {}
+        return {sym: _load_bars(conn, sym, interval, window_start) for sym in symbols}
+    finally:
+        conn.close()
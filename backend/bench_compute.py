@@ -0,0 +1,71 @@
+"""
+面板運算基準測試：比較 scan_ticker 逐檔、面板 thread 模式、面板 process 模式。
+使用隨機產生的 K 棒（不連網、不讀 K 棒庫），只量指標與得分的計算時間。
+
+用法：python bench_compute.py [標的數=2000] [K 棒數=120] [worker 數=CPU 核心數]
+"""
+from __future__ import annotations
+
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import compute_pool
+import stock_monitor
+
+
+def make_frames(n: int, bars: int, seed: int = 0) -> dict[str, pd.DataFrame]:
+    rng = np.random.default_rng(seed)
+    idx = pd.bdate_range(end=pd.Timestamp.today().normalize(), periods=bars, tz="Asia/Taipei")
+    frames = {}
+    for i in range(n):
+        close = np.round(rng.uniform(20, 800) * np.exp(np.cumsum(rng.normal(0, 0.02, bars))), 2)
+        spread = close * rng.uniform(0, 0.03, bars)
+        frames[f"{9000 + i}"] = pd.DataFrame({
+            "Close": close,
+            "High": np.round(close + spread, 2),
+            "Low": np.round(close - spread, 2),
+            "Volume": rng.integers(500_000, 5_000_000, bars).astype(float),
+        }, index=idx)
+    return frames
+
+
+def _timed(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(n: int = 2000, bars: int = 120, workers: int | None = None) -> None:
+    workers = workers or compute_pool.COMPUTE_WORKERS
+    frames = make_frames(n, bars)
+    tickers = list(frames)
+    print(f"{n} 檔 × {bars} 根，worker = {workers}")
+
+    sample = tickers[:200]
+    # net_buys={}：不查 FinMind（有 FINMIND_TOKEN 時也不連網），與面板模式同樣視為無籌碼資料
+    per_ticker = _timed(lambda: [stock_monitor.scan_ticker(t, frames[t], net_buys={}) for t in sample], repeat=1)
+    print(f"  scan_ticker 逐檔   {per_ticker / len(sample) * n:8.3f}s（由 {len(sample)} 檔推估）")
+
+    reference = None
+    for mode in ("thread", "process"):
+        compute_pool.COMPUTE_MODE = mode
+        compute_pool.COMPUTE_WORKERS = workers
+        stock_monitor.scan_panel(frames)  # 暖機（行程池啟動、import）
+        elapsed = _timed(lambda: stock_monitor.scan_panel(frames))
+        result = stock_monitor.scan_panel(frames)
+        if reference is None:
+            reference = result
+        same = "一致" if result == reference else "不一致！"
+        print(f"  面板 {mode:<8}     {elapsed:8.3f}s  結果{same}")
+    compute_pool.shutdown()
+
+
+if __name__ == "__main__":
+    args = [int(a) for a in sys.argv[1:]]
+    main(*args)
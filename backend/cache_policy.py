@@ -0,0 +1,328 @@
+"""
+依台股交易時段決定快取壽命 — 所有端點的快取策略集中在 POLICIES。
+
+- 盤中（交易日 09:00–13:30 Asia/Taipei）：短 TTL。
+- 收盤後結算窗（13:30–14:30）：收盤價仍可能修正，用較短 TTL。
+- 其餘時間（盤後、週末、假日）：資料到下一次開盤前都不會變，直接沿用到下次開盤。
+
+國定休市日由 TWSE_HOLIDAYS_PATH（預設與本模組同目錄的 twse_holidays.txt，每行一個 YYYY-MM-DD）
+提供；檔案不存在、格式錯誤或沒有今年的日期時記錄警告，並只排除週末。
+"""
+from __future__ import annotations
+
+import datetime
+import functools
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable
+from zoneinfo import ZoneInfo
+
+TZ_TAIPEI = ZoneInfo("Asia/Taipei")
+SESSION_OPEN = datetime.time(9, 0)
+SESSION_CLOSE = datetime.time(13, 30)
+SETTLE_END = datetime.time(14, 30)
+SESSION_CACHE_MAX = int(os.environ.get("SESSION_CACHE_MAX", "512"))   # session_cached 每個函式最多保留的 key 數
+
+TWSE_HOLIDAYS_PATH = os.environ.get(
+    "TWSE_HOLIDAYS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "twse_holidays.txt"),
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _load_holidays(path: str) -> set[datetime.date]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            holidays = {
+                datetime.date.fromisoformat(line.strip())
+                for line in f
+                if line.strip() and not line.startswith("#")
+            }
+    except OSError:
+        logger.warning("找不到台股休市日檔 %s：交易日曆只排除週末", path)
+        return set()
+    except ValueError as e:
+        logger.warning("台股休市日檔 %s 格式錯誤（%s）：交易日曆只排除週末", path, e)
+        return set()
+    year = datetime.datetime.now(TZ_TAIPEI).year
+    if not any(d.year == year for d in holidays):
+        logger.warning("台股休市日檔 %s 沒有 %d 年的日期，請更新", path, year)
+    return holidays
+
+
+TWSE_HOLIDAYS: set[datetime.date] = _load_holidays(TWSE_HOLIDAYS_PATH)
+
+
+@dataclass(frozen=True)
+class CachePolicy:
+    open_ttl: float                   # 盤中 TTL（秒）
+    settle_ttl: float                 # 收盤後結算窗 TTL（秒）
+    closed_ttl: float | None = None   # 休市 TTL；None = 沿用到下一次開盤
+
+
+# ──────────────────────────────────────────
+# 各端點快取策略
+# ──────────────────────────────────────────
+POLICIES: dict[str, CachePolicy] = {
+    # K 棒庫同步（bar_store）
+    "bars:1d":       CachePolicy(open_ttl=300, settle_ttl=300),
+    "bars:1h":       CachePolicy(open_ttl=120, settle_ttl=300),
+    "bars:1m":       CachePolicy(open_ttl=30,  settle_ttl=300),
+    # API 端點
+    "chart:1d":      CachePolicy(open_ttl=300, settle_ttl=300),
+    "chart:1h":      CachePolicy(open_ttl=120, settle_ttl=300),
+    "chart:1m":      CachePolicy(open_ttl=30,  settle_ttl=300),
+    "sector":        CachePolicy(open_ttl=300, settle_ttl=600),
+    "rotation":      CachePolicy(open_ttl=600, settle_ttl=600),
+    # S&P500 在台股休市時才交易，不能沿用到台股開盤
+    "systemic_risk": CachePolicy(open_ttl=1800, settle_ttl=1800, closed_ttl=1800),
+    # 新聞盤後仍會更新
+    "news":          CachePolicy(open_ttl=600, settle_ttl=900, closed_ttl=1800),
+}
+DEFAULT_POLICY = CachePolicy(open_ttl=60, settle_ttl=300)
+
+
+def get_policy(name: str) -> CachePolicy:
+    return POLICIES.get(name, DEFAULT_POLICY)
+
+
+# ──────────────────────────────────────────
+# 交易日曆
+# ──────────────────────────────────────────
+
+def _taipei(ts: float | None = None) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(time.time() if ts is None else ts, TZ_TAIPEI)
+
+
+def is_trading_day(d: datetime.date) -> bool:
+    return d.weekday() < 5 and d not in TWSE_HOLIDAYS
+
+
+def session_state(ts: float | None = None) -> str:
+    """"open"（盤中）/ "settle"（收盤後結算窗）/ "closed"（其餘）。"""
+    now = _taipei(ts)
+    if not is_trading_day(now.date()):
+        return "closed"
+    t = now.time()
+    if SESSION_OPEN <= t < SESSION_CLOSE:
+        return "open"
+    if SESSION_CLOSE <= t < SETTLE_END:
+        return "settle"
+    return "closed"
+
+
+def next_open(ts: float | None = None) -> datetime.datetime:
+    """下一次開盤時間（台北時區）；盤中呼叫回傳下一個交易日的開盤。"""
+    now = _taipei(ts)
+    d = now.date()
+    for _ in range(60):
+        if is_trading_day(d):
+            candidate = datetime.datetime.combine(d, SESSION_OPEN, TZ_TAIPEI)
+            if candidate > now:
+                return candidate
+        d += datetime.timedelta(days=1)
+    return now + datetime.timedelta(days=1)
+
+
+def last_close(ts: float | None = None, delay: float = 0.0) -> datetime.datetime | None:
+    """最近一次（含今日）已過的收盤時間 + delay 秒；60 天內找不到回傳 None。"""
+    now = _taipei(ts)
+    d = now.date()
+    for _ in range(60):
+        if is_trading_day(d):
+            close = datetime.datetime.combine(d, SESSION_CLOSE, TZ_TAIPEI) + datetime.timedelta(seconds=delay)
+            if close <= now:
+                return close
+        d -= datetime.timedelta(days=1)
+    return None
+
+
+def expires_at(name: str, fetched_at: float | None = None) -> float:
+    """在 fetched_at 取得的資料，依策略 name 何時過期（epoch 秒）。"""
+    fetched_at = time.time() if fetched_at is None else fetched_at
+    policy = get_policy(name)
+    state = session_state(fetched_at)
+    if state == "open":
+        return fetched_at + policy.open_ttl
+    if state == "settle":
+        return fetched_at + policy.settle_ttl
+    if policy.closed_ttl is not None:
+        return fetched_at + policy.closed_ttl
+    return next_open(fetched_at).timestamp()
+
+
+def is_fresh(name: str, fetched_at: float | None, now: float | None = None) -> bool:
+    if fetched_at is None:
+        return False
+    return (time.time() if now is None else now) < expires_at(name, fetched_at)
+
+
+# ──────────────────────────────────────────
+# 快取裝飾器
+# ──────────────────────────────────────────
+
+@dataclass
+class _Entry:
+    value: Any = None
+    fetched_at: float | None = None
+    expires: float = 0.0
+    loading: threading.Event | None = None   # 有執行緒正在計算（首次載入或背景更新）
+
+
+def session_cached(
+    policy: str | Callable[..., str],
+    cache_if: Callable[[Any], bool] | None = None,
+    maxsize: int = SESSION_CACHE_MAX,
+):
+    """
+    依交易時段快取函式結果（執行緒安全；同一個 key 同時只有一個執行緒計算，其他呼叫者等它完成）。
+    policy 可為策略名稱，或由呼叫參數決定名稱的函式（如 chart 依 interval）。
+    cache_if 回傳 False 的結果（例如含錯誤訊息）不寫入快取，也不留下空項目。
+    最多保留 maxsize 個 key（key 來自使用者輸入，如任意代號 / 週期），超過時淘汰最久未使用者。
+    """
+    def decorator(fn):
+        store: OrderedDict = OrderedDict()
+        lock = threading.Lock()
+
+        def evict() -> None:
+            # （持鎖呼叫）只在寫入快取後淘汰；計算中的項目仍有等待者，不淘汰
+            for old in [k for k, e in store.items() if e.loading is None][:max(0, len(store) - maxsize)]:
+                del store[old]
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (args, tuple(sorted(kwargs.items())))
+            while True:
+                now = time.time()
+                with lock:
+                    entry = store.get(key)
+                    if entry is None:
+                        entry = store[key] = _Entry()
+                    store.move_to_end(key)
+                    if entry.fetched_at is not None and now < entry.expires:
+                        return entry.value
+                    waiting = entry.loading
+                    if waiting is None:
+                        done = entry.loading = threading.Event()
+                if waiting is None:
+                    break
+                waiting.wait()  # 同一個 key 已有執行緒在計算：等它完成後重新檢查
+            cached = False
+            try:
+                value = fn(*args, **kwargs)
+                if cache_if is None or cache_if(value):
+                    name = policy(*args, **kwargs) if callable(policy) else policy
+                    now = time.time()
+                    with lock:
+                        entry.value, entry.fetched_at, entry.expires = value, now, expires_at(name, now)
+                        evict()
+                    cached = True
+                return value
+            finally:
+                with lock:
+                    entry.loading = None
+                    if not cached and store.get(key) is entry:
+                        del store[key]
+                done.set()
+
+        def cache_clear() -> None:
+            with lock:
+                store.clear()
+
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
+
+
+def stale_while_revalidate(
+    policy: str | Callable[..., str],
+    cache_if: Callable[[Any], bool] | None = None,
+):
+    """
+    過期後仍先回傳舊值、只啟動一個背景執行緒更新的快取（執行緒安全）。
+
+    - 尚無快取：第一個呼叫者同步計算，同時到達的其他呼叫者等它完成，不重複計算。
+    - 已過期：立即回傳舊值；同一個 key 同時只會有一個背景更新。
+    - 背景更新失敗或 cache_if 為 False 時保留舊值，下次呼叫再試。
+
+    除了直接呼叫，wrapper.lookup(*args) 回傳 (value, {fetched_at, age, stale, refreshing})，
+    供端點附上資料年齡。
+    """
+    def decorator(fn):
+        store: dict = {}
+        lock = threading.Lock()
+
+        def policy_name(args: tuple, kwargs: dict) -> str:
+            return policy(*args, **kwargs) if callable(policy) else policy
+
+        def load(entry: _Entry, done: threading.Event, args: tuple, kwargs: dict) -> Any:
+            try:
+                value = fn(*args, **kwargs)
+                if cache_if is None or cache_if(value):
+                    now = time.time()
+                    expires = expires_at(policy_name(args, kwargs), now)
+                    with lock:
+                        entry.value, entry.fetched_at, entry.expires = value, now, expires
+                return value
+            finally:
+                with lock:
+                    entry.loading = None
+                done.set()
+
+        def refresh_in_background(entry: _Entry, done: threading.Event, args: tuple, kwargs: dict) -> None:
+            try:
+                load(entry, done, args, kwargs)
+            except Exception:
+                pass  # 保留舊值
+
+        def meta(entry: _Entry, now: float) -> dict:
+            return {
+                "fetched_at": entry.fetched_at,
+                "age": round(now - entry.fetched_at, 1) if entry.fetched_at is not None else None,
+                "stale": now >= entry.expires,
+                "refreshing": entry.loading is not None,
+            }
+
+        def lookup(*args, **kwargs) -> tuple[Any, dict]:
+            key = (args, tuple(sorted(kwargs.items())))
+            while True:
+                now = time.time()
+                with lock:
+                    entry = store.setdefault(key, _Entry())
+                    waiting = entry.loading
+                    if entry.fetched_at is not None:
+                        if now >= entry.expires and waiting is None:
+                            entry.loading = threading.Event()
+                            threading.Thread(
+                                target=refresh_in_background,
+                                args=(entry, entry.loading, args, kwargs),
+                                name=f"swr-{fn.__name__}",
+                                daemon=True,
+                            ).start()
+                        return entry.value, meta(entry, now)
+                    if waiting is None:
+                        done = entry.loading = threading.Event()
+                if waiting is not None:
+                    waiting.wait()
+                    continue  # 重新檢查：首次載入可能失敗或不寫入快取
+                value = load(entry, done, args, kwargs)
+                now = time.time()
+                with lock:
+                    return value, meta(entry, now)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return lookup(*args, **kwargs)[0]
+
+        def cache_clear() -> None:
+            with lock:
+                store.clear()
+
+        wrapper.lookup = lookup
+        wrapper.cache_clear = cache_clear
+        return wrapper
+    return decorator
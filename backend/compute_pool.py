@@ -0,0 +1,149 @@
+"""
+面板運算的平行後端 — 將 bar × ticker 矩陣依欄（標的）切塊，分給多個 worker 計算。
+
+- "thread"（預設）：同一行程內以執行緒分塊；矩陣以 view 傳遞，不複製。
+  pandas/NumPy 只在部分運算釋放 GIL，CPU 密集的部分仍大多序列執行。
+- "process"：以行程池計算，避開 GIL。矩陣一次寫入一塊 shared memory，
+  worker 只收到 (名稱, 欄位配置, 欄範圍)，自行 attach 後取 view，
+  不必把 DataFrame pickle 過行程邊界；回傳的只有每檔最後一根的指標（很小）。
+
+設定：SCAN_COMPUTE=thread|process、SCAN_COMPUTE_WORKERS（預設 CPU 核心數）。
+標的數少於 MIN_COLUMNS_PER_SHARD × 2 時不分塊，直接在呼叫端計算。
+"""
+from __future__ import annotations
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from typing import Callable
+
+import numpy as np
+
+COMPUTE_MODE = os.environ.get("SCAN_COMPUTE", "thread")
+COMPUTE_WORKERS = int(os.environ.get("SCAN_COMPUTE_WORKERS", "0")) or (os.cpu_count() or 1)
+MIN_COLUMNS_PER_SHARD = 64
+
+# (欄位名稱, shape, byte offset)
+Layout = list[tuple[str, tuple[int, ...], int]]
+
+_pool: ProcessPoolExecutor | None = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+# ──────────────────────────────────────────
+# Shared memory
+# ──────────────────────────────────────────
+
+class SharedArrays:
+    """把數個 float64 陣列放進同一塊 shared memory；with 區塊結束時釋放。"""
+
+    def __init__(self, arrays: dict[str, np.ndarray]):
+        self.layout: Layout = []
+        offset = 0
+        for name, arr in arrays.items():
+            self.layout.append((name, arr.shape, offset))
+            offset += arr.size * 8
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for name, arr in arrays.items():
+            view = _view(self.shm, self.layout, name)
+            view[...] = arr
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def __enter__(self) -> "SharedArrays":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _view(shm: shared_memory.SharedMemory, layout: Layout, name: str) -> np.ndarray:
+    for field, shape, offset in layout:
+        if field == name:
+            return np.ndarray(shape, dtype=np.float64, buffer=shm.buf, offset=offset)
+    raise KeyError(name)
+
+
+def _run_shared_shard(fn: Callable, shm_name: str, layout: Layout, lo: int, hi: int) -> dict:
+    """worker 端：attach → 取 [:, lo:hi] 的 view → 計算。"""
+    # 池內 worker 與父行程共用 resource_tracker，attach 時重複註冊無害，由父行程 unlink
+    shm = shared_memory.SharedMemory(name=shm_name)
+    views: dict[str, np.ndarray] = {}
+    try:
+        views = {field: _view(shm, layout, field)[..., lo:hi] for field, _shape, _offset in layout}
+        return fn(views)
+    finally:
+        views.clear()  # 釋放對 shm.buf 的參照後才能 close
+        shm.close()
+
+
+# ──────────────────────────────────────────
+# 行程池
+# ──────────────────────────────────────────
+
+def get_pool(workers: int) -> ProcessPoolExecutor:
+    """常駐行程池（面板運算與參數掃描共用）；worker 數改變時重建。以 forkserver/spawn 啟動，避免 fork 帶著執行緒鎖。"""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _shards(n_cols: int, workers: int) -> list[tuple[int, int]]:
+    n = max(1, min(workers, n_cols // MIN_COLUMNS_PER_SHARD))
+    bounds = np.linspace(0, n_cols, n + 1).astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+# ──────────────────────────────────────────
+# 分塊計算
+# ──────────────────────────────────────────
+
+def map_columns(
+    fn: Callable[[dict[str, np.ndarray]], dict[str, np.ndarray]],
+    arrays: dict[str, np.ndarray],
+    mode: str | None = None,
+    workers: int | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    以最後一軸（標的）切塊執行 fn，並把各塊結果依序串接。
+    fn 收 {欄位: 陣列 view}、回傳 {欄位: 一維陣列（每檔一個值）}；
+    process 模式下 fn 必須是模組層級函式（可被 pickle）。
+    """
+    mode = mode or COMPUTE_MODE
+    workers = workers or COMPUTE_WORKERS
+    n_cols = next(iter(arrays.values())).shape[-1]
+    shards = _shards(n_cols, workers)
+    if len(shards) <= 1:
+        return fn(arrays)
+
+    if mode == "process":
+        with SharedArrays(arrays) as shared:
+            pool = get_pool(workers)
+            futures = [pool.submit(_run_shared_shard, fn, shared.name, shared.layout, lo, hi) for lo, hi in shards]
+            parts = [f.result() for f in futures]
+    else:
+        with ThreadPoolExecutor(max_workers=len(shards)) as executor:
+            parts = list(executor.map(lambda b: fn({k: v[..., b[0]:b[1]] for k, v in arrays.items()}), shards))
+
+    return {k: np.concatenate([p[k] for p in parts]) for k in parts[0]}
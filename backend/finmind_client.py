@@ -0,0 +1,286 @@
+"""
+FinMind 三大法人買賣超 — 批次抓取 + 共用限流 + 日快取。
+
+- 以「單日全市場」為單位抓 TaiwanStockInstitutionalInvestorsBuySell（不帶 data_id），
+  14 天視窗約 10 次請求即涵蓋整個 universe，取代每檔一次請求 + sleep(1)。
+- 已過去的交易日資料不會再變，抓過即永久快取；當日資料在 TODAY_TTL 內不重抓。
+- 帳號等級不支援全市場查詢（API 明確回覆 UNSUPPORTED_STATUSES）時，改為逐檔查詢，
+  BULK_RETRY_AFTER 秒後再試；暫時性錯誤（5xx、逾時、429）只略過該次請求。
+- 所有請求共用 TokenBucket，執行緒等待 token 而不是固定 sleep。
+- 鎖只保護「缺哪些資料 / 誰正在抓」的簿記：每個 (scope, 日期) 同時只有一個執行緒在抓，
+  其他需要同一筆的呼叫端等它完成，不需要的呼叫端不受慢請求影響。
+"""
+from __future__ import annotations
+
+import datetime
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+import requests
+
+from cache_policy import TZ_TAIPEI
+
+FINMIND_CACHE_DB = os.environ.get(
+    "FINMIND_CACHE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "finmind.db")
+)
+FINMIND_RATE = float(os.environ.get("FINMIND_RATE", "1.0"))   # 每秒請求數
+FINMIND_BURST = float(os.environ.get("FINMIND_BURST", "5"))
+DATASET = "TaiwanStockInstitutionalInvestorsBuySell"
+TODAY_TTL = 1800          # 當日資料快取秒數（盤後才陸續公布）
+LOOKBACK_DAYS = 14
+TAIL_DAYS = 5
+
+BULK_SCOPE = "*"
+RATE_LIMITED = 402        # FinMind 超過請求上限時的 status
+UNSUPPORTED_STATUSES = (400, 403)   # 帳號等級不允許不帶 data_id 的查詢
+BULK_RETRY_AFTER = 6 * 3600
+INFLIGHT_WAIT = 60        # 等待其他執行緒抓同一筆資料的上限（秒）
+
+
+def _today() -> datetime.date:
+    """台灣當地日期（法人資料以台股交易日為準，不隨伺服器時區）。"""
+    return datetime.datetime.now(TZ_TAIPEI).date()
+
+
+class TokenBucket:
+    """執行緒安全的 token bucket：rate 個/秒，最多累積 capacity 個。"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class FinMindClient:
+    def __init__(
+        self,
+        token: str,
+        url: str,
+        limiter: TokenBucket | None = None,
+        cache_path: str = FINMIND_CACHE_DB,
+    ):
+        self.token = token
+        self.url = url
+        self.limiter = limiter or TokenBucket(FINMIND_RATE, FINMIND_BURST)
+        self.cache_path = cache_path
+        self.bulk_disabled_until = 0.0
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._inflight: set[tuple[str, str]] = set()    # 正在抓的 (scope, 日期)
+        self._cache_ready = False
+        self._cache_lock = threading.Lock()
+
+    @property
+    def bulk_supported(self) -> bool:
+        return time.time() >= self.bulk_disabled_until
+
+    # ── 快取 ─────────────────────────────
+    def _connect(self) -> sqlite3.Connection:
+        if not self._cache_ready:
+            # 建表完成後才標記就緒：同時第一次連線的執行緒不會讀到尚未建立的資料表
+            with self._cache_lock:
+                if not self._cache_ready:
+                    self._init_cache()
+                    self._cache_ready = True
+        return sqlite3.connect(self.cache_path, timeout=30)
+
+    def _init_cache(self) -> None:
+        conn = sqlite3.connect(self.cache_path, timeout=30)
+        c = conn.cursor()
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS inst_flow (
+                date     TEXT NOT NULL,
+                stock_id TEXT NOT NULL,
+                name     TEXT NOT NULL,
+                buy      INTEGER,
+                sell     INTEGER,
+                PRIMARY KEY (date, stock_id, name)
+            )
+        ''')
+        c.execute('''
+            CREATE TABLE IF NOT EXISTS inst_flow_fetch (
+                scope      TEXT NOT NULL,
+                date       TEXT NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (scope, date)
+            )
+        ''')
+        conn.commit()
+        conn.close()
+
+    def _is_fresh(self, conn: sqlite3.Connection, scope: str, date: str, today: str) -> bool:
+        row = conn.execute(
+            "SELECT fetched_at FROM inst_flow_fetch WHERE scope = ? AND date = ?", (scope, date)
+        ).fetchone()
+        if row is None:
+            return False
+        fetched_day = datetime.datetime.fromtimestamp(row[0], TZ_TAIPEI).date().isoformat()
+        # 過去交易日：在該日之後抓過就是最終資料；當日：TTL 內有效
+        if date < today:
+            return fetched_day > date
+        return time.time() - row[0] < TODAY_TTL
+
+    def _store(self, rows: list[dict], scope: str, dates: list[str]) -> None:
+        conn = self._connect()
+        try:
+            conn.executemany(
+                "INSERT OR REPLACE INTO inst_flow (date, stock_id, name, buy, sell) VALUES (?, ?, ?, ?, ?)",
+                [(r["date"], str(r["stock_id"]), r["name"], int(r["buy"]), int(r["sell"])) for r in rows],
+            )
+            now = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO inst_flow_fetch (scope, date, fetched_at) VALUES (?, ?, ?)",
+                [(scope, d, now) for d in dates],
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ── 請求 ─────────────────────────────
+    def _request(self, params: dict) -> dict:
+        self.limiter.acquire()
+        resp = requests.get(self.url, params={**params, "token": self.token}, timeout=10)
+        resp.raise_for_status()
+        return resp.json()
+
+    def _fetch_bulk_day(self, date: str) -> bool:
+        """抓單日全市場；回傳 False 代表帳號明確不支援全市場查詢（其他失敗拋例外）。"""
+        data = self._request({"dataset": DATASET, "start_date": date, "end_date": date})
+        status = data.get("status")
+        if status == RATE_LIMITED:
+            raise RuntimeError(data.get("msg", "FinMind 請求次數已達上限"))
+        if status in UNSUPPORTED_STATUSES:
+            return False
+        if status != 200:
+            raise requests.HTTPError(f"FinMind status {status}: {data.get('msg', '')}")
+        self._store(data.get("data") or [], BULK_SCOPE, [date])
+        return True
+
+    def _fetch_stock_range(self, stock_id: str, start: str, end: str) -> None:
+        data = self._request({"dataset": DATASET, "data_id": stock_id, "start_date": start, "end_date": end})
+        if data.get("status") != 200:
+            return
+        self._store(data.get("data") or [], stock_id, [end])
+
+    # ── 確保快取涵蓋 ─────────────────────
+    def _claim(self, keys: list[tuple[str, str]]) -> tuple[list[tuple[str, str]], list[tuple[str, str]]]:
+        """（持鎖呼叫）把尚未有人在抓的 key 登記給自己；回傳 (自己抓, 等別人抓)。"""
+        mine = [k for k in keys if k not in self._inflight]
+        self._inflight.update(mine)
+        return mine, [k for k in keys if k not in mine]
+
+    def _release(self, keys: list[tuple[str, str]]) -> None:
+        with self._done:
+            self._inflight.difference_update(keys)
+            self._done.notify_all()
+
+    def _wait_for(self, keys: list[tuple[str, str]]) -> None:
+        if not keys:
+            return
+        with self._done:
+            self._done.wait_for(lambda: not self._inflight.intersection(keys), timeout=INFLIGHT_WAIT)
+
+    def _missing(self, scopes: list[str], dates: list[str], today: str) -> list[tuple[str, str]]:
+        conn = self._connect()
+        try:
+            return [(s, d) for s in scopes for d in dates if not self._is_fresh(conn, s, d, today)]
+        finally:
+            conn.close()
+
+    def ensure_range(self, start: datetime.date, end: datetime.date, stock_ids: list[str]) -> None:
+        """讓快取涵蓋 [start, end] 內所有交易日（週末略過）的法人資料；網路請求期間不持鎖。"""
+        today = _today().isoformat()
+        days = [d.date().isoformat() for d in pd.bdate_range(start, end)]
+
+        if self.bulk_supported:
+            with self._lock:
+                mine, others = self._claim(self._missing([BULK_SCOPE], days, today))
+            unsupported = False
+            try:
+                for _scope, d in mine:
+                    try:
+                        if not self._fetch_bulk_day(d):
+                            unsupported = True
+                            break
+                    except RuntimeError:
+                        return  # 已達請求上限，本輪先用既有快取
+                    except Exception:
+                        continue
+            finally:
+                self._release(mine)
+            if not unsupported:
+                self._wait_for(others)
+                return
+            self.bulk_disabled_until = time.time() + BULK_RETRY_AFTER
+
+        # 逐檔：以 (代號, end) 為 key
+        with self._lock:
+            mine, others = self._claim(self._missing(stock_ids, [end.isoformat()], today))
+        try:
+            for s, _date in mine:
+                try:
+                    self._fetch_stock_range(s, start.isoformat(), end.isoformat())
+                except Exception:
+                    continue
+        finally:
+            self._release(mine)
+        self._wait_for(others)
+
+    # ── 查詢 ─────────────────────────────
+    def net_buys(
+        self,
+        stock_ids: list[str],
+        name: str = "Investment_Trust",
+        lookback_days: int = LOOKBACK_DAYS,
+        tail: int = TAIL_DAYS,
+    ) -> dict[str, int | None]:
+        """
+        各檔最近 tail 個有資料交易日的法人（預設投信）買賣超張數合計。
+        只讀快取；快取不足時先以批次請求補齊。
+        """
+        if not self.token or not stock_ids:
+            return {s: None for s in stock_ids}
+        end = _today()
+        start = end - datetime.timedelta(days=lookback_days)
+        try:
+            self.ensure_range(start, end, stock_ids)
+        except Exception:
+            pass
+
+        conn = self._connect()
+        try:
+            placeholders = ",".join("?" * len(stock_ids))
+            rows = conn.execute(
+                f"SELECT stock_id, date, buy, sell FROM inst_flow "
+                f"WHERE name = ? AND date >= ? AND date <= ? AND stock_id IN ({placeholders})",
+                (name, start.isoformat(), end.isoformat(), *stock_ids),
+            ).fetchall()
+        finally:
+            conn.close()
+
+        out: dict[str, int | None] = {s: None for s in stock_ids}
+        if not rows:
+            return out
+        df = pd.DataFrame(rows, columns=["stock_id", "date", "buy", "sell"])
+        df = df.sort_values("date").groupby("stock_id").tail(tail)
+        sums = df.groupby("stock_id")[["buy", "sell"]].sum()
+        for s, r in sums.iterrows():
+            out[s] = int(r["buy"] - r["sell"])
+        return out
@@ -0,0 +1,292 @@
+"""
+串流指標狀態 — 新 K 棒進來時 O(1) 更新 EMA 8/21/55、MACD、RSI、ATR、TD。
+
+遞迴平均只需前一根的狀態，不必每分鐘對整段視窗重算。
+數值與 stock_monitor 的 _calc_emas / _calc_macd / _calc_rsi / _calc_atr /
+_calc_td_sequential 相同（含四捨五入位數與「資料不足回傳 None」的門檻）。
+
+狀態可由本地 K 棒庫（bar_store）回放建立；盤中未收盤的最後一根以
+replace_last() 修正，不會重複累加。另保留最近 WINDOW_BARS 根 OHLCV，
+供 Z-Score / AVWAP / 風報比等視窗型指標使用（stock_monitor.scan_from_state）。
+"""
+from __future__ import annotations
+
+import math
+from collections import deque
+from typing import Callable
+
+import pandas as pd
+
+import bar_store
+
+WINDOW_BARS = 60           # 視窗型指標最長需要的根數（AVWAP 錨點回看 60 根）
+
+
+class EWMState:
+    """pandas Series.ewm(adjust=False).mean() 的 O(1) 版本（運算順序與 pandas 相同）。"""
+
+    __slots__ = ("alpha", "min_periods", "value", "nobs")
+
+    def __init__(self, alpha: float, min_periods: int = 0):
+        self.alpha = alpha
+        self.min_periods = max(min_periods, 1)
+        self.value: float | None = None
+        self.nobs = 0
+
+    @classmethod
+    def from_span(cls, span: int, min_periods: int = 0) -> "EWMState":
+        return cls(2.0 / (span + 1), min_periods)
+
+    def update(self, x: float) -> None:
+        if x is None or math.isnan(x):
+            return
+        self.nobs += 1
+        if self.value is None:
+            self.value = x
+        elif self.value != x:
+            old_wt = 1.0 - self.alpha
+            self.value = (old_wt * self.value + self.alpha * x) / (old_wt + self.alpha)
+
+    @property
+    def current(self) -> float | None:
+        return self.value if self.nobs >= self.min_periods else None
+
+    def copy(self) -> "EWMState":
+        other = EWMState.__new__(EWMState)
+        other.alpha, other.min_periods, other.value, other.nobs = self.alpha, self.min_periods, self.value, self.nobs
+        return other
+
+
+def _copy_state(state: dict) -> dict:
+    """狀態字典的複本：EWMState / deque 各自複製，其餘為不可變值直接共用。"""
+    return {k: v.copy() if isinstance(v, (EWMState, deque)) else v for k, v in state.items()}
+
+
+class StreamingIndicators:
+    """單一標的的串流指標狀態。"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self.n = 0
+        self.last_ts: pd.Timestamp | None = None
+        self.prev_close: float | None = None
+        self.closes: deque[float] = deque(maxlen=5)
+        self.window: deque[tuple] = deque(maxlen=WINDOW_BARS)   # (ts, high, low, close, volume)
+        self.td = 0
+        self.ema8 = EWMState.from_span(8)
+        self.ema21 = EWMState.from_span(21)
+        self.ema55 = EWMState.from_span(55)
+        self.ema12 = EWMState.from_span(12)
+        self.ema26 = EWMState.from_span(26)
+        self.macd_signal = EWMState.from_span(9)
+        self.avg_gain = EWMState(1 / period, period)
+        self.avg_loss = EWMState(1 / period, period)
+        self.atr = EWMState(1 / period, period)
+        self.ema8_prev: float | None = None
+        self.ema21_prev: float | None = None
+        self.hist_prev: float | None = None
+        self._before_last: dict | None = None
+
+    # ── 更新 ─────────────────────────────
+    def push(self, ts: pd.Timestamp | None, high: float, low: float, close: float, volume: float = math.nan) -> None:
+        """加入一根可能仍會修正的新 K 棒（保留修正用快照）。"""
+        self._before_last = self._snapshot()
+        self._apply(ts, high, low, close, volume)
+
+    def replace_last(self, ts: pd.Timestamp | None, high: float, low: float, close: float,
+                     volume: float = math.nan) -> None:
+        """以新值修正最後一根（盤中未收盤 K 棒）：回到前一根狀態後重新套用。"""
+        if self._before_last is None:
+            self.push(ts, high, low, close, volume)
+            return
+        self.__dict__.update(_copy_state(self._before_last))
+        self._apply(ts, high, low, close, volume)
+
+    def on_bar(self, ts: pd.Timestamp, high: float, low: float, close: float, volume: float = math.nan) -> None:
+        """依時間戳自動判斷是新 K 棒或修正最後一根；早於最後一根者忽略。"""
+        self.extend([(ts, high, low, close, volume)])
+
+    def extend(self, bars: list[tuple]) -> None:
+        """
+        依序套用 (ts, high, low, close, volume)：與最後一根同 ts 者視為修正，早於者忽略。
+        後面還有新 K 棒的都已收盤，直接套用；只有最後一根保留修正用快照。
+        """
+        if self.last_ts is not None:
+            bars = [b for b in bars if b[0] >= self.last_ts]
+            if bars and bars[0][0] == self.last_ts:
+                self.replace_last(*bars[0])
+                bars = bars[1:]
+        if not bars:
+            return
+        for bar in bars[:-1]:
+            self._apply(*bar)
+        self.push(*bars[-1])
+
+    def _snapshot(self) -> dict:
+        return _copy_state({k: v for k, v in self.__dict__.items() if k != "_before_last"})
+
+    def _apply(self, ts, high: float, low: float, close: float, volume: float = math.nan) -> None:
+        self.ema8_prev = self.ema8.value
+        self.ema21_prev = self.ema21.value
+        line = self._macd_line()
+        self.hist_prev = line - self.macd_signal.value if line is not None and self.macd_signal.value is not None else None
+
+        # TD Sequential：與 4 根前比較
+        if len(self.closes) == 4 or len(self.closes) == 5:
+            ref = self.closes[-4]
+            if close > ref:
+                self.td = min(self.td + 1, 9) if self.td >= 0 else 1
+            elif close < ref:
+                self.td = max(self.td - 1, -9) if self.td <= 0 else -1
+            else:
+                self.td = 0
+        self.closes.append(close)
+        self.window.append((ts, high, low, close, volume))
+
+        # ATR：首根 TR = high - low
+        if self.prev_close is None:
+            tr = high - low
+        else:
+            tr = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        self.atr.update(tr)
+
+        # RSI：首根無 delta
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self.avg_gain.update(max(delta, 0.0))
+            self.avg_loss.update(max(-delta, 0.0))
+
+        for ema in (self.ema8, self.ema21, self.ema55, self.ema12, self.ema26):
+            ema.update(close)
+        self.macd_signal.update(self._macd_line())
+
+        self.prev_close = close
+        self.last_ts = ts
+        self.n += 1
+
+    def _macd_line(self) -> float | None:
+        if self.ema12.value is None or self.ema26.value is None:
+            return None
+        return self.ema12.value - self.ema26.value
+
+    # ── 讀值 ─────────────────────────────
+    def values(self) -> dict:
+        """目前指標值，位數與 None 門檻同 scan_ticker。"""
+        out: dict = {"bars": self.n, "td_count": self.td if self.n >= 5 else 0,
+                     "rsi": None, "atr": None, "macd": None, "emas": None}
+        if self.n >= self.period + 1:
+            loss = self.avg_loss.current
+            if loss == 0:
+                out["rsi"] = 100.0
+            elif loss is not None:
+                out["rsi"] = round(100 - 100 / (1 + self.avg_gain.current / loss), 2)
+            atr = self.atr.current
+            out["atr"] = round(atr, 4) if atr is not None else None
+        if self.n >= 35:
+            line = self._macd_line()
+            out["macd"] = {
+                "line": round(line, 4),
+                "hist": round(line - self.macd_signal.value, 4),
+                "hist_prev": round(self.hist_prev, 4),
+            }
+        if self.n >= 56:
+            out["emas"] = {
+                "ema8": round(self.ema8.value, 2),
+                "ema21": round(self.ema21.value, 2),
+                "ema55": round(self.ema55.value, 2),
+                "ema8_prev": round(self.ema8_prev, 2),
+                "ema21_prev": round(self.ema21_prev, 2),
+            }
+        return out
+
+    def frame(self) -> pd.DataFrame:
+        """最近 WINDOW_BARS 根的 High / Low / Close / Volume（與 scan_ticker 的 df 欄位相同）。"""
+        rows = list(self.window)
+        return pd.DataFrame(
+            [r[1:] for r in rows], columns=["High", "Low", "Close", "Volume"], index=[r[0] for r in rows],
+        )
+
+    # ── 建立 ─────────────────────────────
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "StreamingIndicators":
+        """由既有 K 棒回放建立狀態（僅建立時一次 O(n)）。"""
+        state = cls()
+        state.extend(_bars(df))
+        return state
+
+    @classmethod
+    def from_store(cls, symbol: str, interval: str, period: str) -> "StreamingIndicators | None":
+        """由本地 K 棒庫最近 period 的資料回放建立狀態；庫內無資料回傳 None。"""
+        df = bar_store.load_bars(symbol, interval, bar_store.period_start(period))
+        if df is None:
+            return None
+        return cls.from_frame(df)
+
+
+def _bars(df: pd.DataFrame) -> list[tuple]:
+    """DataFrame → (ts, high, low, close, volume)；與 stock_monitor._clean_stock_frame 相同，缺值列略過。"""
+    df = df[["High", "Low", "Close", "Volume"]].dropna()
+    return [
+        (ts, float(h), float(lo), float(c), float(v))
+        for ts, h, lo, c, v in zip(df.index, df["High"], df["Low"], df["Close"], df["Volume"])
+    ]
+
+
+class IndicatorBook:
+    """
+    觀察清單的串流指標：每個 symbol 一份狀態。
+    refresh() 只向上游增量同步 K 棒庫，再把最後一根之後的 K 棒餵進狀態（盤中修正最後一根為 O(1)）。
+
+    EMA 類指標與起算 K 棒有關，因此狀態記住建立時的視窗標記（bar_store.window_marks：
+    完整下載的起點 + 視窗內第一根 ts）。標記改變時整段由 K 棒庫重新回放：
+    - 還原權值改寫 / 重抓：bar_store 整段替換，covered_from 改變；
+    - 視窗起點往後移（日K 每天一次）：第一根 ts 改變。
+    因此任何時刻的數值都與 scan_ticker 以同一視窗計算的結果一致。
+    """
+
+    def __init__(self, interval: str, period: str, fetch: Callable[..., dict],
+                 is_fresh: Callable[[float], bool] | None = None):
+        self.interval = interval
+        self.period = period
+        self.fetch = fetch
+        self.is_fresh = is_fresh
+        self.states: dict[str, StreamingIndicators] = {}
+        self.marks: dict[str, tuple] = {}
+
+    def refresh(self, symbols: list[str]) -> dict[str, StreamingIndicators]:
+        """同步並更新狀態；回傳 {symbol: 狀態}（庫內無資料者不列）。"""
+        symbols = list(dict.fromkeys(symbols))
+        bar_store.sync_bars(symbols, self.interval, self.period, self.fetch, is_fresh=self.is_fresh, load=False)
+        window_start = bar_store.period_start(self.period)
+        marks = bar_store.window_marks(symbols, self.interval, window_start)
+        reseed = {s for s in symbols if s not in self.states or self.marks.get(s) != marks.get(s)}
+        starts = {s: window_start if s in reseed else self.states[s].last_ts for s in symbols}
+        frames = bar_store.load_many(symbols, self.interval, starts)
+
+        out: dict[str, StreamingIndicators] = {}
+        for sym in symbols:
+            df = frames.get(sym)
+            if sym in reseed:
+                self.states.pop(sym, None)
+                self.marks.pop(sym, None)
+                if df is None:
+                    continue
+                self.states[sym] = StreamingIndicators.from_frame(df)
+                self.marks[sym] = marks.get(sym)
+            elif df is not None:
+                self.states[sym].extend(_bars(df))
+            out[sym] = self.states[sym]
+        return out
+
+    def retain(self, symbols: list[str]) -> None:
+        """只保留 symbols 的狀態（觀察清單縮小時釋放記憶體）。"""
+        keep = set(symbols)
+        for sym in [s for s in self.states if s not in keep]:
+            self.states.pop(sym, None)
+            self.marks.pop(sym, None)
+
+    def reseed(self, symbols: list[str] | None = None) -> None:
+        """丟棄狀態，下次 refresh() 由 K 棒庫目前的視窗重新回放。"""
+        for sym in (symbols if symbols is not None else list(self.states)):
+            self.states.pop(sym, None)
+            self.marks.pop(sym, None)
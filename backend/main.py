@@ -1,9 +1,21 @@
 from fastapi import FastAPI, Query
+from pydantic import BaseModel
+from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
+import json
 import sqlite3
+from dataclasses import asdict
 from dotenv import load_dotenv
+import os
 import scraper
 import stock_monitor
+import screener_scheduler
+import compute_pool
+import watch_hub
+import backtest
+import sector_rotation
+import alerts
+import signal_history
 
 load_dotenv()
 
@@ -21,10 +33,24 @@ app.add_middleware(
     CORSMiddleware,
     allow_origins=ALLOWED_ORIGINS,
     allow_credentials=True,
-    allow_methods=["GET"],
-    allow_headers=[],
+    allow_methods=["GET", "POST", "DELETE"],
+    allow_headers=["Content-Type"],
 )
 
+@app.on_event("startup")
+def start_background_jobs():
+    """啟動背景 Screener 排程（SCREENER_SCHEDULER=0 可關閉），並載入警示規則（釘選其代號到 watch_hub 輪詢）。"""
+    alerts.engine.load()
+    if os.environ.get("SCREENER_SCHEDULER", "1") != "0":
+        screener_scheduler.scheduler.start()
+
+
+@app.on_event("shutdown")
+def stop_background_jobs():
+    screener_scheduler.scheduler.stop()
+    compute_pool.shutdown()
+
+
 @app.get("/api/recommendations")
 def get_recommendations():
     conn = sqlite3.connect("influencer.db")
@@ -54,29 +80,133 @@ def search_recommendations(
 @app.get("/api/stock/scan")
 def stock_scan(
     tickers: str = Query(..., description="逗號分隔的台股代號，如 2330,2317,0050"),
+    stream: bool = Query(False, description="1 = NDJSON 串流，每完成一檔送出一行"),
+    timeout: float = Query(stock_monitor.SCAN_DEADLINE, gt=0, le=120, description="整批時限（秒），逾時標的回報「逾時」"),
+    mtf: bool = Query(False, description="1 = 附多週期確認（週K / 月K / 盤中）"),
 ):
     """掃描台股標的，回傳技術指標與籌碼面訊號。"""
     ticker_list = [t.strip() for t in tickers.split(",") if t.strip()]
     if not ticker_list:
         return {"error": "tickers 不可為空"}
-    return stock_monitor.run_scan(ticker_list)
+    if stream:
+        lines = (json.dumps(event, ensure_ascii=False) + "\n" for event in stock_monitor.stream_scan(ticker_list, timeout, mtf))
+        return StreamingResponse(lines, media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+    return stock_monitor.run_scan(ticker_list, timeout, mtf)
+
+
+@app.get("/api/stock/backtest")
+def stock_backtest(
+    tickers: str = Query(..., description=f"逗號分隔的台股代號（最多 {backtest.MAX_TICKERS} 檔）"),
+    years: int = Query(10, ge=1, le=backtest.MAX_YEARS, description="回測年數"),
+    entry_score: int = Query(backtest.ENTRY_SCORE, description="收盤得分 >= 此值隔日開盤進場"),
+    exit_score: int = Query(backtest.EXIT_SCORE, description="收盤得分 <= 此值隔日開盤出場"),
+    max_hold: int | None = Query(None, ge=1, description="最長持有 K 棒數"),
+):
+    """以得分制模型回測（含 ATR 停損與台股手續費、證交稅）。"""
+    ticker_list = list(dict.fromkeys(t.strip() for t in tickers.split(",") if t.strip()))
+    if not ticker_list:
+        return {"error": "tickers 不可為空"}
+    if len(ticker_list) > backtest.MAX_TICKERS:
+        return {"error": f"tickers 最多 {backtest.MAX_TICKERS} 檔"}
+    return backtest.run_backtest(
+        ticker_list, years=years, entry_score=entry_score, exit_score=exit_score, max_hold=max_hold,
+    )
+
+
+@app.get("/api/stock/watch")
+async def stock_watch(
+    tickers: str = Query(..., description="逗號分隔的台股代號（最多 50 檔）"),
+):
+    """
+    訂閱觀察清單（Server-Sent Events）：先送 snapshot，之後每輪只推送有變動的欄位。
+    所有訂閱者的代號由同一個背景輪詢去重後整批掃描。
+    """
+    ticker_list = [t.strip() for t in tickers.split(",") if t.strip()]
+    if not ticker_list:
+        return {"error": "tickers 不可為空"}
+    return StreamingResponse(
+        watch_hub.stream(ticker_list),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/api/stock/chart/{ticker}")
 def stock_chart(
     ticker: str,
-    interval: str = Query("1d", description="1d | 1h | 1m"),
+    interval: str = Query("1d", pattern=r"^(1d|1h|\d{1,3}m)$", description="1d | 1h | 1m | 2–270m，如 5m / 15m / 30m / 60m（分K 由 1m 重新取樣）"),
+    columnar: bool = Query(False, description="1 = 欄式回應（每個欄位一個陣列）"),
+    max_points: int | None = Query(None, ge=3, le=10000, description="LTTB 降採樣後的最大點數"),
+    start: str | None = Query(None, description="可視範圍起點 YYYY-MM-DD[ HH:MM]（台灣時間）"),
+    end: str | None = Query(None, description="可視範圍終點 YYYY-MM-DD[ HH:MM]（含）"),
+    since: str | None = Query(None, description="上次回應的 cursor；只回傳新增與修正的 K 棒"),
 ):
-    """取得台股 K 線圖資料（含大盤 ^TWII 用於 RS Line）。"""
-    return stock_monitor.get_chart_data(ticker, interval)
+    """取得台股 K 線圖資料（含大盤 ^TWII 用於 RS Line）；可指定範圍、降採樣點數或增量輪詢。"""
+    return stock_monitor.get_chart_data(
+        ticker, interval, columnar=columnar, max_points=max_points, start=start, end=end, since=since,
+    )
 
 
 @app.get("/api/stock/screener")
 def stock_screener(
     min_score: int = Query(5, ge=0, le=10, description="最低得分門檻"),
+    fresh: bool = Query(False, description="1 = 立即重新掃描再回傳"),
+):
+    """從背景排程的快照篩選符合得分條件的標的（附快照版本與年齡）。"""
+    return screener_scheduler.get_screener(min_score, fresh)
+
+
+def _ticker_list(tickers: str | None) -> list[str] | None:
+    if not tickers:
+        return None
+    return [t.strip() for t in tickers.split(",") if t.strip()] or None
+
+
+@app.get("/api/stock/history/latest")
+def stock_history_latest(
+    tickers: str | None = Query(None, description="逗號分隔的台股代號；省略為全部"),
+):
+    """各檔最近一次掃描的指標列（來自訊號歷史庫，不重新掃描）。"""
+    return {"results": signal_history.latest(_ticker_list(tickers))}
+
+
+@app.get("/api/stock/history/changes")
+def stock_history_changes(
+    since: str = Query(..., description="YYYY-MM-DD[ HH:MM]（台灣時間）；與當時最後一筆比較"),
+    tickers: str | None = Query(None, description="逗號分隔的台股代號；省略為全部"),
+):
+    """since 之後訊號或得分有變動的標的（附變動前後的指標列）。"""
+    try:
+        changes = signal_history.changes_since(since, _ticker_list(tickers))
+    except ValueError:
+        return {"error": "since 格式錯誤，需為 YYYY-MM-DD[ HH:MM]"}
+    return {"since": since, "changes": changes}
+
+
+@app.get("/api/stock/history/{ticker}")
+def stock_history(
+    ticker: str,
+    start: str | None = Query(None, description="起點 YYYY-MM-DD[ HH:MM]（台灣時間）"),
+    end: str | None = Query(None, description="終點 YYYY-MM-DD[ HH:MM]（含）"),
+    limit: int = Query(signal_history.HISTORY_LIMIT, ge=1, le=signal_history.HISTORY_LIMIT, description="最多筆數（保留最新）"),
+):
+    """單檔歷次掃描的得分 / 訊號 / 指標走勢（欄式回應）。"""
+    try:
+        return signal_history.history(ticker, start, end, limit)
+    except ValueError:
+        return {"error": "start / end 格式錯誤，需為 YYYY-MM-DD[ HH:MM]"}
+
+
+@app.get("/api/stock/news")
+def stock_news_batch(
+    tickers: str = Query(..., description="逗號分隔的台股代號（最多 50 檔）"),
+    limit: int = Query(8, ge=1, le=20, description="每檔最多回傳幾則新聞"),
 ):
-    """掃描預設清單，回傳符合得分條件的標的。"""
-    return stock_monitor.run_screener(min_score)
+    """一次查詢多檔新聞（觀察清單用），回傳 {results: {ticker: {...}}}。"""
+    ticker_list = [t.strip() for t in tickers.split(",") if t.strip()]
+    if not ticker_list:
+        return {"error": "tickers 不可為空"}
+    return stock_monitor.get_news_batch(ticker_list, limit)
 
 
 @app.get("/api/stock/news/{ticker}")
@@ -90,10 +220,73 @@ def stock_news(
 
 @app.get("/api/stock/sector-overview")
 def stock_sector_overview():
-    """取得各板塊近期漲跌概況（5分鐘快取）。"""
+    """取得各板塊近期漲跌概況（依交易時段快取；過期時回傳舊資料並背景更新，附 data_age）。"""
     return stock_monitor.get_sector_overview()
 
 
+@app.get("/api/stock/sector-rotation")
+def stock_sector_rotation():
+    """板塊 / 產業相對大盤強弱（5/20/60/120 日）、排名變化與廣度（預先計算，讀快取）。"""
+    return sector_rotation.get_rotation()
+
+
+class AlertRuleIn(BaseModel):
+    owner: str
+    ticker: str
+    field: str
+    op: str
+    value: float | str | None = None
+    ref: str | None = None
+    webhook: str | None = None
+
+
+@app.post("/api/alerts")
+def create_alert(rule: AlertRuleIn):
+    """
+    新增警示規則：field op value（常數）或 field op ref（同檔另一欄位），例如
+    close > ref=avwap、signal == 滿分買進、rsi <= 30、close <= ref=stop_loss。
+    條件由不成立變成成立時觸發一次。
+    """
+    try:
+        created = alerts.engine.add_rule(
+            rule.owner, rule.ticker.strip(), rule.field, rule.op, rule.value, rule.ref, rule.webhook,
+        )
+    except ValueError as e:
+        return {"error": str(e)}
+    return {"rule": asdict(created)}
+
+
+@app.get("/api/alerts")
+def list_alerts(owner: str = Query(..., description="規則擁有者")):
+    return {"rules": alerts.engine.list_rules(owner)}
+
+
+@app.delete("/api/alerts/{rule_id}")
+def delete_alert(rule_id: int, owner: str = Query(..., description="規則擁有者")):
+    if not alerts.engine.remove_rule(rule_id, owner):
+        return {"error": "找不到規則"}
+    return {"deleted": rule_id}
+
+
+@app.get("/api/alerts/events")
+def alert_events(
+    owner: str = Query(..., description="規則擁有者"),
+    since: int = Query(0, ge=0, description="上次收到的事件 id；只回傳之後的事件"),
+):
+    """輪詢已觸發的警示（每位 owner 保留最近 EVENT_BUFFER 筆）。"""
+    return {"events": alerts.engine.recent_events(owner, since)}
+
+
+@app.get("/api/alerts/stream")
+async def alert_stream(owner: str = Query(..., description="規則擁有者")):
+    """訂閱警示（Server-Sent Events，event: alert）。"""
+    return StreamingResponse(
+        alerts.stream(owner),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.get("/health")
 def health_check():
     """Health check endpoint for Render."""
@@ -0,0 +1,267 @@
+"""
+背景 Screener 排程 — 定期掃描 SCREENER_TICKERS（或全市場）並保存版本化快照。
+
+- 盤中每 SCREENER_INTERVAL 秒掃一次；收盤後（SESSION_CLOSE + SCREENER_CLOSE_DELAY）再掃一次定版。
+- /api/stock/screener 只讀快照：快照已依得分排序，min_score 篩選為一次二分搜尋。
+- 快照寫入 SCREENER_SNAPSHOT_PATH（JSON，原子替換）；多個 gunicorn worker 以檔案鎖
+  選出一個負責排程，其他 worker 偵測檔案更新後重新載入。
+- 掃描本身也以檔案鎖（快照路徑 + .scan.lock）序列化：fresh=1 或尚無快照的請求拿到鎖後
+  先讀檔，若已有在請求到達後（容許 SCREENER_FRESH_MIN_AGE 秒）產生的快照就直接回傳，
+  不會在多個 worker 各掃一次、寫出互相覆蓋的版本。
+- SCREENER_UNIVERSE=full 時改掃 universe.py 清單中的全部上市櫃標的
+  （stock_monitor.scan_full_market），掃描進度可由 scan_progress 查詢。
+- 同一個排程順便預熱基準指數序列（stock_monitor.refresh_benchmarks）與板塊輪動矩陣（sector_rotation）。
+"""
+from __future__ import annotations
+
+import bisect
+import contextlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+import cache_policy
+import sector_rotation
+import stock_monitor
+
+try:
+    import fcntl
+except ImportError:  # Windows：沒有檔案鎖，每個行程都自行排程
+    fcntl = None
+
+SCREENER_INTERVAL = float(os.environ.get("SCREENER_INTERVAL", "300"))
+SCREENER_CLOSE_DELAY = float(os.environ.get("SCREENER_CLOSE_DELAY", "300"))
+SCREENER_SNAPSHOT_PATH = os.environ.get(
+    "SCREENER_SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "screener_snapshot.json")
+)
+SCREENER_LOCK_PATH = SCREENER_SNAPSHOT_PATH + ".lock"
+SCREENER_FRESH_MIN_AGE = float(os.environ.get("SCREENER_FRESH_MIN_AGE", "60"))   # fresh=1 可接受的快照年齡
+SCREENER_UNIVERSE = os.environ.get("SCREENER_UNIVERSE", "default")   # "default" | "full"
+TICK_SECONDS = 30
+
+
+@dataclass
+class ScreenerSnapshot:
+    version: int
+    created_at: float
+    scanned_at: str
+    total_scanned: int
+    results: list[dict]                       # 有得分者，依得分由高到低
+    neg_scores: list[int] = field(default_factory=list)
+
+    @classmethod
+    def build(cls, version: int, universe: dict, total_scanned: int) -> "ScreenerSnapshot":
+        scored = [r for r in universe["results"] if r.get("score") is not None]
+        scored.sort(key=lambda r: r["score"], reverse=True)
+        return cls(
+            version=version,
+            created_at=time.time(),
+            scanned_at=universe["scanned_at"],
+            total_scanned=total_scanned,
+            results=scored,
+            neg_scores=[-r["score"] for r in scored],
+        )
+
+    def filter(self, min_score: int) -> list[dict]:
+        """得分 >= min_score 的標的（已排序）；O(log n)。"""
+        return self.results[:bisect.bisect_right(self.neg_scores, -min_score)]
+
+    def to_json(self) -> dict:
+        return {
+            "version": self.version,
+            "created_at": self.created_at,
+            "scanned_at": self.scanned_at,
+            "total_scanned": self.total_scanned,
+            "results": self.results,
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "ScreenerSnapshot":
+        results = data["results"]
+        return cls(
+            version=data["version"],
+            created_at=data["created_at"],
+            scanned_at=data["scanned_at"],
+            total_scanned=data["total_scanned"],
+            results=results,
+            neg_scores=[-r["score"] for r in results],
+        )
+
+
+class ScreenerScheduler:
+    def __init__(self, path: str = SCREENER_SNAPSHOT_PATH, interval: float = SCREENER_INTERVAL):
+        self.path = path
+        self.scan_lock_path = path + ".scan.lock"
+        self.interval = interval
+        self.snapshot: ScreenerSnapshot | None = None
+        self._mtime: float | None = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock_file = None
+        self.progress: dict | None = None   # 全市場掃描進度（僅執行掃描的 worker 有值）
+
+    # ── 快照存取 ─────────────────────────
+    def _load(self) -> None:
+        """檔案比記憶體新時重新載入（其他 worker 寫入的快照）。"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if self._mtime is not None and mtime <= self._mtime:
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                snap = ScreenerSnapshot.from_json(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return
+        self._mtime = mtime
+        if self.snapshot is None or snap.version >= self.snapshot.version:
+            self.snapshot = snap
+
+    def _save(self, snap: ScreenerSnapshot) -> None:
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap.to_json(), f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+            self._mtime = os.path.getmtime(self.path)
+        except OSError:
+            pass
+
+    def get_snapshot(self) -> ScreenerSnapshot | None:
+        self._load()
+        return self.snapshot
+
+    @contextlib.contextmanager
+    def _scan_lock(self):
+        """行程內（_refresh_lock）與跨 worker（檔案鎖）都只允許一個掃描。"""
+        with self._refresh_lock:
+            if fcntl is None:
+                yield
+                return
+            try:
+                lock_file = open(self.scan_lock_path, "w")
+            except OSError:
+                yield
+                return
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                yield
+            finally:
+                lock_file.close()
+
+    def refresh(self, newer_than: float | None = None) -> ScreenerSnapshot:
+        """
+        重新掃描並發布新版本快照；同時間（跨 worker）只會有一個掃描在跑。
+        newer_than：拿到鎖後若快照的 created_at >= newer_than（等鎖期間別人已掃完），直接回傳該快照。
+        """
+        with self._scan_lock():
+            self._load()
+            if newer_than is not None and self.snapshot is not None and self.snapshot.created_at >= newer_than:
+                return self.snapshot
+            if SCREENER_UNIVERSE == "full":
+                universe = stock_monitor.scan_full_market(progress=self._on_progress)
+            else:
+                universe = stock_monitor.scan_screener_universe()
+            version = (self.snapshot.version if self.snapshot else 0) + 1
+            total = universe.get("total", len(stock_monitor.SCREENER_TICKERS))
+            snap = ScreenerSnapshot.build(version, universe, total)
+            self.snapshot = snap
+            self._save(snap)
+            return snap
+
+    def _on_progress(self, progress: dict) -> None:
+        self.progress = {**progress, "updated_at": time.time()}
+
+    # ── 排程 ─────────────────────────────
+    def _due_after(self, now: float) -> float | None:
+        """目前快照至少要在這個時間之後產生才算新；None 表示現在不需要新快照。"""
+        if cache_policy.session_state(now) == "open":
+            return now - self.interval
+        # 收盤後補一次定版快照
+        close = cache_policy.last_close(now, delay=SCREENER_CLOSE_DELAY)
+        return close.timestamp() if close is not None else None
+
+    def is_due(self, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        snap = self.snapshot
+        if snap is None:
+            return True
+        due_after = self._due_after(now)
+        return due_after is not None and snap.created_at < due_after
+
+    def _acquire_leader(self) -> bool:
+        if fcntl is None:
+            return True
+        try:
+            self._lock_file = open(SCREENER_LOCK_PATH, "w")
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            if self._lock_file is not None:
+                self._lock_file.close()
+                self._lock_file = None
+            return False
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            if self._lock_file is not None or self._acquire_leader():
+                self._load()
+                if self.is_due():
+                    try:
+                        # fresh 請求可能剛掃完：拿到掃描鎖後再判斷一次
+                        self.refresh(newer_than=self._due_after(time.time()) or 0.0)
+                    except Exception:
+                        pass
+                # 基準指數（^TWII / ^GSPC）寫進共用 K 棒庫，其他 worker 讀庫即可
+                try:
+                    stock_monitor.refresh_benchmarks()
+                except Exception:
+                    pass
+                # 板塊輪動矩陣：過期時在背景重算，API 讀取不必等
+                try:
+                    sector_rotation.get_rotation()
+                except Exception:
+                    pass
+            self._stop.wait(TICK_SECONDS)
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="screener-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+scheduler = ScreenerScheduler()
+
+
+def get_screener(min_score: int = 5, fresh: bool = False) -> dict:
+    """
+    從快照回傳得分 >= min_score 的標的。
+    fresh=True 時回傳 SCREENER_FRESH_MIN_AGE 秒內的快照（沒有就同步重掃，並與同時間的 fresh 請求合併）；
+    尚無快照時等待正在進行的掃描。回應附 snapshot_version / snapshot_age（秒）。
+    """
+    snap = scheduler.get_snapshot()
+    if fresh:
+        # 等鎖期間其他請求 / worker 完成的掃描也算數；SCREENER_FRESH_MIN_AGE 內的快照不重掃
+        snap = scheduler.refresh(newer_than=time.time() - SCREENER_FRESH_MIN_AGE)
+    elif snap is None:
+        # 尚無快照：排隊等目前的掃描（多半是 leader 的首輪排程）寫檔，讀它的結果
+        snap = scheduler.refresh(newer_than=0.0)
+    return {
+        "results": snap.filter(min_score),
+        "total_scanned": snap.total_scanned,
+        "scanned_at": snap.scanned_at,
+        "snapshot_version": snap.version,
+        "snapshot_age": round(time.time() - snap.created_at, 1),
+        "scan_progress": scheduler.progress,
+    }
@@ -0,0 +1,195 @@
+"""
+板塊輪動 — 各板塊 / 產業相對大盤（^TWII）的強弱矩陣。
+
+- 相對強弱 RS：成分股 N 日報酬相對大盤 N 日報酬（(1 + r) / (1 + r_大盤) - 1），
+  板塊值為成分股等權平均；N = ROTATION_WINDOWS（5/20/60/120 日）。
+- 排名變化：與 RANK_LAG 根 K 棒前的同窗 RS 排名相比（正值 = 名次上升）。
+- 廣度：成分股收盤高於 EMA21 的比例。
+- 成分股少於 MIN_MEMBERS 檔的板塊 / 產業不列入、也不參與排名。
+- 全市場（get_universe）的收盤整理成 日期 × 標的 矩陣，所有窗、所有板塊一次以矩陣運算完成
+  （分組平均 = 報酬矩陣 × 成員 one-hot 矩陣），不逐板塊迴圈。
+- 結果以 stale_while_revalidate 快取，背景排程（screener_scheduler）定期預熱，讀取為 O(1)。
+"""
+from __future__ import annotations
+
+import datetime
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+import stock_monitor
+from cache_policy import stale_while_revalidate
+
+ROTATION_WINDOWS = (5, 20, 60, 120)
+ROTATION_PERIOD = "1y"     # 最長窗 120 + 排名比較 RANK_LAG + EMA21 暖身
+RANK_LAG = 5
+EMA_SPAN = 21
+MIN_MEMBERS = 3            # 成分股少於此數的板塊 / 產業不列入（單一個股不算輪動）
+
+
+def _classification(ticker: str) -> tuple[str, str]:
+    """(板塊, 產業)：先查 TW_STOCK_SECTORS，再查全市場清單。"""
+    known = stock_monitor.TW_STOCK_SECTORS.get(ticker)
+    if known:
+        return known
+    listing = stock_monitor._LISTING.get(ticker)
+    if listing is not None:
+        return listing.sector, listing.industry
+    return "", ""
+
+
+def _days(index: pd.Index) -> np.ndarray:
+    """當地日期（datetime64[D]，去掉時區與時間），供個股與大盤對齊。"""
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return index.to_numpy().astype("datetime64[D]")
+
+
+def _close_matrix(frames: dict[str, pd.DataFrame | None], dates: pd.DatetimeIndex) -> pd.DataFrame:
+    """日期 × 標的 收盤矩陣，以大盤交易日為列；停牌日沿用前一收盤。"""
+    days = _days(dates)
+    tickers = [t for t, df in frames.items() if df is not None and not df.empty and "Close" in df]
+    mat = np.full((len(days), len(tickers)), np.nan)
+    for j, t in enumerate(tickers):
+        df = frames[t]
+        own = _days(df.index)
+        pos = np.searchsorted(days, own)
+        ok = pos < len(days)
+        ok[ok] = days[pos[ok]] == own[ok]   # 大盤沒有的日期（資料錯置）略過；重複日期取最後一筆
+        mat[pos[ok], j] = df["Close"].to_numpy(dtype=float)[ok]
+    return pd.DataFrame(mat, index=dates, columns=tickers).ffill()
+
+
+def _window_returns(mat: np.ndarray, window: int, end: int) -> np.ndarray:
+    """mat 各欄在第 end 列（含）為止的 window 日報酬；資料不足為 NaN。"""
+    if end - window < 0:
+        return np.full(mat.shape[1:], np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return mat[end] / mat[end - window] - 1
+
+
+def _group_mean(values: np.ndarray, members: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    values: (..., 標的)；members: (標的, 組) one-hot。
+    回傳 (各組忽略 NaN 的平均, 各組有效成員數)。
+    """
+    valid = ~np.isnan(values)
+    sums = np.where(valid, values, 0.0) @ members
+    counts = valid.astype(float) @ members
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan), counts
+
+
+def _ranks(values: np.ndarray) -> np.ndarray:
+    """各列由大到小排名（1 起算）；NaN 不排名。"""
+    ranks = np.full(values.shape, np.nan)
+    for i, row in enumerate(values):
+        ok = ~np.isnan(row)
+        order = np.argsort(-row[ok], kind="stable")
+        r = np.empty(ok.sum())
+        r[order] = np.arange(1, ok.sum() + 1)
+        ranks[i, ok] = r
+    return ranks
+
+
+def _num(x: float, digits: int = 4) -> float | None:
+    return None if np.isnan(x) else round(float(x), digits)
+
+
+def compute_rotation(
+    closes: pd.DataFrame,
+    benchmark: pd.Series,
+    groups: dict[str, tuple[str, str]],
+    windows: tuple[int, ...] = ROTATION_WINDOWS,
+) -> dict:
+    """
+    closes：日期 × 標的 收盤（已對齊 benchmark 的交易日）；groups：{ticker: (板塊, 產業)}。
+    回傳 {as_of, windows, sectors[], industries[]}，各列依第二個窗（20 日）的 RS 排名排序。
+    """
+    tickers = [t for t in closes.columns if t in groups]
+    mat = closes[tickers].to_numpy(dtype=float)
+    bench = benchmark.to_numpy(dtype=float)
+    last = len(mat) - 1
+
+    # (窗, 標的)：現在與 RANK_LAG 根前的相對強弱
+    rs_now = np.stack([
+        (1 + _window_returns(mat, w, last)) / (1 + _window_returns(bench, w, last)) - 1 for w in windows
+    ]) if tickers else np.empty((len(windows), 0))
+    rs_prev = np.stack([
+        (1 + _window_returns(mat, w, last - RANK_LAG)) / (1 + _window_returns(bench, w, last - RANK_LAG)) - 1
+        for w in windows
+    ]) if tickers else np.empty((len(windows), 0))
+
+    ema = closes[tickers].ewm(span=EMA_SPAN, adjust=False).mean().to_numpy()
+    enough = np.isfinite(mat).sum(axis=0) >= EMA_SPAN
+    above = np.where(enough & ~np.isnan(mat[-1]), (mat[-1] > ema[-1]).astype(float), np.nan) if tickers else np.empty(0)
+
+    out: dict = {
+        "as_of": closes.index[-1].date().isoformat() if len(closes) else None,
+        "windows": list(windows),
+    }
+    for level, key in ((0, "sectors"), (1, "industries")):
+        sizes = Counter(groups[t][level] for t in tickers if groups[t][level])
+        # 成員不足的組不參與排名，也不影響其他組的名次
+        labels = sorted(name for name, n in sizes.items() if n >= MIN_MEMBERS)
+        members = np.zeros((len(tickers), len(labels)))
+        col = {name: j for j, name in enumerate(labels)}
+        for i, t in enumerate(tickers):
+            j = col.get(groups[t][level])
+            if j is not None:
+                members[i, j] = 1.0
+
+        rs, _ = _group_mean(rs_now, members)
+        rs_before, _ = _group_mean(rs_prev, members)
+        breadth, _ = _group_mean(above, members)
+        rank, rank_before = _ranks(rs), _ranks(rs_before)
+
+        rows = []
+        for j, name in enumerate(labels):
+            rows.append({
+                "name": name,
+                "members": int(members[:, j].sum()),
+                "rs": {str(w): _num(rs[k, j]) for k, w in enumerate(windows)},
+                "rank": {str(w): None if np.isnan(rank[k, j]) else int(rank[k, j]) for k, w in enumerate(windows)},
+                "rank_change": {
+                    str(w): None if np.isnan(rank[k, j]) or np.isnan(rank_before[k, j])
+                    else int(rank_before[k, j] - rank[k, j])
+                    for k, w in enumerate(windows)
+                },
+                "breadth": _num(breadth[j], 4),
+            })
+        sort_window = str(windows[1] if len(windows) > 1 else windows[0])
+        rows.sort(key=lambda r: (r["rank"][sort_window] is None, r["rank"][sort_window] or 0))
+        out[key] = rows
+    return out
+
+
+@stale_while_revalidate("rotation", cache_if=lambda r: r["error"] is None)
+def _rotation() -> dict:
+    bench = stock_monitor._get_benchmark(stock_monitor.MARKET_INDEX, "1d", ROTATION_PERIOD)
+    if bench is None:
+        return {"error": "無法取得大盤資料"}
+    tickers = [t for t in stock_monitor.get_universe() if any(_classification(t))]
+    groups = {t: _classification(t) for t in tickers}
+    symbols = {t: stock_monitor.yahoo_symbol(t) for t in tickers}
+    raw = stock_monitor.get_bars(list(symbols.values()), ROTATION_PERIOD, "1d")
+    frames = {t: raw.get(sym) for t, sym in symbols.items()}
+
+    benchmark = bench["close"].astype(float)
+    benchmark.index = pd.DatetimeIndex(_days(benchmark.index))
+    benchmark = benchmark[~benchmark.index.duplicated(keep="last")]
+    closes = _close_matrix(frames, benchmark.index)
+    return {
+        **compute_rotation(closes, benchmark, groups),
+        "benchmark": stock_monitor.MARKET_INDEX,
+        "computed_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "error": None,
+    }
+
+
+def get_rotation() -> dict:
+    """板塊輪動矩陣（讀快取；過期時回傳舊值並背景重算），附 data_age（秒）與 stale。"""
+    value, meta = _rotation.lookup()
+    return {**value, "data_age": meta["age"], "stale": meta["stale"]}
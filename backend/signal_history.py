@@ -0,0 +1,309 @@
+"""
+訊號歷史庫（SQLite，只新增不改寫）— 保存每次掃描的逐檔指標列，供跨日比對與得分走勢。
+
+- signal_history：每列一個自動遞增 id，寫入一律是單純的 INSERT，同一秒、同一來源
+  重複掃描也各自保留；(ticker, scanned_at) 索引讓「某檔的得分走勢」與
+  「某檔在 T 之前最後一筆」都是索引上的範圍掃描。
+- signal_latest：每檔最新一筆的 id（ticker → id, scanned_at），與歷史同一個交易寫入，
+  「各檔最新」只需讀這張小表再以 id 取列。
+- 寫入來源：run_scan / stream_scan（"scan"）、Screener 全量掃描（"screener" / "market"）。
+  掃描失敗（有 error）的列不寫入；寫入失敗不影響掃描結果。
+
+時間一律為台灣當地時間 ISO 字串（YYYY-MM-DDTHH:MM:SS，見 now()），字串順序即時間順序。
+查詢參數帶時區（如 +00:00、Z）時先換算為台灣時間；end 只給日期時涵蓋當天整天、只到分鐘時涵蓋該分鐘。
+
+保留策略（prune）：最近 HISTORY_KEEP_DAYS 天保留每一次掃描；更早的日子每檔每天只留最後一筆（收盤列）。
+record() 每天最多觸發一次 prune，也可直接呼叫。
+"""
+from __future__ import annotations
+
+import datetime
+import math
+import os
+import re
+import sqlite3
+import threading
+
+from cache_policy import TZ_TAIPEI
+
+HISTORY_DB = os.environ.get(
+    "SIGNAL_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "signal_history.db")
+)
+HISTORY_LIMIT = 5000          # 單檔歷史查詢最多回傳筆數
+HISTORY_KEEP_DAYS = int(os.environ.get("SIGNAL_HISTORY_KEEP_DAYS", "7"))   # 保留完整盤中紀錄的天數
+
+NUMERIC_FIELDS = ("close", "avwap", "net_buy", "zscore", "td_count", "rsi", "atr", "stop_loss",
+                  "rr_ratio", "ema8", "ema21", "macd_hist", "score")
+FIELDS = NUMERIC_FIELDS + ("signal",)
+CHANGE_FIELDS = ("signal", "score")
+
+_COLUMNS = ("ticker", "scanned_at", "source", *FIELDS)
+
+_initialized: set[str] = set()
+_init_lock = threading.Lock()
+_pruned_on: dict[str, str] = {}     # 庫路徑 → 最後一次 prune 的日期
+
+
+def now() -> str:
+    """目前的台灣時間（scanned_at 格式）；不受伺服器時區影響。"""
+    return datetime.datetime.now(TZ_TAIPEI).replace(tzinfo=None).isoformat(timespec="seconds")
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(HISTORY_DB, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def init_store() -> None:
+    """建立資料表（每個路徑只執行一次）。"""
+    if HISTORY_DB in _initialized:
+        return
+    with _init_lock:
+        if HISTORY_DB in _initialized:
+            return
+        conn = _connect()
+        try:
+            with conn:
+                _create_tables(conn)
+        finally:
+            conn.close()
+        _initialized.add(HISTORY_DB)
+
+
+def _create_tables(conn: sqlite3.Connection) -> None:
+    columns = [r[1] for r in conn.execute("PRAGMA table_info(signal_history)")]
+    legacy = bool(columns) and "id" not in columns     # 舊版以 (ticker, scanned_at) 為主鍵
+    if legacy:
+        conn.execute("ALTER TABLE signal_history RENAME TO signal_history_legacy")
+        conn.execute("DROP TABLE IF EXISTS signal_latest")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS signal_history (
+            id         INTEGER PRIMARY KEY AUTOINCREMENT,
+            ticker     TEXT NOT NULL,
+            scanned_at TEXT NOT NULL,
+            source     TEXT NOT NULL,
+            close      REAL,
+            avwap      REAL,
+            net_buy    REAL,
+            zscore     REAL,
+            td_count   INTEGER,
+            rsi        REAL,
+            atr        REAL,
+            stop_loss  REAL,
+            rr_ratio   REAL,
+            ema8       REAL,
+            ema21      REAL,
+            macd_hist  REAL,
+            score      INTEGER,
+            signal     TEXT
+        )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_signal_history_ticker ON signal_history (ticker, scanned_at)")
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS signal_latest (
+            ticker     TEXT PRIMARY KEY,
+            id         INTEGER NOT NULL,
+            scanned_at TEXT NOT NULL
+        ) WITHOUT ROWID
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_signal_latest_time ON signal_latest (scanned_at, ticker)")
+    if legacy:
+        cols = ", ".join(_COLUMNS)
+        conn.execute(
+            f"INSERT INTO signal_history ({cols}) SELECT {cols} FROM signal_history_legacy ORDER BY scanned_at, ticker"
+        )
+        conn.execute("DROP TABLE signal_history_legacy")
+        conn.execute(
+            "INSERT INTO signal_latest (ticker, id, scanned_at) "
+            "SELECT ticker, MAX(id), MAX(scanned_at) FROM signal_history GROUP BY ticker"
+        )
+
+
+def _cell(value):
+    """numpy 純量轉 Python；NaN 視為缺值。"""
+    if value is None:
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def _timestamp(value: str, end: bool = False) -> str:
+    """
+    YYYY-MM-DD[THH:MM[:SS]][時區] → 台灣時間、不帶時區的 ISO 字串（與 scanned_at 同格式）；格式錯誤拋 ValueError。
+    end=True 時補到所給精度的最後一刻：只有日期 → 23:59:59，只到分鐘 → :59。
+    """
+    text = value.strip().replace(" ", "T")
+    ts = datetime.datetime.fromisoformat(text)
+    if end:
+        clock = re.split(r"[+\-Z]", text.partition("T")[2])[0]
+        if not clock:
+            ts = ts.replace(hour=23, minute=59, second=59)
+        elif clock.count(":") == 1:
+            ts = ts.replace(second=59)
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(TZ_TAIPEI).replace(tzinfo=None)
+    return ts.isoformat(timespec="seconds")
+
+
+# ──────────────────────────────────────────
+# 寫入
+# ──────────────────────────────────────────
+
+def record(results: list[dict], scanned_at: str, source: str) -> int:
+    """寫入一次掃描的逐檔結果（略過有 error 的列，同一代號只取最後一筆），回傳寫入筆數。"""
+    rows = list({
+        r["ticker"]: (r["ticker"], scanned_at, source, *(_cell(r.get(f)) for f in FIELDS))
+        for r in results
+        if r.get("ticker") and not r.get("error")
+    }.values())
+    if not rows:
+        return 0
+    insert = f"INSERT INTO signal_history ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})"
+    try:
+        init_store()
+        conn = _connect()
+        try:
+            with conn:
+                latest = [(row[0], conn.execute(insert, row).lastrowid, scanned_at) for row in rows]
+                conn.executemany(
+                    "INSERT INTO signal_latest (ticker, id, scanned_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(ticker) DO UPDATE SET id = excluded.id, scanned_at = excluded.scanned_at "
+                    "WHERE excluded.scanned_at >= signal_latest.scanned_at",
+                    latest,
+                )
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return 0
+    today = scanned_at[:10]
+    if _pruned_on.get(HISTORY_DB) != today:
+        _pruned_on[HISTORY_DB] = today
+        try:
+            prune(HISTORY_KEEP_DAYS, today=today)
+        except sqlite3.Error:
+            pass
+    return len(rows)
+
+
+def prune(keep_days: int = HISTORY_KEEP_DAYS, today: str | None = None) -> int:
+    """
+    today（預設為台灣今天）往前 keep_days 天以前的紀錄，每檔每天只留最後一筆；回傳刪除筆數。
+    各檔最新一筆必是當天最後一筆，signal_latest 的指向不受影響。
+    """
+    cutoff = datetime.date.fromisoformat(today or now()[:10]) - datetime.timedelta(days=keep_days)
+    init_store()
+    conn = _connect()
+    try:
+        with conn:
+            return conn.execute(
+                "DELETE FROM signal_history WHERE id IN ("
+                "  SELECT id FROM ("
+                "    SELECT id, ROW_NUMBER() OVER ("
+                "      PARTITION BY ticker, substr(scanned_at, 1, 10) ORDER BY scanned_at DESC, id DESC"
+                "    ) AS rn FROM signal_history WHERE scanned_at < ?"
+                "  ) WHERE rn > 1)",
+                (cutoff.isoformat(),),
+            ).rowcount
+    finally:
+        conn.close()
+
+
+# ──────────────────────────────────────────
+# 查詢
+# ──────────────────────────────────────────
+
+def _select(columns: tuple[str, ...] = _COLUMNS, alias: str = "h") -> str:
+    return ", ".join(f"{alias}.{c}" for c in columns)
+
+
+def _in(tickers: list[str] | None, column: str) -> tuple[str, list]:
+    if not tickers:
+        return "", []
+    return f" AND {column} IN ({', '.join('?' * len(tickers))})", list(tickers)
+
+
+def latest(tickers: list[str] | None = None) -> list[dict]:
+    """各檔最新一筆（tickers=None 為全部），依得分由高到低。"""
+    init_store()
+    where, params = _in(tickers, "l.ticker")
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {_select()} FROM signal_latest l JOIN signal_history h ON h.id = l.id "
+            f"WHERE 1 = 1{where} ORDER BY h.score IS NULL, h.score DESC, h.ticker",
+            params,
+        ).fetchall()
+    finally:
+        conn.close()
+    return [dict(zip(_COLUMNS, r)) for r in rows]
+
+
+def changes_since(since: str, tickers: list[str] | None = None,
+                  fields: tuple[str, ...] = CHANGE_FIELDS) -> list[dict]:
+    """
+    since 之後有新掃描、且最新一筆的 fields 與「since 當時最後一筆」不同的標的。
+    回傳 [{ticker, changed[], before{...} | None, after{...}}]；before 為 None 表示 since 之前沒有紀錄。
+    單一查詢：最新列由 signal_latest 取得，since 當時的最後一筆以 (ticker, scanned_at) 索引各取一列。
+    """
+    since = _timestamp(since)
+    unknown = [f for f in fields if f not in FIELDS]
+    if unknown:
+        raise ValueError(f"不支援的欄位: {', '.join(unknown)}")
+    init_store()
+    where, params = _in(tickers, "l.ticker")
+    differs = " OR ".join(f"b.{f} IS NOT a.{f}" for f in fields)
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {_select(alias='a')}, {_select(alias='b')} "
+            f"FROM signal_latest l "
+            f"JOIN signal_history a ON a.id = l.id "
+            f"LEFT JOIN signal_history b ON b.id = ("
+            f"  SELECT p.id FROM signal_history p WHERE p.ticker = l.ticker AND p.scanned_at <= ? "
+            f"  ORDER BY p.scanned_at DESC, p.id DESC LIMIT 1) "
+            f"WHERE l.scanned_at > ?{where} AND (b.id IS NULL OR {differs}) "
+            f"ORDER BY l.ticker",
+            [since, since, *params],
+        ).fetchall()
+    finally:
+        conn.close()
+    n = len(_COLUMNS)
+    out = []
+    for row in rows:
+        after = dict(zip(_COLUMNS, row[:n]))
+        before = dict(zip(_COLUMNS, row[n:])) if row[n] is not None else None
+        changed = [f for f in fields if before is None or before[f] != after[f]]
+        out.append({"ticker": after["ticker"], "changed": changed, "before": before, "after": after})
+    return out
+
+
+def history(ticker: str, start: str | None = None, end: str | None = None,
+            limit: int = HISTORY_LIMIT) -> dict:
+    """
+    單檔走勢（欄式）：{ticker, scanned_at[], source[], score[], signal[], close[], ...}，時間由舊到新。
+    超過 limit 筆時保留最新的 limit 筆。
+    """
+    clauses, params = ["ticker = ?"], [ticker]
+    if start:
+        clauses.append("scanned_at >= ?")
+        params.append(_timestamp(start))
+    if end:
+        clauses.append("scanned_at <= ?")
+        params.append(_timestamp(end, end=True))
+    init_store()
+    columns = ("scanned_at", "source", *FIELDS)
+    conn = _connect()
+    try:
+        rows = conn.execute(
+            f"SELECT {', '.join(columns)} FROM signal_history WHERE {' AND '.join(clauses)} "
+            f"ORDER BY scanned_at DESC, id DESC LIMIT ?",
+            [*params, limit],
+        ).fetchall()
+    finally:
+        conn.close()
+    rows.reverse()
+    return {"ticker": ticker, **{c: [r[i] for r in rows] for i, c in enumerate(columns)}}
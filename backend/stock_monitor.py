@@ -5,20 +5,38 @@ CLI 互動版本請見 Workspace/tw_swing_monitor.py。
 from __future__ import annotations
 
 import os
-import time
 import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import functools
+import math
+import threading
+import time
+import unicodedata
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeout
+from dataclasses import dataclass
+from typing import Iterator
 
 import numpy as np
 import pandas as pd
 import requests
 import yfinance as yf
 
+import bar_store
+import cache_policy
+import compute_pool
+import finmind_client
+import indicator_state
+import signal_history
+import universe
+from cache_policy import session_cached, stale_while_revalidate
+
 FINMIND_TOKEN = os.environ.get("FINMIND_TOKEN", "")
 FINMIND_URL = "https://api.finmindtrade.com/api/v4/data"
 TAX = 0.003
 FEE = 0.001425
 
+_finmind = finmind_client.FinMindClient(FINMIND_TOKEN, FINMIND_URL)
+
 # ──────────────────────────────────────────
 # 台股名稱對照表
 # ──────────────────────────────────────────
@@ -99,28 +117,43 @@ TW_STOCK_SECTORS: dict[str, tuple[str, str]] = {
 }
 
 
+# ──────────────────────────────────────────
+# 全市場清單（universe.py；無清單檔時只有上表標的）
+# ──────────────────────────────────────────
+_LISTING: dict[str, universe.Listing] = {l.ticker: l for l in universe.load_listing()}
+
+
 # ──────────────────────────────────────────
 # 工具
 # ──────────────────────────────────────────
 
-def _flatten_columns(df: pd.DataFrame) -> pd.DataFrame:
-    """相容 yfinance >= 0.2.38 的 MultiIndex 欄位。"""
-    if isinstance(df.columns, pd.MultiIndex):
-        df.columns = df.columns.get_level_values(0)
-    return df
+def yahoo_symbol(ticker: str) -> str:
+    """台股代號 → Yahoo 代號：上櫃為 .TWO，其餘（含不在清單者）為 .TW。"""
+    listing = _LISTING.get(ticker)
+    return listing.yahoo_symbol if listing else f"{ticker}.TW"
+
+
+def _stock_name(ticker: str) -> str:
+    if ticker in TW_STOCK_NAMES:
+        return TW_STOCK_NAMES[ticker]
+    listing = _LISTING.get(ticker)
+    return listing.name if listing else ""
 
 
 # ──────────────────────────────────────────
 # Module 1：風險過濾
 # ──────────────────────────────────────────
 
+NO_SYSTEMIC_RISK = {"flag": False, "msg": ""}
+
+
+@session_cached("systemic_risk", cache_if=lambda r: bool(r["msg"]))
 def check_systemic_risk() -> dict:
     try:
-        df = yf.download("^GSPC", period="5d", auto_adjust=True, progress=False)
-        if df is None or len(df) < 2:
+        benchmark = _get_benchmark(SYSTEMIC_INDEX, "1d", SYSTEMIC_PERIOD)
+        if benchmark is None or len(benchmark["close"]) < 2:
             return {"flag": False, "msg": ""}
-        df = _flatten_columns(df)
-        closes = df["Close"].dropna()
+        closes = benchmark["close"]
         pct = float((closes.iloc[-1] - closes.iloc[-2]) / closes.iloc[-2])
         if pct <= -0.02:
             return {"flag": True, "msg": f"系統性風險：暫停買入（S&P500 {pct*100:.2f}%）"}
@@ -129,11 +162,14 @@ def check_systemic_risk() -> dict:
         return {"flag": False, "msg": ""}
 
 
+LIQUIDITY_MIN_VOLUME = 1_000_000   # 20 日均量門檻（股）
+
+
 def _check_liquidity(df: pd.DataFrame) -> tuple[bool, str]:
     if len(df) < 20:
         return False, "資料不足 20 日"
     vol_ma20 = float(df["Volume"].rolling(20).mean().iloc[-1])
-    if vol_ma20 < 1_000_000:
+    if vol_ma20 < LIQUIDITY_MIN_VOLUME:
         return False, f"流動性不足（均量 {vol_ma20/1000:.0f} 張）"
     return True, "ok"
 
@@ -142,20 +178,148 @@ def _check_liquidity(df: pd.DataFrame) -> tuple[bool, str]:
 # Module 2：技術指標
 # ──────────────────────────────────────────
 
+def _clean_stock_frame(df: pd.DataFrame | None) -> pd.DataFrame | None:
+    """只保留指標需要的欄位並去除缺值列。"""
+    if df is None or df.empty:
+        return None
+    df = df[["Close", "High", "Low", "Volume"]].copy()
+    df.dropna(inplace=True)
+    return df
+
+
 def _get_stock_data(ticker_tw: str, period: str = "120d", interval: str = "1d") -> pd.DataFrame | None:
-    """用 Ticker.history() 下載台股資料，比 download() 更可靠。"""
+    """經本地 K 棒庫取得台股資料（只下載最後儲存時間之後的 K 棒）。"""
+    try:
+        sym = yahoo_symbol(ticker_tw)
+        return _clean_stock_frame(get_bars([sym], period, interval).get(sym))
+    except Exception:
+        return None
+
+
+# ──────────────────────────────────────────
+# 批次下載（多檔合併請求）
+# ──────────────────────────────────────────
+
+BATCH_CHUNK_SIZE = 40      # 每次 yf.download 的代號數
+BATCH_RETRY_WORKERS = 6    # 單檔重試的並行數
+
+
+def _range_kwargs(period: str | None, start) -> dict:
+    """yfinance 下載範圍參數：有 start 時從 start 起抓，否則用 period。"""
+    return {"start": start} if start is not None else {"period": period}
+
+
+def _history_single(symbol: str, period: str | None, interval: str, start=None) -> pd.DataFrame | None:
+    """單一代號下載（批次失敗時的重試路徑）。"""
     try:
-        t = yf.Ticker(f"{ticker_tw}.TW")
-        df = t.history(period=period, interval=interval, auto_adjust=True)
-        if df is None or df.empty:
+        df = yf.Ticker(symbol).history(interval=interval, auto_adjust=True, **_range_kwargs(period, start))
+        return df if df is not None and not df.empty else None
+    except Exception:
+        return None
+
+
+def _split_batch_frame(raw: pd.DataFrame | None, symbol: str, single: bool) -> pd.DataFrame | None:
+    """從 yf.download(group_by="ticker") 的結果拆出單一代號的 OHLCV。"""
+    if raw is None or raw.empty:
+        return None
+    try:
+        if isinstance(raw.columns, pd.MultiIndex):
+            if symbol in raw.columns.get_level_values(0):
+                df = raw[symbol]
+            elif symbol in raw.columns.get_level_values(1):
+                df = raw.xs(symbol, axis=1, level=1)
+            else:
+                return None
+        elif single:
+            df = raw
+        else:
             return None
-        df = df[["Close", "High", "Low", "Volume"]].copy()
-        df.dropna(inplace=True)
-        return df
+        # 多檔合併後索引為聯集，該檔沒有交易的列整列為 NaN
+        df = df.dropna(how="all")
+        return df.copy() if not df.empty else None
     except Exception:
         return None
 
 
+def _download_batch(
+    symbols: list[str],
+    period: str | None,
+    interval: str = "1d",
+    retry: bool = True,
+    start=None,
+) -> dict[str, pd.DataFrame | None]:
+    """
+    以 yf.download 分批（每批 BATCH_CHUNK_SIZE 檔）下載多個 Yahoo 代號，拆回各自的 DataFrame。
+    給定 start 時只抓 start 之後的 K 棒（增量更新用），否則抓整個 period。
+    retry=True 時，整批或個別代號失敗者改用 Ticker.history() 單獨重試。
+    回傳 {symbol: DataFrame | None}。
+    """
+    unique = list(dict.fromkeys(symbols))
+    out: dict[str, pd.DataFrame | None] = {}
+    for i in range(0, len(unique), BATCH_CHUNK_SIZE):
+        chunk = unique[i:i + BATCH_CHUNK_SIZE]
+        try:
+            raw = yf.download(
+                chunk, interval=interval, auto_adjust=True, group_by="ticker",
+                ignore_tz=False, progress=False, threads=True, **_range_kwargs(period, start),
+            )
+        except Exception:
+            raw = None
+        for sym in chunk:
+            out[sym] = _split_batch_frame(raw, sym, single=len(chunk) == 1)
+
+    failed = [s for s, df in out.items() if df is None]
+    if retry and failed:
+        with ThreadPoolExecutor(max_workers=min(len(failed), BATCH_RETRY_WORKERS)) as ex:
+            for sym, df in zip(failed, ex.map(lambda s: _history_single(s, period, interval, start), failed)):
+                out[sym] = df
+    return out
+
+
+def _fetch_bars(
+    symbols: list[str],
+    interval: str,
+    period: str | None = None,
+    start=None,
+    retry: bool = True,
+) -> dict[str, pd.DataFrame | None]:
+    """bar_store 的下載函式（Fetcher）：委派給 _download_batch。"""
+    return _download_batch(symbols, period, interval, retry=retry, start=start)
+
+
+def get_bars(
+    symbols: list[str],
+    period: str,
+    interval: str = "1d",
+    retry: bool = True,
+    policy: str | None = None,
+) -> dict[str, pd.DataFrame | None]:
+    """
+    經本地 K 棒庫（bar_store）取得多個 Yahoo 代號的 OHLCV：
+    庫內已有的部分直接讀取，只批次下載缺少的新 K 棒；依 cache_policy 的
+    "bars:{interval}" 策略（或指定的 policy），仍在有效期內的代號完全不連線。
+    庫無法使用時退回直接下載。
+    """
+    fetch = _fetch_bars if retry else functools.partial(_fetch_bars, retry=False)
+    is_fresh = functools.partial(cache_policy.is_fresh, policy or f"bars:{interval}")
+    try:
+        return bar_store.sync_bars(symbols, interval, period, fetch, is_fresh=is_fresh)
+    except Exception:
+        return _download_batch(symbols, period, interval, retry=retry)
+
+
+def _get_stock_data_batch(
+    tickers: list[str],
+    period: str = "120d",
+    interval: str = "1d",
+    retry: bool = True,
+) -> dict[str, pd.DataFrame | None]:
+    """_get_stock_data 的批次版：回傳 {ticker: DataFrame | None}。"""
+    symbols = {t: yahoo_symbol(t) for t in tickers}
+    raw = get_bars(list(symbols.values()), period, interval, retry=retry)
+    return {t: _clean_stock_frame(raw.get(sym)) for t, sym in symbols.items()}
+
+
 def _calc_zscore(df: pd.DataFrame) -> float | None:
     if len(df) < 20:
         return None
@@ -186,6 +350,35 @@ def _calc_td_sequential(df: pd.DataFrame) -> int:
     return int(count)
 
 
+def calc_td_sequential_matrix(closes: np.ndarray) -> np.ndarray:
+    """
+    向量化 TD Sequential：輸入 (tickers × bars) 收盤矩陣，回傳同形狀的完整計數序列。
+    每列為單一標的依時間排列的收盤價；長度不足者請於左側補 NaN。
+    以「連續同號區段長度」的分段累積掃描取代逐根迴圈，
+    最後一欄與 _calc_td_sequential() 的結果一致。
+    """
+    closes = np.asarray(closes, dtype=float)
+    if closes.ndim == 1:
+        closes = closes[np.newaxis, :]
+    n_rows, n_bars = closes.shape
+    sign = np.zeros((n_rows, n_bars), dtype=np.int8)
+    if n_bars < 5:
+        return sign.astype(int)
+
+    diff = closes[:, 4:] - closes[:, :-4]
+    # NaN（補位或缺值）比較皆為 False → 視同持平，計數歸零
+    sign[:, 4:] = (diff > 0).astype(np.int8) - (diff < 0).astype(np.int8)
+
+    # 同號區段起點：與前一根符號不同處
+    idx = np.broadcast_to(np.arange(n_bars), (n_rows, n_bars))
+    run_start = np.zeros((n_rows, n_bars), dtype=np.int64)
+    run_start[:, 1:] = np.where(sign[:, 1:] != sign[:, :-1], idx[:, 1:], 0)
+    np.maximum.accumulate(run_start, axis=1, out=run_start)
+    run_len = idx - run_start + 1
+
+    return sign.astype(int) * np.minimum(run_len, 9)
+
+
 def _calc_avwap(df: pd.DataFrame) -> float | None:
     """AVWAP 錨點：近 60 日最低低點。"""
     if len(df) < 20:
@@ -273,37 +466,99 @@ def _calc_emas(df: pd.DataFrame) -> dict | None:
     }
 
 
+# ──────────────────────────────────────────
+# 基準指數序列（全站共用快取）
+# ──────────────────────────────────────────
+#
+# 所有個股圖表的 RS Line 都對同一條 ^TWII，systemic risk 對 ^GSPC：
+# 每個 (指數, interval) 只保留一份，連同對齊用的時間 key 一起快取，
+# 圖表請求只需再取個股本身。背景排程（screener_scheduler）會定期預熱。
+
+CHART_PERIODS = {"1d": "6mo", "1h": "60d", "1m": "7d"}
+# 其餘盤中週期（5m、15m…）不另外向上游下載，由 1m 序列在伺服器端重新取樣
+RESAMPLE_SOURCE = "1m"
+MAX_RESAMPLE_MINUTES = 270   # 一整個交易時段
+MARKET_INDEX = "^TWII"
+SYSTEMIC_INDEX = "^GSPC"
+SYSTEMIC_PERIOD = "10d"   # 涵蓋連假後仍至少有兩根日 K
+
+# S&P500 在台股休市時交易，不能套用台股時段的 K 棒策略
+_BENCHMARK_POLICIES = {SYSTEMIC_INDEX: "systemic_risk"}
+
+
+def _resample_minutes(interval: str) -> int | None:
+    """"5m" / "15m" / "30m" / "60m"… → 分鐘數；1m 本身與非分鐘週期回傳 None。"""
+    if not interval.endswith("m") or not interval[:-1].isdigit():
+        return None
+    minutes = int(interval[:-1])
+    return minutes if 1 < minutes <= MAX_RESAMPLE_MINUTES else None
+
+
+def chart_interval_error(interval: str) -> str | None:
+    """圖表週期檢查：1d / 1h / 1m 或 2–270 分（由 1m 重新取樣）；不支援時回傳錯誤訊息。"""
+    if interval in ("1d", "1h", RESAMPLE_SOURCE) or _resample_minutes(interval):
+        return None
+    return f"不支援的週期 {interval}：需為 1d、1h 或 1–{MAX_RESAMPLE_MINUTES} 分（如 5m、15m）"
+
+
+def _source_interval(interval: str) -> str:
+    """實際向上游（K 棒庫）取資料的週期。"""
+    return RESAMPLE_SOURCE if _resample_minutes(interval) else interval
+
+
+def _benchmark_policy(symbol: str, interval: str, period: str) -> str:
+    return _BENCHMARK_POLICIES.get(symbol, f"bars:{_source_interval(interval)}")
+
+
+@session_cached(_benchmark_policy, cache_if=lambda r: r is not None)
+def _get_benchmark(symbol: str, interval: str, period: str) -> dict | None:
+    """
+    指數收盤序列：{"close": Series, "by_key": 以 _chart_keys 為索引的收盤（同 key 取最後一筆）}。
+    重新取樣的盤中週期由 1m 序列聚合。取不到資料回傳 None（不快取）。
+    """
+    source = _source_interval(interval)
+    if source != interval:
+        # 由已快取的 1m 指數序列聚合，不再讀 K 棒庫
+        base = _get_benchmark(symbol, source, period)
+        if base is None:
+            return None
+        df = _resample_intraday(base["close"].to_frame("Close"), _resample_minutes(interval))
+    else:
+        df = get_bars([symbol], period, source, policy=_benchmark_policy(symbol, interval, period)).get(symbol)
+    if df is None or df.empty or "Close" not in df:
+        return None
+    close = df["Close"].dropna()
+    if close.empty or not isinstance(close.index, pd.DatetimeIndex):
+        return None
+    by_key = pd.Series(close.to_numpy(dtype=float), index=_chart_keys(close.index, interval))
+    by_key = by_key[~by_key.index.duplicated(keep="last")]
+    return {"close": close, "by_key": by_key}
+
+
+def refresh_benchmarks() -> None:
+    """預熱所有基準序列（已在有效期內者不連線）。"""
+    for interval, period in CHART_PERIODS.items():
+        _get_benchmark(MARKET_INDEX, interval, period)
+    _get_benchmark(SYSTEMIC_INDEX, "1d", SYSTEMIC_PERIOD)
+
+
 # ──────────────────────────────────────────
 # Module 3：FinMind 投信籌碼
 # ──────────────────────────────────────────
 
 def _get_institution_net_buy(stock_id: str) -> int | None:
+    """投信近 5 個交易日買賣超（讀 FinMind 日快取，不逐檔連線）。"""
+    return _get_institution_net_buys([stock_id]).get(stock_id)
+
+
+def _get_institution_net_buys(stock_ids: list[str]) -> dict[str, int | None]:
+    """批次版：整個 universe 共用一次日快取補齊。"""
     if not FINMIND_TOKEN:
-        return None
-    end_date = datetime.date.today().isoformat()
-    start_date = (datetime.date.today() - datetime.timedelta(days=14)).isoformat()
-    params = {
-        "dataset": "TaiwanStockInstitutionalInvestorsBuySell",
-        "data_id": stock_id,
-        "start_date": start_date,
-        "end_date": end_date,
-        "token": FINMIND_TOKEN,
-    }
+        return {s: None for s in stock_ids}
     try:
-        resp = requests.get(FINMIND_URL, params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
-        time.sleep(1)
-        if data.get("status") != 200 or not data.get("data"):
-            return None
-        df = pd.DataFrame(data["data"])
-        df = df[df["name"] == "Investment_Trust"]
-        if df.empty:
-            return None
-        df = df.sort_values("date").tail(5)
-        return int(df["buy"].astype(int).sum() - df["sell"].astype(int).sum())
+        return _finmind.net_buys(stock_ids)
     except Exception:
-        return None
+        return {s: None for s in stock_ids}
 
 
 # ──────────────────────────────────────────
@@ -335,6 +590,40 @@ def _get_institution_net_buy(stock_id: str) -> int | None:
 # -3~-4 → 九轉賣點 / 波段轉弱（依主因命名）
 #  ≤ -5 → 強烈賣出
 
+
+@dataclass(frozen=True)
+class ScoreParams:
+    """得分表的門檻（預設值即上表）；向量化版本與參數掃描（sweep.py）共用。"""
+    z_strong_buy: float = -2.0
+    z_buy: float = -1.5
+    z_strong_sell: float = 2.5
+    z_sell: float = 2.0
+    rsi_strong_buy: float = 30
+    rsi_buy: float = 40
+    rsi_strong_sell: float = 75
+    rsi_sell: float = 70
+    avwap_band: float = 0.015
+    rr_good: float = 2.5
+    rr_great: float = 4.0
+    full_buy: int = 8
+    strong_buy: int = 5
+    buy: int = 3
+    sell: int = -3
+    strong_sell: int = -5
+
+    def is_valid(self) -> bool:
+        """各組門檻的相對順序需與預設相同（否則 np.select 的分級會錯位）。"""
+        return (
+            self.z_strong_buy <= self.z_buy < self.z_sell <= self.z_strong_sell
+            and self.rsi_strong_buy <= self.rsi_buy < self.rsi_sell <= self.rsi_strong_sell
+            and self.rr_good <= self.rr_great
+            and self.strong_sell <= self.sell < self.buy <= self.strong_buy <= self.full_buy
+        )
+
+
+DEFAULT_SCORE_PARAMS = ScoreParams()
+
+
 def _calc_score_and_signal(
     z: float | None,
     td: int,
@@ -448,11 +737,11 @@ def _calc_score_and_signal(
     return score, "觀察中"
 
 
-def scan_ticker(ticker: str) -> dict:
-    """掃描單一標的，回傳指標 dict。"""
-    base: dict = {
+def _empty_scan_result(ticker: str) -> dict:
+    """掃描結果的欄位骨架（scan_ticker 與面板模式共用）。"""
+    return {
         "ticker": ticker,
-        "name": TW_STOCK_NAMES.get(ticker, ""),
+        "name": _stock_name(ticker),
         "close": None,
         "avwap": None,
         "net_buy": None,
@@ -469,7 +758,25 @@ def scan_ticker(ticker: str) -> dict:
         "signal": None,
         "error": None,
     }
-    df = _get_stock_data(ticker)
+
+
+def scan_ticker(
+    ticker: str,
+    df: pd.DataFrame | None = None,
+    mtf: bool = False,
+    net_buys: dict[str, int | None] | None = None,
+) -> dict:
+    """
+    掃描單一標的，回傳指標 dict。
+    df 可由批次下載預先提供；為 None 時自行下載。
+    net_buys 為預先取得的 {ticker: 投信買賣超}；給定時不再查詢（缺少的代號視為 None）。
+    mtf=True 時另附多週期區塊 "mtf"（見 scan_mtf；多檔請直接批次呼叫 scan_mtf）。
+    """
+    base = _empty_scan_result(ticker)
+    if mtf:
+        base["mtf"] = _scan_mtf_safe([ticker]).get(ticker)
+    if df is None:
+        df = _get_stock_data(ticker)
     if df is None or df.empty:
         base["error"] = "取資料失敗"
         base["signal"] = "取資料失敗"
@@ -481,15 +788,27 @@ def scan_ticker(ticker: str) -> dict:
         base["signal"] = liq_msg
         return base
 
+    recursive = {
+        "td_count": _calc_td_sequential(df),
+        "rsi": _calc_rsi(df),
+        "atr": _calc_atr(df),
+        "macd": _calc_macd(df),
+        "emas": _calc_emas(df),
+    }
+    net_buy = net_buys.get(ticker) if net_buys is not None else _get_institution_net_buy(ticker)
+    return _fill_scan_row(base, df, recursive, net_buy)
+
+
+def _fill_scan_row(base: dict, df: pd.DataFrame, recursive: dict, net_buy: int | None) -> dict:
+    """
+    以遞迴型指標（td_count / rsi / atr / macd / emas，可由整段重算或串流狀態提供）
+    與 df 上的視窗型指標（Z-Score / AVWAP / 風報比）組成掃描結果並計分。
+    """
     close = round(float(df["Close"].iloc[-1]), 2)
     z     = _calc_zscore(df)
-    td    = _calc_td_sequential(df)
     avwap = _calc_avwap(df)
-    rsi   = _calc_rsi(df)
-    atr   = _calc_atr(df)
-    macd  = _calc_macd(df)
-    emas  = _calc_emas(df)
-    net_buy = _get_institution_net_buy(ticker)
+    td, rsi, atr = recursive["td_count"], recursive["rsi"], recursive["atr"]
+    macd, emas = recursive["macd"], recursive["emas"]
 
     stop_loss: float | None = round(close - 2 * atr, 2) if atr is not None else None
 
@@ -521,139 +840,1016 @@ def scan_ticker(ticker: str) -> dict:
     return base
 
 
-def run_scan(tickers: list[str]) -> dict:
-    """
-    掃描整批標的。
-    回傳：{systemic_risk, systemic_msg, scanned_at, results[]}
-    """
-    systemic = check_systemic_risk()
-    results_map: dict[str, dict] = {}
+SCAN_DEADLINE = float(os.environ.get("SCAN_DEADLINE", "30"))
+SCAN_WORKERS = 6
 
-    def scan_safe(t: str) -> dict:
-        try:
-            return scan_ticker(t)
-        except Exception as e:
-            return {"ticker": t, "error": str(e), "score": None, "signal": "錯誤"}
 
-    with ThreadPoolExecutor(max_workers=min(len(tickers), 6)) as executor:
-        futures = {executor.submit(scan_safe, t): t for t in tickers}
-        for future in as_completed(futures):
-            try:
-                r = future.result(timeout=30)
-                results_map[r["ticker"]] = r
-            except Exception:
-                pass
+def _timeout_result(ticker: str) -> dict:
+    return {"ticker": ticker, "error": "逾時", "score": None, "signal": "錯誤"}
+
+
+def _submit(fn, *args, **kwargs) -> Future:
+    """在獨立執行緒執行 fn；呼叫端以 _result_by 等待，逾時即放棄（不阻塞關閉）。"""
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(fn, *args, **kwargs)
+    finally:
+        executor.shutdown(wait=False)
+
+
+def _result_by(future: Future, deadline: float, default):
+    """deadline（time.monotonic() 絕對時間）前完成則回傳結果；逾時回傳 default（fn 的例外照常拋出）。"""
+    try:
+        return future.result(timeout=max(0.0, deadline - time.monotonic()))
+    except FuturesTimeout:
+        return default
+
+
+def _scan_safe(t: str, df: pd.DataFrame | None = None, net_buys: dict | None = None) -> dict:
+    try:
+        return scan_ticker(t, df, net_buys=net_buys)
+    except Exception as e:
+        return {"ticker": t, "error": str(e), "score": None, "signal": "錯誤"}
+
+
+def iter_scan(tickers: list[str], deadline: float) -> Iterator[dict]:
+    """
+    依完成順序逐檔產生掃描結果；deadline 為 time.monotonic() 的絕對時間。
+    批次下載與籌碼查詢同樣受 deadline 限制：逾時就以已有的部分繼續（籌碼視為 None）。
+    已取得資料的標的只剩運算，一定產生結果；沒有資料的標的在執行緒內各自重抓，
+    時限到時尚未完成者（例如卡住的 yfinance 呼叫）放棄不等，以「逾時」結果產生在最後。
+    """
+    tickers = list(dict.fromkeys(tickers))
+    # 先批次下載並補齊籌碼日快取（兩者並行）；之後的運算只讀結果，不再連線
+    frames_future = _submit(_get_stock_data_batch, tickers, retry=False)
+    net_buys_future = _submit(_get_institution_net_buys, tickers)
+    frames = _result_by(frames_future, deadline, {})
+    net_buys = _result_by(net_buys_future, deadline, {})
+    fetched = {t: df for t, df in frames.items() if df is not None and not df.empty}
+    missing = [t for t in tickers if t not in fetched]
+
+    # 沒有資料的標的：由 scan_ticker 在執行緒內各自重抓
+    # 不用 with：離開時不等待執行中的工作（否則一檔卡住就拖住整個請求）
+    futures: dict[Future, str] = {}
+    executor = None
+    if missing and time.monotonic() < deadline:
+        executor = ThreadPoolExecutor(max_workers=max(1, min(len(missing), SCAN_WORKERS)))
+        futures = {executor.submit(_scan_safe, t): t for t in missing}
+    not_done = set(futures)
+    try:
+        # 行程池模式：已下載的標的整批走面板（指標運算分散到多個行程），同樣只等到 deadline；
+        # 行程池忙碌未完成時改在本行程逐檔計算
+        if fetched and compute_pool.COMPUTE_MODE == "process":
+            panel = _result_by(_submit(scan_panel, fetched, net_buys), deadline, None)
+            if panel is not None:
+                yield from panel.values()
+                fetched = {}
+        for t, df in fetched.items():
+            yield _scan_safe(t, df, net_buys)
+
+        while not_done:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            finished, not_done = wait(not_done, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in finished:
+                yield future.result()
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    unfinished = {futures[f] for f in not_done}
+    submitted = set(futures.values())
+    for t in missing:
+        if t not in submitted or t in unfinished:
+            yield _timeout_result(t)
+
+
+def run_scan(tickers: list[str], timeout: float = SCAN_DEADLINE, mtf: bool = False) -> dict:
+    """
+    掃描整批標的；超過 timeout 秒仍取不到資料的標的回報「逾時」。
+    系統性風險檢查與掃描並行，同樣只等到時限（逾時視為無訊息）。
+    mtf=True 時整批算一次多週期（scan_mtf），附在各檔的 "mtf"。
+    回傳：{systemic_risk, systemic_msg, scanned_at, results[], timed_out[]}
+    """
+    deadline = time.monotonic() + timeout
+    systemic_future = _submit(check_systemic_risk)
+    results_map = {r["ticker"]: r for r in iter_scan(tickers, deadline)}
+    systemic = _result_by(systemic_future, deadline, NO_SYSTEMIC_RISK)
+    if mtf:
+        # 多週期與日K 共用 K 棒庫，同樣只等到時限（逾時各檔 mtf 為 None）
+        blocks = _result_by(_submit(_scan_mtf_safe, list(results_map)), deadline, {})
+        for t, r in results_map.items():
+            r["mtf"] = blocks.get(t)
 
     # 保持原始順序
-    results = [results_map.get(t, {"ticker": t, "error": "逾時", "score": None, "signal": "錯誤"}) for t in tickers]
+    results = [results_map.get(t, _timeout_result(t)) for t in tickers]
+    scanned_at = signal_history.now()
+    signal_history.record(results, scanned_at, "scan")
 
     return {
         "systemic_risk": systemic["flag"],
         "systemic_msg": systemic["msg"],
-        "scanned_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "scanned_at": scanned_at,
         "results": results,
+        "timed_out": [r["ticker"] for r in results if r.get("error") == "逾時"],
+    }
+
+
+def stream_scan(tickers: list[str], timeout: float = SCAN_DEADLINE, mtf: bool = False) -> Iterator[dict]:
+    """
+    run_scan 的串流版本（供 NDJSON 回應）：每完成一檔就產生一筆，慢的標的不拖累其他檔。
+      {"type": "start",  systemic_risk, systemic_msg, scanned_at, total}
+      {"type": "result", "result": {...}}   依完成順序
+      {"type": "mtf",    "mtf": {ticker: {...}}}   mtf=True 時，所有結果之後送一次
+      {"type": "end",    elapsed, timed_out[]}
+    """
+    started = time.monotonic()
+    deadline = started + timeout
+    systemic = _result_by(_submit(check_systemic_risk), deadline, NO_SYSTEMIC_RISK)
+    scanned_at = signal_history.now()
+    yield {
+        "type": "start",
+        "systemic_risk": systemic["flag"],
+        "systemic_msg": systemic["msg"],
+        "scanned_at": scanned_at,
+        "total": len(dict.fromkeys(tickers)),
     }
+    timed_out: list[str] = []
+    done: list[dict] = []
+    for r in iter_scan(tickers, deadline):
+        if r.get("error") == "逾時":
+            timed_out.append(r["ticker"])
+        done.append(r)
+        yield {"type": "result", "result": r}
+    signal_history.record(done, scanned_at, "scan")
+    if mtf:
+        blocks = _result_by(_submit(_scan_mtf_safe, list(dict.fromkeys(tickers))), deadline, {})
+        yield {"type": "mtf", "mtf": blocks}
+    yield {"type": "end", "elapsed": round(time.monotonic() - started, 2), "timed_out": timed_out}
+
+
+# ──────────────────────────────────────────
+# Module 6：橫截面面板（整批向量化計算）
+# ──────────────────────────────────────────
+#
+# 面板 = bar × ticker 矩陣。各標的依自身最後一根 K 棒右對齊，
+# 長度不足者上方補 NaN；停牌日不會在其他標的序列中插入空值，
+# 因此每欄的指標與 scan_ticker() 逐檔計算的結果相同。
+
+PANEL_FIELDS = ("Close", "High", "Low", "Volume")
+
+
+def _build_panel(frames: dict[str, pd.DataFrame]) -> dict[str, pd.DataFrame]:
+    """將各標的 OHLCV 組成右對齊的 bar × ticker 矩陣（每個欄位一張）。"""
+    tickers = list(frames)
+    n_bars = max((len(df) for df in frames.values()), default=0)
+    panel: dict[str, pd.DataFrame] = {}
+    for field in PANEL_FIELDS:
+        mat = np.full((n_bars, len(tickers)), np.nan)
+        for j, t in enumerate(tickers):
+            vals = frames[t][field].to_numpy(dtype=float)
+            if len(vals):
+                mat[n_bars - len(vals):, j] = vals
+        panel[field] = pd.DataFrame(mat, columns=tickers)
+    return panel
+
+
+def _panel_liquidity(panel: dict[str, pd.DataFrame]) -> dict[str, str]:
+    """面板版 _check_liquidity：回傳 {ticker: msg}，msg == "ok" 代表通過。"""
+    lengths = panel["Close"].notna().sum(axis=0)
+    vol_ma20 = panel["Volume"].rolling(20).mean().iloc[-1]
+    out: dict[str, str] = {}
+    for t in panel["Close"].columns:
+        if lengths[t] < 20:
+            out[t] = "資料不足 20 日"
+        elif vol_ma20[t] < LIQUIDITY_MIN_VOLUME:
+            out[t] = f"流動性不足（均量 {vol_ma20[t]/1000:.0f} 張）"
+        else:
+            out[t] = "ok"
+    return out
+
+
+def round_vec(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    逐元素套用內建 round()。
+    np.round 以「乘 10^n 後取整」實作，在 .xx5 邊界可能與 round() 差一位，
+    這裡只處理最後一根（每檔一個值），成本可忽略。
+    """
+    return np.array([np.nan if np.isnan(v) else round(float(v), ndigits) for v in values], dtype=float)
+
+
+def _calc_panel_indicators(panel: dict[str, pd.DataFrame]) -> dict[str, np.ndarray]:
+    """
+    一次算出面板內所有標的最後一根的指標（已依 scan_ticker 的位數四捨五入）。
+    無法計算者為 NaN（對應純量版的 None）。
+    """
+    close = panel["Close"]
+    high = panel["High"]
+    low = panel["Low"]
+    volume = panel["Volume"]
+    n_bars = len(close)
+    lengths = close.notna().sum(axis=0).to_numpy()
+    last_close = close.iloc[-1].to_numpy()
+
+    # ── Z-Score ───────────────────────────
+    ma20 = close.rolling(20).mean().iloc[-1].to_numpy()
+    std20 = close.rolling(20).std().iloc[-1].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where((lengths >= 20) & (std20 != 0), (last_close - ma20) / std20, np.nan)
+
+    # ── TD Sequential ─────────────────────
+    td = calc_td_sequential_matrix(close.to_numpy().T)[:, -1]
+
+    # ── AVWAP（近 60 根最低點為錨）────────
+    lookback = min(60, n_bars)
+    anchor = np.nanargmin(low.to_numpy()[-lookback:], axis=0) + (n_bars - lookback)
+    after_anchor = np.arange(n_bars)[:, np.newaxis] >= anchor[np.newaxis, :]
+    tp = (high.to_numpy() + low.to_numpy() + close.to_numpy()) / 3
+    vol = volume.to_numpy()
+    cum_pv = np.cumsum(np.where(after_anchor, tp * vol, 0.0), axis=0)[-1]
+    cum_vol = np.cumsum(np.where(after_anchor, vol, 0.0), axis=0)[-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avwap = np.where((lengths >= 20) & (cum_vol != 0), cum_pv / cum_vol, np.nan)
+
+    # ── RSI (14) ──────────────────────────
+    delta = close.diff()
+    avg_gain = delta.clip(lower=0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().iloc[-1].to_numpy()
+    avg_loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().iloc[-1].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = avg_gain / avg_loss
+        rsi = round_vec(100 - 100 / (1 + rs), 2)
+    rsi = np.where(avg_loss == 0, 100.0, rsi)
+    rsi = np.where(lengths >= 15, rsi, np.nan)
+
+    # ── ATR (14) ──────────────────────────
+    prev_close = close.shift(1)
+    tr = np.fmax(np.fmax((high - low).to_numpy(), (high - prev_close).abs().to_numpy()),
+                 (low - prev_close).abs().to_numpy())
+    atr_raw = pd.DataFrame(tr).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().iloc[-1].to_numpy()
+    atr = np.where(lengths >= 15, round_vec(atr_raw, 4), np.nan)
+
+    # ── MACD (12, 26, 9) ──────────────────
+    macd_line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    histogram = macd_line - macd_line.ewm(span=9, adjust=False).mean()
+    has_macd = lengths >= 35
+    macd_last = np.where(has_macd, round_vec(macd_line.iloc[-1].to_numpy(), 4), np.nan)
+    hist_last = np.where(has_macd, round_vec(histogram.iloc[-1].to_numpy(), 4), np.nan)
+    hist_prev = np.where(has_macd, round_vec(histogram.iloc[-2].to_numpy(), 4), np.nan) \
+        if n_bars >= 2 else np.full(len(lengths), np.nan)
+
+    # ── EMA 8/21/55 ───────────────────────
+    has_emas = lengths >= 56
+    emas: dict[str, np.ndarray] = {}
+    for span in (8, 21, 55):
+        ema = close.ewm(span=span, adjust=False).mean()
+        emas[f"ema{span}"] = np.where(has_emas, round_vec(ema.iloc[-1].to_numpy(), 2), np.nan)
+        if span != 55:
+            emas[f"ema{span}_prev"] = np.where(has_emas, round_vec(ema.iloc[-2].to_numpy(), 2), np.nan) \
+                if n_bars >= 2 else np.full(len(lengths), np.nan)
+
+    # ── 停損 / 風報比（與 scan_ticker 相同，使用四捨五入後的 close/atr）──
+    close_r = round_vec(last_close, 2)
+    stop_loss = round_vec(close_r - 2 * atr, 2)
+    recent_high = high.iloc[-20:].max(axis=0).to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rr = np.where((atr > 0) & (lengths >= 20), (recent_high - close_r) / (2 * atr), np.nan)
+
+    return {
+        "close": close_r,
+        "zscore": round_vec(z, 4),
+        "td_count": td,
+        "avwap": round_vec(avwap, 2),
+        "rsi": rsi,
+        "atr": atr,
+        "stop_loss": stop_loss,
+        "rr_ratio": round_vec(rr, 2),
+        "macd_line": macd_last,
+        "macd_hist": hist_last,
+        "macd_hist_prev": hist_prev,
+        **emas,
+    }
+
+
+def _score_terms_vec(
+    ind: dict[str, np.ndarray],
+    net_buy: np.ndarray,
+    p: ScoreParams,
+) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """向量化得分與訊號命名需要的中間條件（golden_cross 等）。"""
+    z, td, rsi = ind["zscore"], ind["td_count"], ind["rsi"]
+    close, avwap, rr = ind["close"], ind["avwap"], ind["rr_ratio"]
+
+    score = np.select([z <= p.z_strong_buy, z <= p.z_buy, z >= p.z_strong_sell, z >= p.z_sell], [3, 2, -3, -2], 0)
+    score += np.select([td == -9, td == -8, td == 9, td == 8], [3, 2, -3, -2], 0)
+    score += np.select(
+        [rsi <= p.rsi_strong_buy, rsi <= p.rsi_buy, rsi >= p.rsi_strong_sell, rsi >= p.rsi_sell], [2, 1, -2, -1], 0,
+    )
+
+    golden_cross = (ind["ema8_prev"] <= ind["ema21_prev"]) & (ind["ema8"] > ind["ema21"])
+    death_cross = (ind["ema8_prev"] >= ind["ema21_prev"]) & (ind["ema8"] < ind["ema21"])
+    above_ema55 = close > ind["ema55"]
+    below_ema55 = close < ind["ema55"]
+    score += 2 * golden_cross - 2 * death_cross + above_ema55.astype(int) - below_ema55.astype(int)
+
+    macd_refueling = (ind["macd_line"] > 0) & (ind["macd_hist_prev"] <= 0) & (ind["macd_hist"] > 0)
+    score += 2 * macd_refueling
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avwap_dev = np.abs(close / avwap - 1)
+    avwap_ok = avwap_dev <= p.avwap_band
+    score += avwap_ok.astype(int)
+
+    score += np.select([net_buy > 0, net_buy < 0], [2, -1], 0)
+    score += np.select([rr >= p.rr_great, rr >= p.rr_good], [2, 1], 0)
+    return score, {
+        "golden_cross": golden_cross,
+        "death_cross": death_cross,
+        "above_ema55": above_ema55,
+        "macd_refueling": macd_refueling,
+        "avwap_near": (avwap_dev <= 0.02) & (close > avwap),
+    }
+
+
+def calc_score_vec(
+    ind: dict[str, np.ndarray],
+    net_buy: np.ndarray,
+    params: ScoreParams = DEFAULT_SCORE_PARAMS,
+) -> np.ndarray:
+    """只算得分（int）；不需要訊號名稱時（回測、參數掃描）省去 np.select 字串陣列。"""
+    return _score_terms_vec(ind, net_buy, params)[0].astype(int)
+
+
+def calc_score_and_signal_vec(
+    ind: dict[str, np.ndarray],
+    net_buy: np.ndarray,
+    params: ScoreParams = DEFAULT_SCORE_PARAMS,
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    _calc_score_and_signal 的向量化版本；NaN 代表 None。
+    回傳 (score[int], signal[object])；params 為預設值時逐元素與純量版一致。
+    """
+    p = params
+    z, td, rsi, avwap = ind["zscore"], ind["td_count"], ind["rsi"], ind["avwap"]
+    score, terms = _score_terms_vec(ind, net_buy, p)
+    golden_cross, death_cross = terms["golden_cross"], terms["death_cross"]
+    above_ema55, macd_refueling, avwap_near = terms["above_ema55"], terms["macd_refueling"], terms["avwap_near"]
+
+    # ── 訊號命名（條件順序同純量版）────────
+    buy5, buy3 = score >= p.strong_buy, score >= p.buy
+    sell3 = score <= p.sell
+    signal = np.select(
+        [
+            np.isnan(z) & np.isnan(avwap),
+            score >= p.full_buy,
+            buy5 & (td <= -9) & (rsi <= p.rsi_buy),
+            buy5 & golden_cross & above_ema55,
+            buy5 & macd_refueling,
+            buy5,
+            buy3 & (td <= -9),
+            buy3 & golden_cross,
+            buy3 & macd_refueling,
+            buy3 & avwap_near,
+            score <= p.strong_sell,
+            sell3 & (td >= 9) & (rsi >= p.rsi_sell),
+            sell3 & death_cross,
+        ],
+        ["資料不足", "滿分買進", "九轉買點", "波段起漲", "動能噴發", "強烈買進",
+         "九轉買點", "波段起漲", "動能噴發", "支撐確認", "強烈賣出", "九轉賣點", "波段轉弱"],
+        "觀察中",
+    ).astype(object)
+    return score.astype(int), signal
+
+
+def _py(value):
+    """NumPy 純量 → JSON 友善的 Python 值（NaN → None）。"""
+    if isinstance(value, (float, np.floating)):
+        return None if np.isnan(value) else float(value)
+    if isinstance(value, np.integer):
+        return int(value)
+    return value
+
+
+def _panel_shard(arrays: dict[str, np.ndarray]) -> dict[str, np.ndarray]:
+    """一塊標的的指標 + 得分（compute_pool 的 worker 函式，輸入為 ndarray view）。"""
+    panel = {f: pd.DataFrame(arrays[f]) for f in PANEL_FIELDS}
+    ind = _calc_panel_indicators(panel)
+    ind["score"], ind["signal"] = calc_score_and_signal_vec(ind, arrays["net_buy"])
+    return ind
+
+
+def _frame_problem(df: pd.DataFrame | None) -> str | None:
+    """單檔 K 棒能否放進面板；不能時回傳錯誤訊息（與 scan_ticker 的逐檔防護對應）。"""
+    if df is None or df.empty:
+        return "取資料失敗"
+    try:
+        values = df[list(PANEL_FIELDS)].to_numpy(dtype=float)
+    except (KeyError, TypeError, ValueError):
+        return "資料格式錯誤"
+    if np.isinf(values).any():
+        return "資料格式錯誤"
+    return None
+
+
+def _prepare_panel(
+    frames: dict[str, pd.DataFrame | None],
+) -> tuple[dict[str, dict], dict[str, pd.DataFrame] | None, list[str]]:
+    """
+    逐檔檢查後組面板並做流動性篩選：回傳 (results, panel, liquid)。
+    results 已填好不合格標的的 error / signal；panel 只含格式正確的標的（皆不合格時為 None）。
+    """
+    results = {t: _empty_scan_result(t) for t in frames}
+    valid: dict[str, pd.DataFrame] = {}
+    for t, df in frames.items():
+        problem = _frame_problem(df)
+        if problem:
+            results[t]["error"] = results[t]["signal"] = problem
+        else:
+            valid[t] = df
+    if not valid:
+        return results, None, []
+
+    panel = _build_panel(valid)
+    liquidity = _panel_liquidity(panel)
+    for t, msg in liquidity.items():
+        if msg != "ok":
+            results[t]["error"] = results[t]["signal"] = msg
+    return results, panel, [t for t, msg in liquidity.items() if msg == "ok"]
+
+
+def _score_panel(
+    results: dict[str, dict],
+    panel: dict[str, pd.DataFrame] | None,
+    liquid: list[str],
+    net_buys: dict[str, int | None],
+) -> dict[str, dict]:
+    """對已通過篩選的標的一次算指標與得分，寫回 results。"""
+    if not liquid:
+        return results
+    nb = np.array([np.nan if net_buys.get(t) is None else float(net_buys[t]) for t in liquid])
+    arrays = {k: v[liquid].to_numpy(dtype=float) for k, v in panel.items()}
+    arrays["net_buy"] = nb
+    ind = compute_pool.map_columns(_panel_shard, arrays)
+    scores, signals = ind["score"], ind["signal"]
+
+    fields = ("close", "avwap", "zscore", "td_count", "rsi", "atr",
+              "stop_loss", "rr_ratio", "ema8", "ema21", "macd_hist")
+    for j, t in enumerate(liquid):
+        row = {f: _py(ind[f][j]) for f in fields}
+        row["td_count"] = int(ind["td_count"][j])
+        row.update({
+            "net_buy": net_buys.get(t),
+            "score": int(scores[j]),
+            "signal": str(signals[j]),
+        })
+        results[t].update(row)
+    return results
+
+
+def scan_panel(
+    frames: dict[str, pd.DataFrame | None],
+    net_buys: dict[str, int | None] | None = None,
+) -> dict[str, dict]:
+    """
+    面板模式：整批標的一次向量化算完指標與得分表。
+    frames 為 {ticker: _get_stock_data() 結果}；net_buys 為投信淨買超（缺漏視為 None）。
+    回傳 {ticker: dict}，欄位與數值皆與 scan_ticker() 相同；格式錯誤的標的只影響自己那一列。
+    """
+    results, panel, liquid = _prepare_panel(frames)
+    return _score_panel(results, panel, liquid, net_buys or {})
+
+
+def scan_tickers_panel(tickers: list[str]) -> dict[str, dict]:
+    """批次下載 → 面板一次計算；回傳 {ticker: dict}。"""
+    results, panel, liquid = _prepare_panel(_get_stock_data_batch(tickers))
+    # 與 scan_ticker 相同：只對通過流動性檢查的標的查籌碼（讀日快取）
+    return _score_panel(results, panel, liquid, _get_institution_net_buys(liquid))
+
+
+# ──────────────────────────────────────────
+# 串流掃描（觀察清單）
+# ──────────────────────────────────────────
+#
+# watch_hub 每輪只需要「最後一根變了什麼」：遞迴型指標由 indicator_state 的狀態 O(1) 更新，
+# 視窗型指標只在狀態保留的最近 WINDOW_BARS 根上計算；結果與 scan_ticker 相同。
+
+WATCH_BAR_INTERVAL = "1d"
+WATCH_BAR_PERIOD = "120d"      # 與 _get_stock_data 的預設視窗相同
+
+_watch_book = indicator_state.IndicatorBook(
+    WATCH_BAR_INTERVAL,
+    WATCH_BAR_PERIOD,
+    fetch=functools.partial(_fetch_bars, retry=False),
+    is_fresh=functools.partial(cache_policy.is_fresh, f"bars:{WATCH_BAR_INTERVAL}"),
+)
+_watch_lock = threading.Lock()
+
+
+def scan_from_state(ticker: str, state: indicator_state.StreamingIndicators | None, net_buy: int | None) -> dict:
+    """由串流指標狀態組成與 scan_ticker 相同的掃描結果。"""
+    base = _empty_scan_result(ticker)
+    if state is None or state.n == 0:
+        base["error"] = base["signal"] = "取資料失敗"
+        return base
+    df = state.frame()
+    liq_ok, liq_msg = _check_liquidity(df)
+    if not liq_ok:
+        base["error"] = base["signal"] = liq_msg
+        return base
+    values = state.values()
+    recursive = {k: values[k] for k in ("td_count", "rsi", "atr", "macd", "emas")}
+    return _fill_scan_row(base, df, recursive, net_buy)
+
+
+def scan_tickers_streaming(tickers: list[str]) -> dict[str, dict]:
+    """
+    觀察清單用的增量掃描：K 棒庫增量同步後只把新 K 棒餵進各檔狀態，不重算整段視窗。
+    回傳 {ticker: dict}，欄位與數值同 scan_ticker。不再出現在 tickers 的狀態會被釋放。
+    """
+    symbols = {t: yahoo_symbol(t) for t in dict.fromkeys(tickers)}
+    with _watch_lock:
+        _watch_book.retain(list(symbols.values()))
+        states = _watch_book.refresh(list(symbols.values()))
+        liquid = [
+            t for t, sym in symbols.items()
+            if sym in states and _check_liquidity(states[sym].frame())[0]
+        ]
+        net_buys = _get_institution_net_buys(liquid)
+        return {t: scan_from_state(t, states.get(sym), net_buys.get(t)) for t, sym in symbols.items()}
+
+
+# ──────────────────────────────────────────
+# Module 7：多週期（週 / 月 / 盤中）
+# ──────────────────────────────────────────
+#
+# 不另外下載週K、月K：由 K 棒庫中的日K 重新取樣；盤中只抓一條 MTF_INTRADAY 序列，
+# 其他盤中週期由它依台股交易時段（09:00–13:30）聚合。
+# 每個週期把整批標的組成面板（_build_panel），一次向量化算完指標。
+
+MTF_DAILY_PERIOD = "3y"                 # 月K 至少 35 根（MACD）
+MTF_INTRADAY = ("1h", "60d")            # 與圖表 1h 共用 K 棒庫
+MTF_DAILY_RULES = {"1w": "W-FRI", "1mo": "ME"}
+MTF_INTRADAY_MINUTES = {"60m": 60, "120m": 120}
+SESSION_START_MINUTE = 9 * 60
+SESSION_MINUTES = 270                   # 09:00–13:30
+
+OHLCV_AGG = {"Open": "first", "High": "max", "Low": "min", "Close": "last", "Volume": "sum"}
+
+
+def _resample_daily(df: pd.DataFrame, rule: str) -> pd.DataFrame:
+    """日K → 週K / 月K（開=首、高=最高、低=最低、收=末、量=合計）；沒有交易日的區間略過。"""
+    agg = {c: f for c, f in OHLCV_AGG.items() if c in df}
+    out = df.resample(rule).agg(agg)
+    return out.dropna(subset=["Close"])
+
+
+def _resample_intraday(df: pd.DataFrame, minutes: int) -> pd.DataFrame:
+    """
+    盤中 K 棒 → minutes 分 K，桶以每日 09:00 為起點、不跨日；13:30 收盤那根併入最後一桶，
+    盤外時間的 K 棒捨棄。tz-naive 索引視為 UTC（同 yfinance 盤中資料）。索引為台灣時間的桶起點。
+    """
+    index = df.index if df.index.tz is not None else df.index.tz_localize("UTC")
+    local = index.tz_convert("Asia/Taipei").tz_localize(None).to_numpy()
+    day = local.astype("datetime64[D]")
+    offset = (local - day).astype("timedelta64[m]").astype(np.int64) - SESSION_START_MINUTE
+    in_session = (offset >= 0) & (offset <= SESSION_MINUTES)
+    bucket = np.minimum(offset, SESSION_MINUTES - 1) // minutes
+    start = day + (SESSION_START_MINUTE + bucket * minutes).astype("timedelta64[m]")
+
+    data = df[in_session]
+    agg = {c: f for c, f in OHLCV_AGG.items() if c in data}
+    out = data.groupby(start[in_session], sort=True).agg(agg)
+    out.index = pd.DatetimeIndex(out.index).tz_localize("Asia/Taipei")
+    return out.dropna(subset=["Close"])
+
+
+def _calc_mtf_indicators(panel: dict[str, pd.DataFrame]) -> dict[str, np.ndarray]:
+    """
+    各週期共用的趨勢指標（面板最後一根）：EMA8/21、RSI(14)、MACD 柱狀體。
+    週期越長 K 棒越少，門檻比日K（EMA 需 56 根）寬鬆：EMA 21 根、RSI 15 根、MACD 35 根。
+    """
+    close = panel["Close"]
+    lengths = close.notna().sum(axis=0).to_numpy()
+    last_close = close.iloc[-1].to_numpy()
+
+    ema8 = close.ewm(span=8, adjust=False).mean().iloc[-1].to_numpy()
+    ema21 = close.ewm(span=21, adjust=False).mean().iloc[-1].to_numpy()
+    has_ema = lengths >= 21
+
+    delta = close.diff()
+    avg_gain = delta.clip(lower=0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().iloc[-1].to_numpy()
+    avg_loss = (-delta).clip(lower=0).ewm(alpha=1 / 14, min_periods=14, adjust=False).mean().iloc[-1].to_numpy()
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = round_vec(100 - 100 / (1 + avg_gain / avg_loss), 2)
+    rsi = np.where(avg_loss == 0, 100.0, rsi)
+    rsi = np.where(lengths >= 15, rsi, np.nan)
+
+    macd_line = close.ewm(span=12, adjust=False).mean() - close.ewm(span=26, adjust=False).mean()
+    hist = (macd_line - macd_line.ewm(span=9, adjust=False).mean()).iloc[-1].to_numpy()
+    hist = np.where(lengths >= 35, round_vec(hist, 4), np.nan)
+
+    up = has_ema & (last_close > ema21) & (ema8 > ema21)
+    down = has_ema & (last_close < ema21) & (ema8 < ema21)
+    trend = np.select([up, down], [1, -1], 0)
+    score = trend + np.select([hist > 0, hist < 0], [1, -1], 0)
+    return {
+        "close": round_vec(last_close, 2),
+        "ema8": np.where(has_ema, round_vec(ema8, 2), np.nan),
+        "ema21": np.where(has_ema, round_vec(ema21, 2), np.nan),
+        "rsi": rsi,
+        "macd_hist": hist,
+        "trend": np.where(has_ema, trend, np.nan),
+        "score": score,
+        "bars": lengths,
+    }
+
+
+TREND_LABELS = {1: "多頭", -1: "空頭", 0: "盤整"}
+
+
+def _mtf_views(
+    daily: dict[str, pd.DataFrame],
+    intraday: dict[str, pd.DataFrame],
+) -> dict[str, dict[str, pd.DataFrame]]:
+    """{週期: {ticker: 重新取樣後的 K 棒}}。"""
+    views: dict[str, dict[str, pd.DataFrame]] = {}
+    for name, rule in MTF_DAILY_RULES.items():
+        views[name] = {t: _resample_daily(df, rule) for t, df in daily.items()}
+    for name, minutes in MTF_INTRADAY_MINUTES.items():
+        views[name] = {t: _resample_intraday(df, minutes) for t, df in intraday.items()}
+    return views
+
+
+# 上游回傳的 K 棒欄位 / 形狀不如預期時 pandas / NumPy 會拋出的例外；其他錯誤照常往上拋
+MTF_DATA_ERRORS = (KeyError, IndexError, ValueError, TypeError)
+
+
+def _scan_mtf_safe(tickers: list[str]) -> dict[str, dict]:
+    """scan_mtf；資料格式錯誤時各檔回傳 {"error": 訊息}（同 scan_ticker 的 error 欄位）。"""
+    try:
+        return scan_mtf(tickers)
+    except MTF_DATA_ERRORS as e:
+        msg = f"多週期資料格式錯誤（{type(e).__name__}: {e}）"
+        return {t: {"error": msg} for t in dict.fromkeys(tickers)}
+
+
+def scan_mtf(tickers: list[str]) -> dict[str, dict]:
+    """
+    多週期確認（批次）：日K 與盤中各只經 K 棒庫取一次，其餘週期由重新取樣而得。
+    回傳 {ticker: {週期: {close, ema8, ema21, rsi, macd_hist, trend, score}, "score", "aligned", "error"}}；
+    aligned 為週K 與月K 趨勢一致時的方向（"多頭" / "空頭"），否則 None；error 恆為 None
+    （資料格式錯誤時 _scan_mtf_safe 改回傳只有 error 的區塊）。
+    """
+    symbols = {t: yahoo_symbol(t) for t in dict.fromkeys(tickers)}
+    raw_daily = get_bars(list(symbols.values()), MTF_DAILY_PERIOD, "1d")
+    raw_intraday = get_bars(list(symbols.values()), MTF_INTRADAY[1], MTF_INTRADAY[0])
+
+    def usable(raw: dict[str, pd.DataFrame | None]) -> dict[str, pd.DataFrame]:
+        out = {}
+        for t, sym in symbols.items():
+            df = raw.get(sym)
+            if df is not None and not df.empty and "Close" in df:
+                df = df.dropna(subset=["Close"])
+                if not df.empty:
+                    out[t] = df
+        return out
+
+    results: dict[str, dict] = {t: {name: None for name in (*MTF_DAILY_RULES, *MTF_INTRADAY_MINUTES)} for t in symbols}
+    for name, frames in _mtf_views(usable(raw_daily), usable(raw_intraday)).items():
+        frames = {t: df for t, df in frames.items() if not df.empty}
+        if not frames:
+            continue
+        ind = _calc_mtf_indicators(_build_panel(frames))
+        for j, t in enumerate(frames):
+            trend = ind["trend"][j]
+            results[t][name] = {
+                "close": _py(ind["close"][j]),
+                "ema8": _py(ind["ema8"][j]),
+                "ema21": _py(ind["ema21"][j]),
+                "rsi": _py(ind["rsi"][j]),
+                "macd_hist": _py(ind["macd_hist"][j]),
+                "trend": None if np.isnan(trend) else TREND_LABELS[int(trend)],
+                "score": int(ind["score"][j]),
+            }
+
+    for block in results.values():
+        views = [v for k, v in block.items() if v is not None]
+        higher = [block[k]["trend"] if block[k] else None for k in MTF_DAILY_RULES]
+        block["score"] = sum(v["score"] for v in views)
+        block["aligned"] = higher[0] if higher[0] in ("多頭", "空頭") and len(set(higher)) == 1 else None
+        block["error"] = None
+    return results
 
 
 # ──────────────────────────────────────────
 # 圖表資料端點
 # ──────────────────────────────────────────
 
-def get_chart_data(ticker: str, interval: str) -> dict:
+CHART_FIELDS = ("time", "price", "open", "high", "low", "close", "volume", "marketClose")
+
+
+def _local_minutes(index: pd.DatetimeIndex, naive_tz: str | None = None) -> np.ndarray:
     """
-    取得圖表原始 OHLCV 資料，含大盤 ^TWII（用於 RS Line）。
-    interval: "1d" → 6 個月；"1h" → 60 天；"1m" → 7 天
-    使用 Ticker.history() 以取得更可靠的台股資料。
+    "YYYY-MM-DD HH:MM" 字串陣列（台灣時間）。以 NumPy 格式化，比逐筆 strftime 快一個數量級。
+    tz-naive 索引：naive_tz 為 None 時視為已是當地時間，否則先視為 naive_tz 再轉台灣時間。
     """
-    period_map = {"1d": "6mo", "1h": "60d", "1m": "7d"}
-    period = period_map.get(interval, "6mo")
+    if index.tz is None and naive_tz is not None:
+        index = index.tz_localize(naive_tz)
+    if index.tz is not None:
+        index = index.tz_convert("Asia/Taipei").tz_localize(None)
+    text = np.datetime_as_string(index.to_numpy().astype("datetime64[m]"), unit="m")
+    return np.char.replace(text, "T", " ")
+
+
+def _chart_keys(index: pd.DatetimeIndex, interval: str) -> np.ndarray:
+    """對齊個股與大盤用的時間 key：日K 取日期，盤中取台灣時間到分鐘。"""
+    if interval == "1d":
+        local = index.tz_localize(None) if index.tz is not None else index
+        return np.datetime_as_string(local.to_numpy().astype("datetime64[D]"), unit="D")
+    return _local_minutes(index)
+
+
+def _json_column(values: np.ndarray, ndigits: int) -> list:
+    """四捨五入後轉 list，NaN → None。"""
+    values = np.round(values.astype(float), ndigits)
+    return np.where(np.isnan(values), None, values).tolist()
+
+
+def _chart_columns(
+    df: pd.DataFrame,
+    market: pd.Series | None,
+    interval: str,
+    keys: np.ndarray,
+) -> dict[str, list]:
+    """
+    向量化產生圖表欄位（每個欄位一個 list）；keys 為 df 各 K 棒的 _chart_keys，
+    market 為以同一種 key 為索引的大盤收盤（_get_benchmark 的 by_key）。
+    """
+    index = df.index
+    if interval == "1d":
+        times = _chart_keys(index, interval).tolist()
+    else:
+        # 顯示用：tz-naive 的盤中資料視為 UTC
+        times = [s[5:] for s in _local_minutes(index, naive_tz="UTC").tolist()]
+
+    # 大盤依 key 對齊
+    market_close = market.reindex(keys).to_numpy() if market is not None else np.full(len(keys), np.nan)
+
+    close = _json_column(df["Close"].to_numpy(), 2)
+    volume = df["Volume"].to_numpy(dtype=float)
+    return {
+        "time": times,
+        "price": close,
+        "open": _json_column(df["Open"].to_numpy(), 2),
+        "high": _json_column(df["High"].to_numpy(), 2),
+        "low": _json_column(df["Low"].to_numpy(), 2),
+        "close": close,
+        "volume": np.where(np.isnan(volume), 0, volume).astype(np.int64).tolist(),
+        "marketClose": _json_column(market_close, 2),
+    }
 
-    ticker_yf = f"{ticker}.TW"
-    name = TW_STOCK_NAMES.get(ticker, "")
 
-    def dl_stock():
-        return yf.Ticker(ticker_yf).history(period=period, interval=interval, auto_adjust=True)
+def _chart_rows(columns: dict[str, list]) -> list[dict]:
+    """欄式 → 舊版 list-of-dicts（欄位順序同 CHART_FIELDS）。"""
+    return [dict(zip(CHART_FIELDS, row)) for row in zip(*(columns[f] for f in CHART_FIELDS))]
 
-    def dl_market():
-        return yf.Ticker("^TWII").history(period=period, interval=interval, auto_adjust=True)
 
-    # 並行下載，各設 25s timeout
-    with ThreadPoolExecutor(max_workers=2) as ex:
-        f_stock = ex.submit(dl_stock)
-        f_mkt = ex.submit(dl_market)
-        try:
-            df = f_stock.result(timeout=25)
-        except Exception as e:
-            return {"data": [], "name": name, "error": str(e)}
-        try:
-            mdf = f_mkt.result(timeout=25)
-        except Exception:
-            mdf = None
+# ── LTTB 降採樣 ───────────────────────────
+#
+# Largest-Triangle-Three-Buckets：首尾兩點保留，其餘切成 n_out - 2 個桶，
+# 每桶選出與「前一個選點、下一桶平均點」構成最大三角形的那根 K 棒，保留價格走勢的轉折。
+# 時間/價格/大盤取選中的 K 棒；OHLC 與成交量則以同一組桶聚合（開=首、高=最高、低=最低、收=末、量=合計）。
+
+CHART_LOD_LEVELS = (250, 500, 1000, 2000)   # 全區間預先計算並快取的點數
+CHART_MIN_POINTS = 3
+
+
+def _lttb_buckets(y: np.ndarray, n_out: int) -> tuple[np.ndarray, np.ndarray]:
+    """
+    回傳 (選中的索引, 桶邊界)。桶 k 為 [bounds[k], bounds[k+1])，共 n_out 桶。
+    x 軸用 K 棒序號（而非時間），夜盤/週末空檔不會扭曲三角形面積。
+    """
+    n = len(y)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    bounds = np.concatenate(([0], edges, [n]))
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 1 < n_out - 2:
+            nlo, nhi = edges[i + 1], edges[i + 2]
+            avg_x, avg_y = (nlo + nhi - 1) / 2, y[nlo:nhi].mean()
+        else:
+            avg_x, avg_y = n - 1, y[-1]
+        xs = np.arange(lo, hi)
+        area = np.abs((a - avg_x) * (y[lo:hi] - y[a]) - (a - xs) * (avg_y - y[a]))
+        a = lo + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected, bounds
+
+
+def _downsample_columns(columns: dict[str, list], n_out: int) -> tuple[dict[str, list], np.ndarray]:
+    """欄式圖表資料降到最多 n_out 點；回傳 (新欄位, 選中的原索引)。"""
+    n = len(columns["time"])
+    if n <= n_out:
+        return columns, np.arange(n)
+    arr = {f: np.array(columns[f], dtype=float) for f in CHART_FIELDS if f != "time"}
+    selected, bounds = _lttb_buckets(arr["price"], n_out)
+    starts, ends = bounds[:-1], bounds[1:] - 1
+    volume = np.add.reduceat(arr["volume"], starts)
+    times = columns["time"]
+    return {
+        "time": [times[i] for i in selected],
+        "price": _json_column(arr["price"][selected], 2),
+        "open": _json_column(arr["open"][starts], 2),
+        "high": _json_column(np.fmax.reduceat(arr["high"], starts), 2),
+        "low": _json_column(np.fmin.reduceat(arr["low"], starts), 2),
+        "close": _json_column(arr["close"][ends], 2),
+        "volume": volume.astype(np.int64).tolist(),
+        "marketClose": _json_column(arr["marketClose"][selected], 2),
+    }, selected
+
+
+def _viewport_key(value: str) -> str:
+    return value.strip().replace("T", " ")[:16]
+
+
+def _slice_chart(chart: dict, start: str | None, end: str | None) -> dict[str, list]:
+    """依可視範圍（"YYYY-MM-DD" 或 "YYYY-MM-DD HH:MM"，含端點）切出欄位。"""
+    keys = chart["keys"]
+    lo = int(np.searchsorted(keys, _viewport_key(start), side="left")) if start else 0
+    if end:
+        end_key = _viewport_key(end)
+        hi = int(np.searchsorted(keys, end_key + " 23:59" if len(end_key) == 10 else end_key, side="right"))
+    else:
+        hi = len(keys)
+    return {f: v[lo:hi] for f, v in chart["columns"].items()}
+
+
+def _chart_lod(chart: dict, level: int) -> dict[str, list]:
+    """
+    全區間的 level 點降採樣；結果存在 chart["lod"]，
+    與 _get_chart_columns 的快取項目同生命週期（過期替換時一併釋放）。
+    """
+    lod = chart.setdefault("lod", {})
+    columns = lod.get(level)
+    if columns is None:
+        columns, _selected = _downsample_columns(chart["columns"], level)
+        lod[level] = columns
+    return columns
+
 
+def _chart_policy(ticker: str, interval: str) -> str:
+    return f"chart:{_source_interval(interval)}"
+
+
+@session_cached(lambda ticker_yf: f"chart:{RESAMPLE_SOURCE}", cache_if=lambda r: r is not None)
+def _get_minute_bars(ticker_yf: str) -> pd.DataFrame | None:
+    """各重新取樣週期共用的 1m 序列：同一檔在有效期內只讀一次 K 棒庫（最多一次上游下載）。"""
+    df = get_bars([ticker_yf], CHART_PERIODS[RESAMPLE_SOURCE], RESAMPLE_SOURCE).get(ticker_yf)
     if df is None or df.empty:
-        return {"data": [], "name": name, "error": f"無法取得 {ticker} 資料"}
+        return None
+    return df[["Open", "High", "Low", "Close", "Volume"]].dropna(subset=["Close"])
+
+
+@session_cached(_chart_policy, cache_if=lambda r: r["error"] is None)
+def _get_chart_columns(ticker: str, interval: str) -> dict:
+    """
+    取得圖表原始 OHLCV 資料（欄式），含大盤 ^TWII（用於 RS Line）。
+    interval: "1d" → 6 個月；"1h" → 60 天；"1m" → 7 天；
+    "5m" / "15m" / "30m" / "60m"（任意 2–270 分）→ 由 7 天的 1m 依交易時段重新取樣。
+    個股經本地 K 棒庫（get_bars）取得；^TWII 取自共用的基準序列快取。
+    結果依週期分別快取，重新取樣的週期共用同一份 1m 序列。
+    """
+    minutes = _resample_minutes(interval)
+    period = CHART_PERIODS.get(_source_interval(interval), "6mo")
+
+    ticker_yf = yahoo_symbol(ticker)
+    name = _stock_name(ticker)
+
     try:
-        df = df[["Open", "High", "Low", "Close", "Volume"]].copy()
-        df.dropna(subset=["Close"], inplace=True)
+        if minutes or interval == RESAMPLE_SOURCE:
+            df = _get_minute_bars(ticker_yf)
+            if minutes and df is not None:
+                df = _resample_intraday(df, minutes)
+        else:
+            # 個股經本地 K 棒庫取得，只下載新 K 棒
+            df = get_bars([ticker_yf], period, interval).get(ticker_yf)
+            if df is not None and not df.empty:
+                df = df[["Open", "High", "Low", "Close", "Volume"]].dropna(subset=["Close"])
     except Exception as e:
-        return {"data": [], "name": name, "error": str(e)}
+        return {"columns": None, "name": name, "error": str(e)}
+    if df is None or df.empty:
+        return {"columns": None, "name": name, "error": f"無法取得 {ticker} 資料"}
 
     # 大盤資料 for RS Line
     try:
-        market_series = mdf["Close"].dropna() if (mdf is not None and not mdf.empty) else pd.Series(dtype=float)
+        benchmark = _get_benchmark(MARKET_INDEX, interval, period)
     except Exception:
-        market_series = pd.Series(dtype=float)
+        benchmark = None
 
-    # 時間戳正規化：日K 取日期字串，盤中取台灣時間字串
-    def _ts_key(ts) -> str:
-        try:
-            if interval == "1d":
-                # .date() 直接取本地日期，不受 tz-aware/tz-naive 影響
-                return ts.date().isoformat()
-            else:
-                # 盤中：轉成台灣時間
-                if hasattr(ts, "tz_convert") and ts.tzinfo is not None:
-                    return ts.tz_convert("Asia/Taipei").strftime("%Y-%m-%d %H:%M")
-                return ts.strftime("%Y-%m-%d %H:%M")
-        except Exception:
-            s = str(ts)
-            return s[:10] if interval == "1d" else s[:16]
+    try:
+        keys = _chart_keys(df.index, interval)
+        columns = _chart_columns(df, benchmark["by_key"] if benchmark else None, interval, keys)
+    except Exception as e:
+        return {"columns": None, "name": name, "error": str(e)}
+    return {"columns": columns, "keys": keys, "name": name, "error": None, "lod": {}}
+
+
+def get_chart_data(
+    ticker: str,
+    interval: str,
+    columnar: bool = False,
+    max_points: int | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    since: str | None = None,
+) -> dict:
+    """
+    圖表資料。預設回傳 {"data": [{time, price, open, ...}], name, error, cursor}；
+    columnar=True 回傳 {"columns": {欄位: [...]}, "length", name, error, cursor}，
+    每個欄位一個陣列，payload 較小、前端也不必逐筆解構。
+    cursor 為最後一根 K 棒的時間 key（日期或 "YYYY-MM-DD HH:MM"）。
 
-    market_map: dict = {_ts_key(ts): float(val) for ts, val in market_series.items()}
+    start / end：可視範圍（日期或 "YYYY-MM-DD HH:MM"，台灣時間，含端點）。
+    max_points：以 LTTB 降到最多 max_points 點。全區間請求使用快取的
+    CHART_LOD_LEVELS 層級（取不超過 max_points 的最大層級）；指定範圍時即時計算。
 
-    points = []
-    for ts, row in df.iterrows():
-        # 顯示時間字串（台灣時區）
-        if interval == "1d":
-            time_str = ts.date().isoformat()
+    since：上次回應的 cursor。只回傳增量（見 _chart_delta），附 replaced / reset；
+    此時忽略 start / end / max_points。
+    """
+    interval_error = chart_interval_error(interval)
+    if interval_error:
+        chart = {"columns": None, "keys": None, "name": _stock_name(ticker), "error": interval_error}
+    else:
+        chart = _get_chart_columns(ticker, interval)
+    columns = chart["columns"]
+    if since:
+        return _chart_delta(chart, since, columnar)
+    if columns is not None and (start or end):
+        columns = _slice_chart(chart, start, end)
+    if columns is not None and max_points:
+        max_points = max(int(max_points), CHART_MIN_POINTS)
+        level = max((l for l in CHART_LOD_LEVELS if l <= max_points), default=None)
+        if not (start or end) and level is not None:
+            columns = _chart_lod(chart, level)
         else:
-            try:
-                if hasattr(ts, "tz_convert") and ts.tzinfo is not None:
-                    dt_tw = ts.tz_convert("Asia/Taipei")
-                elif ts.tzinfo is None:
-                    dt_tw = ts.tz_localize("UTC").tz_convert("Asia/Taipei")
-                else:
-                    dt_tw = ts
-                time_str = dt_tw.strftime("%m-%d %H:%M")
-            except Exception:
-                time_str = str(ts)[:16]
-
-        close_val = float(row["Close"]) if not pd.isna(row["Close"]) else None
-        market_close = market_map.get(_ts_key(ts))
-
-        points.append({
-            "time": time_str,
-            "price": round(close_val, 2) if close_val is not None else None,
-            "open":  round(float(row["Open"]),   2) if not pd.isna(row["Open"])   else None,
-            "high":  round(float(row["High"]),   2) if not pd.isna(row["High"])   else None,
-            "low":   round(float(row["Low"]),    2) if not pd.isna(row["Low"])    else None,
-            "close": round(close_val, 2) if close_val is not None else None,
-            "volume": int(row["Volume"]) if not pd.isna(row["Volume"]) else 0,
-            "marketClose": round(market_close, 2) if market_close is not None else None,
-        })
+            columns, _selected = _downsample_columns(columns, max_points)
+    if columnar:
+        return {
+            "columns": columns or {f: [] for f in CHART_FIELDS},
+            "length": len(columns["time"]) if columns else 0,
+            "name": chart["name"],
+            "error": chart["error"],
+            "cursor": _chart_cursor(chart),
+        }
+    return {
+        "data": _chart_rows(columns) if columns else [],
+        "name": chart["name"],
+        "error": chart["error"],
+        "cursor": _chart_cursor(chart),
+    }
 
-    points = [p for p in points if p["price"] is not None]
-    return {"data": points, "name": name, "error": None}
+
+# ── 增量輪詢（since cursor）──────────────────
+#
+# 增量同步（bar_store）每次會重抓最後 OVERLAP_BARS 根，這幾根可能被修正；
+# 因此增量從 cursor 往前 OVERLAP_BARS - 1 根開始回傳，並以 replaced 告知
+# 其中有幾根是用戶端已有、需要覆寫的（含未收盤的最後一根）。
+
+def _chart_cursor(chart: dict) -> str | None:
+    keys = chart.get("keys")
+    return str(keys[-1]) if keys is not None and len(keys) else None
+
+
+def _chart_delta(chart: dict, since: str, columnar: bool) -> dict:
+    """
+    回傳 since 之後的新 K 棒及可能被修正的最後幾根：
+    {data | columns, replaced, reset, cursor, name, error}。
+    用戶端刪掉自己最後 replaced 根後接上回傳的 K 棒；reset=True 表示 since 已不在序列內
+    （超出視窗或序列被重建），回傳的是完整序列，應整段取代。
+    """
+    columns, keys = chart["columns"], chart.get("keys")
+    out = {"name": chart["name"], "error": chart["error"], "cursor": _chart_cursor(chart)}
+    if columns is None:
+        delta, replaced, reset = None, 0, True
+    else:
+        since_key = _viewport_key(since)
+        pos = int(np.searchsorted(keys, since_key, side="left"))
+        reset = pos >= len(keys) or keys[pos] != since_key
+        if reset:
+            delta, replaced = columns, 0
+        else:
+            lo = max(0, pos - (bar_store.OVERLAP_BARS - 1))
+            delta = {f: v[lo:] for f, v in columns.items()}
+            replaced = pos - lo + 1
+    out.update({"replaced": replaced, "reset": reset})
+    if columnar:
+        out["columns"] = delta or {f: [] for f in CHART_FIELDS}
+        out["length"] = len(delta["time"]) if delta else 0
+    else:
+        out["data"] = _chart_rows(delta) if delta else []
+    return out
 
 
 # ──────────────────────────────────────────
@@ -688,89 +1884,121 @@ SCREENER_TICKERS = [
 # 新聞查詢
 # ──────────────────────────────────────────
 
-def get_stock_news(ticker: str, limit: int = 8) -> dict:
-    """
-    查詢個股相關新聞。
-    優先使用 yfinance .news；若不足，補充 Google News RSS。
-    回傳 {"news": [{title, link, publisher, time_str}], "error": null}
-    """
-    import xml.etree.ElementTree as ET
+NEWS_FETCH_LIMIT = 20     # 每檔快取的新聞上限（端點 limit 的最大值）
+NEWS_BATCH_MAX = 50
+NEWS_WORKERS = 6
 
-    news_items: list[dict] = []
 
-    # ── 來源 1：yfinance news ──────────────────
+def _news_time_str(pub_ts) -> str:
+    if not pub_ts:
+        return ""
     try:
-        t = yf.Ticker(f"{ticker}.TW")
-        raw = t.news or []
-        for item in raw[:limit]:
-            # yfinance 0.2.x 結構：item["content"]["title"] / item["content"]["canonicalUrl"]["url"]
-            # 或舊版：item["title"] / item["link"]
-            content = item.get("content") or {}
-            title     = content.get("title") or item.get("title", "")
-            link_obj  = content.get("canonicalUrl") or {}
-            link      = link_obj.get("url") if isinstance(link_obj, dict) else None
-            link      = link or item.get("link", "") or item.get("url", "")
-            publisher = content.get("provider", {}).get("displayName") if isinstance(content.get("provider"), dict) else None
-            publisher = publisher or item.get("publisher", "")
-            pub_ts    = content.get("pubDate") or item.get("providerPublishTime")
-            if pub_ts:
-                try:
-                    if isinstance(pub_ts, (int, float)):
-                        pub_ts_dt = datetime.datetime.fromtimestamp(int(pub_ts))
-                    else:
-                        pub_ts_dt = datetime.datetime.fromisoformat(str(pub_ts).replace("Z", "+00:00"))
-                    time_str = pub_ts_dt.strftime("%Y-%m-%d %H:%M")
-                except Exception:
-                    time_str = str(pub_ts)[:16]
-            else:
-                time_str = ""
-            if title and link:
-                news_items.append({
-                    "title": title,
-                    "link": link,
-                    "publisher": publisher,
-                    "time_str": time_str,
-                    "source": "yfinance",
-                })
+        if isinstance(pub_ts, (int, float)):
+            pub_ts_dt = datetime.datetime.fromtimestamp(int(pub_ts))
+        else:
+            pub_ts_dt = datetime.datetime.fromisoformat(str(pub_ts).replace("Z", "+00:00"))
+        return pub_ts_dt.strftime("%Y-%m-%d %H:%M")
     except Exception:
-        pass
+        return str(pub_ts)[:16]
+
+
+def _yf_news(ticker: str, limit: int) -> list[dict]:
+    """來源 1：yfinance news。"""
+    news_items: list[dict] = []
+    try:
+        raw = yf.Ticker(yahoo_symbol(ticker)).news or []
+    except Exception:
+        return news_items
+    for item in raw[:limit]:
+        # yfinance 0.2.x 結構：item["content"]["title"] / item["content"]["canonicalUrl"]["url"]
+        # 或舊版：item["title"] / item["link"]
+        content = item.get("content") or {}
+        title     = content.get("title") or item.get("title", "")
+        link_obj  = content.get("canonicalUrl") or {}
+        link      = link_obj.get("url") if isinstance(link_obj, dict) else None
+        link      = link or item.get("link", "") or item.get("url", "")
+        publisher = content.get("provider", {}).get("displayName") if isinstance(content.get("provider"), dict) else None
+        publisher = publisher or item.get("publisher", "")
+        if title and link:
+            news_items.append({
+                "title": title,
+                "link": link,
+                "publisher": publisher,
+                "time_str": _news_time_str(content.get("pubDate") or item.get("providerPublishTime")),
+                "source": "yfinance",
+            })
+    return news_items
+
+
+def _google_news(ticker: str, limit: int) -> list[dict]:
+    """來源 2：Google News RSS。"""
+    import xml.etree.ElementTree as ET
+    from email.utils import parsedate_to_datetime
 
-    # ── 來源 2：Google News RSS（補充至 limit 筆）──
-    if len(news_items) < limit:
-        name = TW_STOCK_NAMES.get(ticker, "")
-        query = f"{ticker} {name}".strip() if name else ticker
-        rss_url = f"https://news.google.com/rss/search?q={requests.utils.quote(query)}&hl=zh-TW&gl=TW&ceid=TW:zh-Hant"
+    name = _stock_name(ticker)
+    query = f"{ticker} {name}".strip() if name else ticker
+    rss_url = f"https://news.google.com/rss/search?q={requests.utils.quote(query)}&hl=zh-TW&gl=TW&ceid=TW:zh-Hant"
+    news_items: list[dict] = []
+    try:
+        resp = requests.get(rss_url, timeout=10,
+                            headers={"User-Agent": "Mozilla/5.0 (compatible)"})
+        resp.raise_for_status()
+        root = ET.fromstring(resp.content)
+    except Exception:
+        return news_items
+    for item in root.iter("item"):
+        if len(news_items) >= limit:
+            break
+        title   = (item.findtext("title") or "").strip()
+        link    = (item.findtext("link")  or "").strip()
+        pub_raw = item.findtext("pubDate") or ""
         try:
-            resp = requests.get(rss_url, timeout=10,
-                                headers={"User-Agent": "Mozilla/5.0 (compatible)"})
-            resp.raise_for_status()
-            root = ET.fromstring(resp.content)
-            for item in root.iter("item"):
-                if len(news_items) >= limit:
-                    break
-                title   = (item.findtext("title") or "").strip()
-                link    = (item.findtext("link")  or "").strip()
-                pub_raw = item.findtext("pubDate") or ""
-                try:
-                    from email.utils import parsedate_to_datetime
-                    pub_dt   = parsedate_to_datetime(pub_raw)
-                    time_str = pub_dt.strftime("%Y-%m-%d %H:%M")
-                except Exception:
-                    time_str = pub_raw[:16]
-                publisher = "Google 新聞"
-                # 略過重複
-                if any(n["title"] == title for n in news_items):
-                    continue
-                if title and link:
-                    news_items.append({
-                        "title": title,
-                        "link": link,
-                        "publisher": publisher,
-                        "time_str": time_str,
-                        "source": "google_news",
-                    })
+            time_str = parsedate_to_datetime(pub_raw).strftime("%Y-%m-%d %H:%M")
         except Exception:
-            pass
+            time_str = pub_raw[:16]
+        if title and link:
+            news_items.append({
+                "title": title,
+                "link": link,
+                "publisher": "Google 新聞",
+                "time_str": time_str,
+                "source": "google_news",
+            })
+    return news_items
+
+
+def _news_key(title: str) -> str:
+    """去重用的標題正規化：全半形統一、去掉 Google 新聞的「 - 媒體名」尾綴、只留文字與數字。"""
+    title = unicodedata.normalize("NFKC", title).casefold()
+    head, sep, _tail = title.rpartition(" - ")
+    if sep and head:
+        title = head
+    return "".join(ch for ch in title if ch.isalnum())
+
+
+@session_cached("news", cache_if=bool)
+def _fetch_news(ticker: str) -> list[dict]:
+    """兩個來源同時查詢，yfinance 在前、依正規化標題去重；每檔一份快取，與 limit 無關。"""
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sources = [executor.submit(fn, ticker, NEWS_FETCH_LIMIT) for fn in (_yf_news, _google_news)]
+        merged = [item for future in sources for item in future.result()]
+    seen: set[str] = set()
+    news_items: list[dict] = []
+    for item in merged:
+        key = _news_key(item["title"])
+        if key in seen:
+            continue
+        seen.add(key)
+        news_items.append(item)
+    return news_items[:NEWS_FETCH_LIMIT]
+
+
+def get_stock_news(ticker: str, limit: int = 8) -> dict:
+    """
+    查詢個股相關新聞（yfinance + Google News RSS 並行查詢後合併）。
+    回傳 {"news": [{title, link, publisher, time_str, source}], "sector", "industry", "error": null}
+    """
+    news_items = _fetch_news(ticker)
 
     # ── 板塊資訊 ───────────────────────────────
     sector_tuple = TW_STOCK_SECTORS.get(ticker, ("", ""))
@@ -786,56 +2014,50 @@ def get_stock_news(ticker: str, limit: int = 8) -> dict:
     }
 
 
-# ──────────────────────────────────────────
-# 板塊概況（5 分鐘快取）
-# ──────────────────────────────────────────
-
-_sector_cache: dict = {"ts": 0.0, "data": None}
-SECTOR_CACHE_TTL = 300  # seconds
-
-
-def get_sector_overview() -> dict:
+def get_news_batch(tickers: list[str], limit: int = 8) -> dict:
     """
-    按板塊統計近1日、近5日平均漲跌幅。
-    結果快取 5 分鐘，避免重複呼叫。
+    多檔新聞一次取回（觀察清單頁面用）；各檔仍走同一份每檔快取。
+    回傳 {"results": {ticker: get_stock_news 的回傳}}，順序同輸入。
     """
-    global _sector_cache
-    now = time.time()
-    if _sector_cache["data"] and (now - _sector_cache["ts"]) < SECTOR_CACHE_TTL:
-        return _sector_cache["data"]
+    tickers = list(dict.fromkeys(tickers))[:NEWS_BATCH_MAX]
+    if not tickers:
+        return {"results": {}}
+    with ThreadPoolExecutor(max_workers=min(len(tickers), NEWS_WORKERS)) as executor:
+        results = list(executor.map(lambda t: get_stock_news(t, limit), tickers))
+    return {"results": dict(zip(tickers, results))}
 
+
+# ──────────────────────────────────────────
+# 板塊概況（依交易時段快取，過期時先回舊值再背景更新）
+# ──────────────────────────────────────────
+
+@stale_while_revalidate("sector")
+def _sector_overview() -> dict:
+    """按板塊統計近1日、近5日平均漲跌幅（約 50 檔的 K 棒，冷啟動需 10 秒以上）。"""
     # 每個板塊的成分股
     sector_tickers: dict[str, list[str]] = {}
     for t, (sec, _ind) in TW_STOCK_SECTORS.items():
         if t in SCREENER_TICKERS:
             sector_tickers.setdefault(sec, []).append(t)
 
-    def fetch_return(t: str) -> dict:
+    def calc_return(t: str, df: pd.DataFrame | None) -> dict:
         try:
-            df = yf.Ticker(f"{t}.TW").history(period="7d", interval="1d", auto_adjust=True)
             if df is not None and len(df) >= 2:
                 r1d = round((float(df["Close"].iloc[-1]) / float(df["Close"].iloc[-2]) - 1) * 100, 2)
                 r5d = round((float(df["Close"].iloc[-1]) / float(df["Close"].iloc[0])  - 1) * 100, 2) \
                       if len(df) >= 5 else None
-                return {"ticker": t, "name": TW_STOCK_NAMES.get(t, ""), "r1d": r1d, "r5d": r5d}
+                return {"ticker": t, "name": _stock_name(t), "r1d": r1d, "r5d": r5d}
         except Exception:
             pass
-        return {"ticker": t, "name": TW_STOCK_NAMES.get(t, ""), "r1d": None, "r5d": None}
+        return {"ticker": t, "name": _stock_name(t), "r1d": None, "r5d": None}
 
     all_tickers = [t for tl in sector_tickers.values() for t in tl]
-    returns_map: dict[str, dict] = {}
-    with ThreadPoolExecutor(max_workers=10) as ex:
-        futures = {ex.submit(fetch_return, t): t for t in all_tickers}
-        for f in as_completed(futures):
-            try:
-                r = f.result(timeout=15)
-                returns_map[r["ticker"]] = r
-            except Exception:
-                pass
+    frames = get_bars([yahoo_symbol(t) for t in all_tickers], period="7d", interval="1d")
+    returns_map: dict[str, dict] = {t: calc_return(t, frames.get(yahoo_symbol(t))) for t in all_tickers}
 
     sectors_out = []
     for sec, tickers in sector_tickers.items():
-        ticker_stats = [returns_map.get(t, {"ticker": t, "name": TW_STOCK_NAMES.get(t, ""), "r1d": None, "r5d": None})
+        ticker_stats = [returns_map.get(t, {"ticker": t, "name": _stock_name(t), "r1d": None, "r5d": None})
                         for t in tickers]
         r1_vals = [s["r1d"] for s in ticker_stats if s["r1d"] is not None]
         r5_vals = [s["r5d"] for s in ticker_stats if s["r5d"] is not None]
@@ -852,14 +2074,29 @@ def get_sector_overview() -> dict:
         "scanned_at": datetime.datetime.now().isoformat(timespec="seconds"),
         "error": None,
     }
-    _sector_cache = {"ts": now, "data": result}
     return result
 
 
-def run_screener(min_score: int = 5) -> dict:
+def get_sector_overview() -> dict:
     """
-    平行掃描 SCREENER_TICKERS，回傳得分 >= min_score 的標的（按得分排序）。
+    板塊概況。依 cache_policy 的 "sector" 策略快取（盤中 5 分鐘，盤後沿用到下次開盤）；
+    過期後仍立即回傳舊資料並只啟動一次背景更新，回應附 data_age（秒）與 stale。
     """
+    value, meta = _sector_overview.lookup()
+    return {**value, "data_age": meta["age"], "stale": meta["stale"]}
+
+
+def scan_screener_universe(panel: bool = True) -> dict:
+    """
+    掃描整個 SCREENER_TICKERS（不分門檻、不經快取），回傳 {results[], scanned_at}。
+    背景排程（screener_scheduler）直接呼叫此函式建立快照；逐檔結果寫入 signal_history。
+    """
+    scanned_at = signal_history.now()
+    if panel:
+        results = list(scan_tickers_panel(SCREENER_TICKERS).values())
+        signal_history.record(results, scanned_at, "screener")
+        return {"results": results, "scanned_at": scanned_at}
+
     def scan_safe(t: str) -> dict:
         try:
             return scan_ticker(t)
@@ -871,14 +2108,159 @@ def run_screener(min_score: int = 5) -> dict:
         futures = {executor.submit(scan_safe, t): t for t in SCREENER_TICKERS}
         for future in as_completed(futures):
             try:
-                r = future.result(timeout=20)
-                if r.get("score") is not None and r["score"] >= min_score:
-                    results.append(r)
+                results.append(future.result(timeout=20))
             except Exception:
                 pass
+    signal_history.record(results, scanned_at, "screener")
+    return {"results": results, "scanned_at": scanned_at}
+
 
+# ──────────────────────────────────────────
+# 全市場掃描（分塊管線）
+# ──────────────────────────────────────────
+#
+# 每塊 FULL_SCAN_CHUNK 檔：流動性預篩 → 批次下載（經 K 棒庫）→ 面板計算。
+# 多塊由 FULL_SCAN_WORKERS 個執行緒並行，下載與運算互相重疊。
+# 塊內再以 BATCH_CHUNK_SIZE 檔為一批，每批開始前檢查 FULL_SCAN_BUDGET；
+# 超過預算仍未開始的批次（或整塊）不再掃描，列入 skipped 回報。
+#
+# 冷啟動（K 棒庫內沒有該檔）時先抓近 5 日 K 棒，均量明顯低於門檻
+# （FULL_SCAN_PREFILTER_RATIO × LIQUIDITY_MIN_VOLUME）者不下載 120 日資料；
+# 判定結果（含完整掃描判定的流動性不足）於當日（台灣時間）有效，換日清空。
+
+FULL_SCAN_CHUNK = int(os.environ.get("FULL_SCAN_CHUNK", "200"))
+FULL_SCAN_WORKERS = int(os.environ.get("FULL_SCAN_WORKERS", "4"))
+FULL_SCAN_BUDGET = float(os.environ.get("FULL_SCAN_BUDGET", "240"))
+FULL_SCAN_PREFILTER_RATIO = float(os.environ.get("FULL_SCAN_PREFILTER_RATIO", "0.5"))
+PREFILTER_PERIOD = "5d"
+
+# 當日已判定流動性不足的標的：{ticker: msg}，同日不再下載
+_illiquid_lock = threading.Lock()
+_illiquid_date = ""
+_illiquid_today: dict[str, str] = {}
+
+
+def get_universe() -> list[str]:
+    """全市場代號清單；沒有清單檔時退回 SCREENER_TICKERS。"""
+    return list(_LISTING) or list(SCREENER_TICKERS)
+
+
+def _illiquid_cache() -> dict[str, str]:
+    """今日（台灣時間）的流動性不足名單；換日時清空。"""
+    global _illiquid_date
+    today = datetime.datetime.now(cache_policy.TZ_TAIPEI).date().isoformat()
+    with _illiquid_lock:
+        if _illiquid_date != today:
+            _illiquid_today.clear()
+            _illiquid_date = today
+        return _illiquid_today
+
+
+def _prefilter_cold(tickers: list[str]) -> dict[str, str]:
+    """K 棒庫內沒有的代號先抓近 5 日：回傳 {ticker: msg}（均量明顯不足者）。"""
+    symbols = {t: yahoo_symbol(t) for t in tickers}
+    try:
+        stored = bar_store.stored_symbols(list(symbols.values()), "1d")
+    except Exception:
+        stored = set()
+    cold = {t: sym for t, sym in symbols.items() if sym not in stored}
+    if not cold:
+        return {}
+    raw = _download_batch(list(cold.values()), PREFILTER_PERIOD, retry=False)
+    out: dict[str, str] = {}
+    for t, sym in cold.items():
+        df = _clean_stock_frame(raw.get(sym))
+        if df is None:
+            continue    # 抓不到就交給完整掃描判斷
+        vol = float(df["Volume"].mean())
+        if vol < LIQUIDITY_MIN_VOLUME * FULL_SCAN_PREFILTER_RATIO:
+            out[t] = f"流動性不足（近 5 日均量 {vol/1000:.0f} 張）"
+    return out
+
+
+def _scan_chunk(chunk: list[str], deadline: float = math.inf) -> tuple[dict[str, dict], list[str]]:
+    """掃描一塊；回傳 (results, skipped)，skipped 為超過 deadline 未開始的代號。"""
+    illiquid = _illiquid_cache()
+    results: dict[str, dict] = {}
+
+    def mark(t: str, msg: str) -> None:
+        r = _empty_scan_result(t)
+        r["error"] = r["signal"] = msg
+        results[t] = r
+
+    todo = []
+    for t in chunk:
+        if t in illiquid:
+            mark(t, illiquid[t])
+        else:
+            todo.append(t)
+    if todo and time.monotonic() <= deadline:
+        for t, msg in _prefilter_cold(todo).items():
+            illiquid[t] = msg
+            mark(t, msg)
+        todo = [t for t in todo if t not in results]
+
+    for i in range(0, len(todo), BATCH_CHUNK_SIZE):
+        if time.monotonic() > deadline:
+            return results, todo[i:]
+        for t, r in scan_tickers_panel(todo[i:i + BATCH_CHUNK_SIZE]).items():
+            if (r.get("error") or "").startswith("流動性不足"):
+                illiquid[t] = r["error"]
+            results[t] = r
+    return results, []
+
+
+def scan_full_market(
+    tickers: list[str] | None = None,
+    progress=None,
+    budget: float = FULL_SCAN_BUDGET,
+) -> dict:
+    """
+    分塊掃描全市場（預設 get_universe()）。
+    progress(dict) 於每塊結束時呼叫：{done, total, skipped, elapsed}。
+    回傳 {results[], scanned_at, total, skipped[], partial, elapsed}。
+    """
+    tickers = list(tickers) if tickers is not None else get_universe()
+    scanned_at = signal_history.now()
+    chunks = [tickers[i:i + FULL_SCAN_CHUNK] for i in range(0, len(tickers), FULL_SCAN_CHUNK)]
+    started = time.monotonic()
+    deadline = started + budget
+    results: dict[str, dict] = {}
+    skipped: list[str] = []
+    done = 0
+
+    def run(chunk: list[str]) -> tuple[dict[str, dict], list[str]]:
+        if time.monotonic() > deadline:
+            return {}, chunk
+        return _scan_chunk(chunk, deadline)
+
+    if chunks:
+        with ThreadPoolExecutor(max_workers=max(1, min(len(chunks), FULL_SCAN_WORKERS))) as executor:
+            futures = {executor.submit(run, c): c for c in chunks}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    chunk_results, chunk_skipped = future.result()
+                except Exception:
+                    chunk_results, chunk_skipped = {}, chunk
+                results.update(chunk_results)
+                skipped.extend(chunk_skipped)
+                done += len(chunk) - len(chunk_skipped)
+                if progress is not None:
+                    progress({
+                        "done": done,
+                        "total": len(tickers),
+                        "skipped": len(skipped),
+                        "elapsed": round(time.monotonic() - started, 1),
+                    })
+
+    ordered = [results[t] for t in tickers if t in results]
+    signal_history.record(ordered, scanned_at, "market")
     return {
-        "results": sorted(results, key=lambda r: r.get("score") or 0, reverse=True),
-        "total_scanned": len(SCREENER_TICKERS),
-        "scanned_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        "results": ordered,
+        "scanned_at": scanned_at,
+        "total": len(tickers),
+        "skipped": skipped,
+        "partial": bool(skipped),
+        "elapsed": round(time.monotonic() - started, 1),
     }
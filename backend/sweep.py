@@ -0,0 +1,264 @@
+"""
+得分門檻參數掃描 — 以網格或隨機抽樣評估多組 ScoreParams，輸出依績效排序的結果表。
+
+- 指標序列（backtest.indicator_series）只算一次；每組參數只重跑整數得分（calc_score_vec，
+  不產生訊號名稱）與交易模擬。
+- 行程池模式：指標與 Open/Low/Close 一次寫入 shared memory，worker 首次收到時 attach
+  並保留 view（同一次掃描的後續批次直接重用），每批只傳參數、只回傳投組統計。
+- 進出場沿用回測規則：得分 >= strong_buy 進場、<= sell 出場；
+  full_buy / buy / strong_sell 只影響訊號命名，不影響回測結果。
+
+用法：python sweep.py 2330,2317,2454 [年數=10] [抽樣數=0（全網格）] [輸出 CSV 路徑]
+"""
+from __future__ import annotations
+
+import csv
+import itertools
+import math
+import sys
+import time
+from concurrent.futures import as_completed
+from dataclasses import asdict, fields, replace
+
+import numpy as np
+import pandas as pd
+
+import backtest
+import compute_pool
+from compute_pool import SharedArrays
+from stock_monitor import DEFAULT_SCORE_PARAMS, ScoreParams, calc_score_vec
+
+# 每個欄位的候選值；未列出的欄位固定為預設值
+DEFAULT_SPACE: dict[str, list] = {
+    "z_strong_buy": [-2.5, -2.0, -1.75],
+    "z_buy": [-1.5, -1.25, -1.0],
+    "rsi_strong_buy": [25, 30, 35],
+    "rsi_buy": [40, 45],
+    "rr_good": [2.0, 2.5, 3.0],
+    "rr_great": [3.5, 4.0],
+    "strong_buy": [4, 5, 6],
+    "sell": [-2, -3, -4],
+}
+METRICS = ("sharpe", "cagr", "total_return", "max_drawdown", "win_rate", "avg_trade")
+BATCHES_PER_WORKER = 4
+
+Space = dict[str, list | tuple]
+
+
+# ──────────────────────────────────────────
+# 參數組合
+# ──────────────────────────────────────────
+
+def _check_space(space: Space) -> None:
+    known = {f.name for f in fields(ScoreParams)}
+    unknown = set(space) - known
+    if unknown:
+        raise ValueError(f"未知的參數: {', '.join(sorted(unknown))}")
+
+
+def grid(space: Space, base: ScoreParams = DEFAULT_SCORE_PARAMS) -> list[ScoreParams]:
+    """所有組合（笛卡兒積）中門檻順序合理者。"""
+    _check_space(space)
+    names = list(space)
+    combos = (replace(base, **dict(zip(names, values))) for values in itertools.product(*space.values()))
+    return [p for p in combos if p.is_valid()]
+
+
+def sample(space: Space, n: int, seed: int = 0, base: ScoreParams = DEFAULT_SCORE_PARAMS) -> list[ScoreParams]:
+    """
+    隨機抽 n 組不重複的合理組合。list 為候選值；(lo, hi) tuple 為均勻區間
+    （兩端皆為 int 時抽整數，否則取到小數第二位）。
+    """
+    _check_space(space)
+    rng = np.random.default_rng(seed)
+
+    def draw(values: list | tuple):
+        if isinstance(values, tuple):
+            lo, hi = values
+            if isinstance(lo, int) and isinstance(hi, int):
+                return int(rng.integers(lo, hi + 1))
+            return round(float(rng.uniform(lo, hi)), 2)
+        return values[int(rng.integers(len(values)))]
+
+    seen: set[ScoreParams] = set()
+    for _ in range(n * 20):  # 上限避免空間太小時無窮迴圈
+        if len(seen) >= n:
+            break
+        p = replace(base, **{k: draw(v) for k, v in space.items()})
+        if p.is_valid():
+            seen.add(p)
+    return list(seen)
+
+
+# ──────────────────────────────────────────
+# 評估
+# ──────────────────────────────────────────
+
+def _no_net_buy(ind: dict[str, np.ndarray]) -> np.ndarray:
+    return np.full(len(ind["close"]), np.nan)
+
+
+def _evaluate_params(
+    frames: dict[str, pd.DataFrame],
+    indicators: dict[str, dict[str, np.ndarray]],
+    params: ScoreParams,
+    max_hold: int | None,
+) -> dict:
+    """單組參數：只重算得分（不產生訊號字串）→ 回測，只回傳投組統計。"""
+    scores = {t: calc_score_vec(ind, _no_net_buy(ind), params) for t, ind in indicators.items()}
+    result = backtest.evaluate(
+        frames, indicators, params.strong_buy, params.sell, max_hold, scores=scores,
+    )
+    return result["portfolio"]
+
+
+def _pack(
+    frames: dict[str, pd.DataFrame],
+    indicators: dict[str, dict[str, np.ndarray]],
+) -> tuple[dict[str, np.ndarray], list[tuple[str, int, int]]]:
+    """把各檔序列首尾相接成一維 float64 陣列（SharedArrays 只收 float64）。"""
+    meta: list[tuple[str, int, int]] = []
+    offset = 0
+    for t, ind in indicators.items():
+        meta.append((t, offset, offset + len(ind["close"])))
+        offset += len(ind["close"])
+    tickers = list(indicators)
+    arrays = {
+        f: np.concatenate([np.asarray(indicators[t][f], dtype=np.float64) for t in tickers])
+        for f in next(iter(indicators.values()))
+    }
+    for col in ("Open", "Low", "Close"):
+        arrays[col] = np.concatenate([frames[t][col].to_numpy(dtype=np.float64) for t in tickers])
+    days = []
+    for t in tickers:
+        idx = frames[t].index
+        local = idx.tz_localize(None) if getattr(idx, "tz", None) is not None else idx
+        days.append(local.to_numpy().astype("datetime64[D]").astype(np.int64))
+    arrays["day"] = np.concatenate(days).astype(np.float64)
+    return arrays, meta
+
+
+# worker 端：目前 attach 的 shared memory 與由它重建的輸入（同一次掃描重複使用）
+_attached: dict = {}
+
+
+def _unpack(shm_name: str, layout: compute_pool.Layout, meta: list[tuple[str, int, int]]) -> tuple[dict, dict]:
+    if _attached.get("name") != shm_name:
+        old = _attached.pop("shm", None)
+        _attached.clear()
+        if old is not None:
+            try:
+                old.close()
+            except BufferError:
+                pass
+        shm = compute_pool.shared_memory.SharedMemory(name=shm_name)
+        views = {f: compute_pool._view(shm, layout, f) for f, _shape, _offset in layout}
+        frames: dict[str, pd.DataFrame] = {}
+        indicators: dict[str, dict[str, np.ndarray]] = {}
+        ohlc = {"Open", "Low", "Close", "day"}
+        for t, lo, hi in meta:
+            index = pd.DatetimeIndex(views["day"][lo:hi].astype(np.int64).astype("datetime64[D]"))
+            frames[t] = pd.DataFrame({c: views[c][lo:hi] for c in ("Open", "Low", "Close")}, index=index)
+            ind = {f: v[lo:hi] for f, v in views.items() if f not in ohlc}
+            ind["liquid"] = ind["liquid"].astype(bool)
+            indicators[t] = ind
+        _attached.update(name=shm_name, shm=shm, frames=frames, indicators=indicators)
+    return _attached["frames"], _attached["indicators"]
+
+
+def _evaluate_batch(
+    shm_name: str,
+    layout: compute_pool.Layout,
+    meta: list[tuple[str, int, int]],
+    batch: list[tuple[int, ScoreParams]],
+    max_hold: int | None,
+) -> list[tuple[int, dict]]:
+    frames, indicators = _unpack(shm_name, layout, meta)
+    return [(i, _evaluate_params(frames, indicators, p, max_hold)) for i, p in batch]
+
+
+def _rank(rows: list[dict], metric: str) -> list[dict]:
+    """依 metric 由高到低排序（None 排最後），加上名次。"""
+    rows = sorted(rows, key=lambda r: (r[metric] is None, -(r[metric] or 0)))
+    return [{"rank": i + 1, **r} for i, r in enumerate(rows)]
+
+
+def run_sweep(
+    tickers: list[str],
+    param_sets: list[ScoreParams],
+    years: int = 10,
+    max_hold: int | None = None,
+    metric: str = "sharpe",
+    frames: dict[str, pd.DataFrame | None] | None = None,
+    workers: int | None = None,
+) -> dict:
+    """
+    評估每組參數並排序。frames 可預先提供（同 backtest.run_backtest）。
+    workers <= 1 時在本行程依序計算，否則使用 compute_pool 的常駐行程池。
+    回傳 {results[{rank, 參數..., 投組統計...}], evaluated, tickers, metric, elapsed}。
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric 需為 {', '.join(METRICS)} 之一")
+    start = time.perf_counter()
+    frames = frames if frames is not None else backtest.load_frames(tickers, years)
+    indicators = backtest.prepare(frames)
+    workers = workers or compute_pool.COMPUTE_WORKERS
+    param_sets = list(dict.fromkeys(param_sets))
+
+    portfolios: dict[int, dict] = {}
+    if not indicators:
+        param_sets = []
+    if workers <= 1 or len(param_sets) <= 1:
+        for i, p in enumerate(param_sets):
+            portfolios[i] = _evaluate_params(frames, indicators, p, max_hold)
+    else:
+        arrays, meta = _pack(frames, indicators)
+        indexed = list(enumerate(param_sets))
+        size = math.ceil(len(indexed) / (workers * BATCHES_PER_WORKER))
+        with SharedArrays(arrays) as shared:
+            pool = compute_pool.get_pool(workers)
+            futures = [
+                pool.submit(_evaluate_batch, shared.name, shared.layout, meta, indexed[k:k + size], max_hold)
+                for k in range(0, len(indexed), size)
+            ]
+            for f in as_completed(futures):
+                portfolios.update(f.result())
+
+    rows = [{**asdict(param_sets[i]), **portfolios[i]} for i in sorted(portfolios)]
+    return {
+        "results": _rank(rows, metric),
+        "evaluated": len(rows),
+        "tickers": list(indicators),
+        "metric": metric,
+        "elapsed": round(time.perf_counter() - start, 2),
+    }
+
+
+def save_csv(results: list[dict], path: str) -> None:
+    if not results:
+        return
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    codes = [c.strip() for c in sys.argv[1].split(",") if c.strip()]
+    n_years = int(sys.argv[2]) if len(sys.argv) > 2 else 10
+    n_samples = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    sets = sample(DEFAULT_SPACE, n_samples) if n_samples else grid(DEFAULT_SPACE)
+    out = run_sweep(codes, sets, years=n_years)
+    compute_pool.shutdown()
+    swept = list(DEFAULT_SPACE)
+    print(f"{out['evaluated']} 組參數 × {len(out['tickers'])} 檔，{out['elapsed']}s（依 {out['metric']} 排序）")
+    for row in out["results"][:20]:
+        params = " ".join(f"{k}={row[k]}" for k in swept)
+        print(f"#{row['rank']:<4} {params}  sharpe={row['sharpe']} cagr={row['cagr']} "
+              f"mdd={row['max_drawdown']} trades={row['trades']}")
+    if len(sys.argv) > 4:
+        save_csv(out["results"], sys.argv[4])
+        print(f"已寫入 {sys.argv[4]}")
@@ -0,0 +1,66 @@
+"""
+後端測試共用設定：backend/ 為平面模組（import stock_monitor …），加入 sys.path；
+各 SQLite 庫改寫到暫存目錄，測試不碰工作目錄裡的 .db。
+共用 fixture：make_frame（隨機漫步日 K）、make_fetcher（bar_store 的 fetch 替身）。
+"""
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+_TMP = tempfile.mkdtemp(prefix="backend-tests-")
+for var, name in (
+    ("BAR_STORE_PATH", "bars.db"),
+    ("ALERTS_DB_PATH", "alerts.db"),
+    ("SIGNAL_HISTORY_PATH", "signal_history.db"),
+    ("SCREENER_SNAPSHOT_PATH", "screener_snapshot.json"),
+    ("FINMIND_CACHE_PATH", "finmind.db"),
+):
+    os.environ.setdefault(var, os.path.join(_TMP, name))
+os.environ.setdefault("SCREENER_SCHEDULER", "0")
+
+
+def _make_frame(n_bars: int = 120, seed: int = 0, *, scale: float = 1.0, volume: float = 3_000_000.0) -> pd.DataFrame:
+    """隨機漫步日 K（台北時區，最後一根為今天）；Volume 在 volume 的 0.5–1.5 倍間。"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n_bars))) * scale
+    spread = np.abs(rng.normal(0, 0.01, n_bars)) * close
+    end = pd.Timestamp.now(tz="Asia/Taipei").normalize()
+    index = pd.bdate_range(end=end, periods=n_bars, tz="Asia/Taipei")
+    return pd.DataFrame({"Open": close, "High": close + spread, "Low": close - spread, "Close": close,
+                         "Volume": rng.uniform(0.5, 1.5, n_bars) * volume}, index=index)
+
+
+class Fetcher:
+    """
+    bar_store 的 fetch 替身：period= 回傳 full，start= 回傳 incremental
+    （未指定時由 full 自 start 起截取）；None 或空表視為抓取失敗（回傳 {}）。calls 依序記錄請求種類。
+    """
+
+    def __init__(self, full: pd.DataFrame | None, incremental: pd.DataFrame | None = None):
+        self.full, self.incremental, self.calls = full, incremental, []
+
+    def __call__(self, symbols, interval, period=None, start=None):
+        self.calls.append("full" if period else "incremental")
+        df = self.full if period else self.incremental
+        if df is None and start is not None and self.full is not None:
+            df = self.full[self.full.index >= pd.Timestamp(start).tz_localize("Asia/Taipei")]
+        if df is None or df.empty:
+            return {}
+        return {s: df for s in symbols}
+
+
+@pytest.fixture
+def make_frame():
+    return _make_frame
+
+
+@pytest.fixture
+def make_fetcher():
+    return Fetcher
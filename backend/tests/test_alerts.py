@@ -0,0 +1,95 @@
+"""警示引擎：邊緣觸發、webhook 白名單、全域上限。"""
+import pytest
+
+import alerts
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    monkeypatch.setattr(alerts, "ALERTS_DB", str(tmp_path / "alerts.db"))
+    return alerts.AlertEngine(hub=None)
+
+
+def _push(engine, ticker, **fields):
+    """模擬 watch_hub 一輪：fields 為變動欄位，results 為完整的最新一列。"""
+    row = {**engine.rows.get(ticker, {"ticker": ticker}), "error": None, **fields}
+    engine.on_changes({ticker: fields}, {ticker: row})
+
+
+def test_fires_only_on_false_to_true_edges(engine):
+    rule = engine.add_rule("u1", "2330", "rsi", "<=", 30)
+    _push(engine, "2330", rsi=35.0)
+    _push(engine, "2330", rsi=28.0)
+    _push(engine, "2330", rsi=25.0)     # 仍成立：不重複觸發
+    _push(engine, "2330", rsi=40.0)     # 重設
+    _push(engine, "2330", rsi=20.0)
+    events = engine.recent_events("u1")
+    assert [e["actual"] for e in events] == [28.0, 20.0]
+    assert all(e["rule_id"] == rule.id for e in events)
+    assert engine.recent_events("u2") == []
+
+
+def test_rule_created_while_true_does_not_fire_and_errors_are_skipped(engine):
+    _push(engine, "2317", close=110.0, avwap=100.0)
+    engine.add_rule("u1", "2317", "close", ">", ref="avwap")
+    _push(engine, "2317", close=111.0)                       # 建立時已成立：不觸發
+    engine.on_changes({"2317": {"close": 90.0}}, {"2317": {"ticker": "2317", "error": "逾時"}})
+    _push(engine, "2317", close=95.0, avwap=100.0)
+    _push(engine, "2317", close=105.0)
+    assert [e["actual"] for e in engine.recent_events("u1")] == [105.0]
+
+
+def test_only_affected_fields_are_evaluated(engine):
+    engine.add_rule("u1", "2330", "signal", "==", "滿分買進")
+    _push(engine, "2330", signal="觀察中", rsi=50.0)
+    _push(engine, "2330", rsi=20.0)                           # signal 未變動
+    _push(engine, "2330", signal="滿分買進")
+    assert [e["actual"] for e in engine.recent_events("u1")] == ["滿分買進"]
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost/hook",
+    "http://localhost:8080/hook",
+    "https://LOCALHOST:9000/x",
+    "http://127.0.0.1:5000/",
+    "http://[::1]:5000/",
+])
+def test_webhook_allowlist_accepts_local_origins(url, monkeypatch):
+    monkeypatch.setattr(alerts, "ALERT_WEBHOOK_ORIGINS", ("http://localhost", "https://localhost", "http://127.0.0.1", "http://[::1]"))
+    assert alerts.validate("2330", "rsi", "<=", 30, webhook=url) == (30.0, None)
+
+
+@pytest.mark.parametrize("url", [
+    "http://localhost@evil.com/x",
+    "http://localhost.evil.com/",
+    "http://user:pw@localhost/x",
+    "http://127.0.0.1.nip.io/",
+    "ftp://localhost/x",
+    "https://localhost/x",           # 白名單只有 http://localhost
+    "http://localhost:99999/",
+    "localhost/x",
+    "http:///x",
+])
+def test_webhook_allowlist_rejects_bypasses(url):
+    with pytest.raises(ValueError):
+        alerts.validate("2330", "rsi", "<=", 30, webhook=url)
+
+
+def test_webhook_allowlist_port_pinning(monkeypatch):
+    monkeypatch.setattr(alerts, "ALERT_WEBHOOK_ORIGINS", ("http://localhost:8080",))
+    assert alerts._webhook_allowed("http://localhost:8080/x")
+    assert not alerts._webhook_allowed("http://localhost:8081/x")
+    assert not alerts._webhook_allowed("http://localhost/x")
+
+
+def test_global_caps_ignore_owner(engine, monkeypatch):
+    monkeypatch.setattr(alerts, "MAX_ALERT_TICKERS", 2)
+    engine.add_rule("a", "2330", "rsi", "<=", 30)
+    engine.add_rule("b", "2317", "rsi", "<=", 30)
+    engine.add_rule("c", "2330", "rsi", ">=", 70)     # 已涵蓋的代號不占額度
+    with pytest.raises(ValueError):
+        engine.add_rule("d", "2454", "rsi", "<=", 30)
+    monkeypatch.setattr(alerts, "MAX_RULES", 3)
+    with pytest.raises(ValueError):
+        engine.add_rule("e", "2330", "rsi", "<=", 20)
+    assert len(engine.rules) == 3
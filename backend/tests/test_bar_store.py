@@ -0,0 +1,69 @@
+"""bar_store.sync_bars：增量同步、還原權值改寫時的整段替換，以及重抓失敗時保留舊序列。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import bar_store
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(bar_store, "BAR_DB", str(tmp_path / "bars.db"))
+
+
+def test_full_then_incremental(make_frame, make_fetcher):
+    first = make_frame(30)
+    fetch = make_fetcher(first)
+    out = bar_store.sync_bars(["2330.TW"], "1d", "60d", fetch)
+    assert len(out["2330.TW"]) == 30 and fetch.calls == ["full"]
+
+    fetch = make_fetcher(None, incremental=first.iloc[-3:])
+    out = bar_store.sync_bars(["2330.TW"], "1d", "60d", fetch)
+    assert fetch.calls == ["incremental"]
+    np.testing.assert_array_equal(out["2330.TW"]["Close"].to_numpy(), first["Close"].to_numpy())
+
+
+def test_adjustment_rewrites_whole_series(make_frame, make_fetcher):
+    bar_store.sync_bars(["X"], "1d", "60d", make_fetcher(make_frame(30)))
+    adjusted = make_frame(30, scale=0.5)
+    fetch = make_fetcher(adjusted, incremental=adjusted.iloc[-3:])
+    out = bar_store.sync_bars(["X"], "1d", "60d", fetch)
+    assert fetch.calls == ["incremental", "full"]
+    np.testing.assert_array_equal(out["X"]["Close"].to_numpy(), adjusted["Close"].to_numpy())
+
+
+def test_failed_refetch_keeps_old_series(make_frame, make_fetcher):
+    original = make_frame(30)
+    bar_store.sync_bars(["X"], "1d", "60d", make_fetcher(original))
+    fetch = make_fetcher(None, incremental=make_frame(30, scale=0.5).iloc[-3:])   # 偵測到改寫，但完整重抓失敗
+    out = bar_store.sync_bars(["X"], "1d", "60d", fetch)
+    assert fetch.calls == ["incremental", "full"]
+    np.testing.assert_array_equal(out["X"]["Close"].to_numpy(), original["Close"].to_numpy())
+
+
+def test_tables_created_once(monkeypatch, make_frame, make_fetcher):
+    calls = []
+    real = bar_store._create_tables
+    monkeypatch.setattr(bar_store, "_create_tables", lambda: calls.append(1) or real())
+    for _ in range(3):
+        bar_store.sync_bars(["X"], "1d", "60d", make_fetcher(make_frame(5)))
+    assert calls == [1]
+
+
+def test_empty_incremental_falls_back_to_full(make_frame, make_fetcher):
+    original = make_frame(30)
+    bar_store.sync_bars(["X"], "1d", "60d", make_fetcher(original))
+    refreshed = make_frame(30, seed=1)
+    fetch = make_fetcher(refreshed, incremental=pd.DataFrame())    # start= 請求回傳 {}
+    out = bar_store.sync_bars(["X"], "1d", "60d", fetch)
+    assert fetch.calls == ["incremental", "full"]
+    np.testing.assert_array_equal(out["X"]["Close"].to_numpy(), refreshed["Close"].to_numpy())
+
+
+def test_stale_symbol_skips_incremental(make_frame, make_fetcher):
+    old = make_frame(30)
+    old.index = old.index - pd.Timedelta(days=20)              # 最後一根已落在 7 天視窗外
+    bar_store.sync_bars(["X"], "1d", "60d", make_fetcher(old))
+    fetch = make_fetcher(make_frame(5))
+    bar_store.sync_bars(["X"], "1d", "7d", fetch)
+    assert fetch.calls == ["full"]
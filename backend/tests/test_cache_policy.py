@@ -0,0 +1,94 @@
+"""交易日曆（休市日檔）與 session_cached 的單一計算（single-flight）。"""
+import datetime
+import logging
+import threading
+import time
+
+import cache_policy
+from cache_policy import TZ_TAIPEI, session_cached
+
+
+def _ts(*args) -> float:
+    return datetime.datetime(*args, tzinfo=TZ_TAIPEI).timestamp()
+
+
+def test_shipped_holiday_file_covers_national_holidays():
+    assert datetime.date(2026, 10, 9) in cache_policy.TWSE_HOLIDAYS       # 國慶日補假
+    assert cache_policy.session_state(_ts(2026, 10, 9, 10, 0)) == "closed"
+    assert cache_policy.session_state(_ts(2026, 10, 8, 10, 0)) == "open"
+    # 10/9（五）休市 → 下一次開盤為 10/12（一）
+    assert cache_policy.next_open(_ts(2026, 10, 8, 15, 0)).date() == datetime.date(2026, 10, 12)
+
+
+def test_missing_holiday_file_warns(tmp_path, caplog):
+    with caplog.at_level(logging.WARNING, logger="cache_policy"):
+        assert cache_policy._load_holidays(str(tmp_path / "none.txt")) == set()
+    assert "none.txt" in caplog.text
+
+
+def test_holiday_file_without_current_year_warns(tmp_path, caplog):
+    path = tmp_path / "old.txt"
+    path.write_text("# old\n2001-01-01\n", encoding="utf-8")
+    with caplog.at_level(logging.WARNING, logger="cache_policy"):
+        assert cache_policy._load_holidays(str(path)) == {datetime.date(2001, 1, 1)}
+    assert caplog.records
+
+
+def test_session_cached_single_flight():
+    calls = []
+    gate = threading.Event()
+
+    @session_cached("news")
+    def slow(x):
+        calls.append(x)
+        gate.wait(5)
+        return x * 2
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow(21))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert calls == [21] and results == [42] * 5
+    assert slow(21) == 42 and calls == [21]
+
+
+def test_session_cached_skips_uncacheable_and_recovers_from_errors():
+    calls = []
+
+    @session_cached("news", cache_if=lambda v: v is not None)
+    def flaky(x):
+        calls.append(x)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return None if len(calls) == 2 else x
+
+    for expected in (RuntimeError, None, 7):
+        try:
+            assert flaky(7) == expected
+        except RuntimeError:
+            assert expected is RuntimeError
+    assert flaky(7) == 7 and len(calls) == 3
+
+
+def test_session_cached_is_bounded_lru():
+    calls = []
+
+    @session_cached("news", cache_if=lambda v: v is not None, maxsize=2)
+    def lookup(x):
+        calls.append(x)
+        return None if x.startswith("bad") else x
+
+    lookup("a"), lookup("b")
+    for i in range(5):
+        lookup(f"bad{i}")                   # 不可快取的結果不佔名額
+    lookup("a"), lookup("b")
+    assert calls.count("a") == calls.count("b") == 1
+
+    lookup("a")                             # a 最近使用 → 淘汰 b
+    lookup("c")
+    lookup("a"), lookup("b")
+    assert calls.count("a") == 1 and calls.count("b") == 2
@@ -0,0 +1,48 @@
+"""圖表增量輪詢（since cursor）：只回傳 cursor 之後的新 K 棒與需覆寫的重疊區，cursor 失效時整段重送。"""
+import pandas as pd
+import pytest
+
+import bar_store
+import stock_monitor
+
+
+@pytest.fixture
+def chart(make_frame, monkeypatch):
+    df = make_frame(40, seed=3)
+    keys = stock_monitor._chart_keys(df.index, "1d")
+    chart = {"columns": stock_monitor._chart_columns(df, None, "1d", keys), "keys": keys,
+             "name": "測試", "error": None, "lod": {}}
+    monkeypatch.setattr(stock_monitor, "_get_chart_columns", lambda ticker, interval: chart)
+    return chart
+
+
+def test_returns_only_bars_after_cursor_plus_overlap(chart):
+    keys = list(chart["keys"])
+    out = stock_monitor.get_chart_data("2330", "1d", columnar=True, since=keys[30])
+    assert out["reset"] is False and out["cursor"] == keys[-1]
+    replaced = out["replaced"]
+    assert replaced == bar_store.OVERLAP_BARS                 # 用戶端已有的最後幾根（含 cursor 本身）
+    times = out["columns"]["time"]
+    assert times[:replaced] == keys[30 - replaced + 1:31]
+    assert times[replaced:] == keys[31:]                      # 新 K 棒：cursor 之後的全部
+    assert out["length"] == len(times)
+
+
+def test_forming_last_bar_is_replaced(chart):
+    keys = list(chart["keys"])
+    out = stock_monitor.get_chart_data("2330", "1d", since=keys[-1])
+    assert out["reset"] is False and out["replaced"] >= 1
+    assert out["data"][-1]["time"] == keys[-1]                # 未收盤的最後一根以新值覆寫
+    assert len(out["data"]) == out["replaced"]                # 沒有新 K 棒
+
+    first = stock_monitor.get_chart_data("2330", "1d", since=keys[0])
+    assert first["replaced"] == 1 and len(first["data"]) == len(keys)
+
+
+def test_cursor_outside_window_resets(chart):
+    keys = list(chart["keys"])
+    older = (pd.Timestamp(str(keys[0])) - pd.Timedelta(days=30)).date().isoformat()
+    for since in (older, "2099-01-01"):
+        out = stock_monitor.get_chart_data("2330", "1d", columnar=True, since=since)
+        assert out["reset"] is True and out["replaced"] == 0
+        assert out["columns"]["time"] == keys
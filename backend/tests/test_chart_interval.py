@@ -0,0 +1,23 @@
+"""圖表週期檢查：0m、超過一個交易時段的分K 等直接回報錯誤，不向上游下載。"""
+import pytest
+
+import stock_monitor
+
+
+@pytest.mark.parametrize("interval", ["1d", "1h", "1m", "2m", "5m", "60m", "270m"])
+def test_supported_intervals(interval):
+    assert stock_monitor.chart_interval_error(interval) is None
+
+
+@pytest.mark.parametrize("interval", ["0m", "00m", "271m", "999m", "5h", "1w", "m"])
+def test_unsupported_intervals_return_error_without_fetching(interval, monkeypatch):
+    assert stock_monitor.chart_interval_error(interval)
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("不應向上游取資料")
+
+    monkeypatch.setattr(stock_monitor, "get_bars", forbidden)
+    out = stock_monitor.get_chart_data("2330", interval, columnar=True)
+    assert out["error"].startswith("不支援的週期") and out["length"] == 0 and out["cursor"] is None
+    delta = stock_monitor.get_chart_data("2330", interval, since="2026-10-19")
+    assert delta["error"] == out["error"] and delta["data"] == []
@@ -0,0 +1,78 @@
+"""圖表降採樣與可視範圍：LTTB 保留首尾、OHLC 依桶聚合、全區間層級快取、日期 end 涵蓋整天。"""
+import numpy as np
+import pandas as pd
+
+import stock_monitor
+from stock_monitor import _downsample_columns, _lttb_buckets, _slice_chart
+
+
+def _chart(df: pd.DataFrame, interval: str) -> dict:
+    keys = stock_monitor._chart_keys(df.index, interval)
+    columns = stock_monitor._chart_columns(df, None, interval, keys)
+    return {"columns": columns, "keys": keys, "name": "測試", "error": None, "lod": {}}
+
+
+def _minute_frame(days: list[str]) -> pd.DataFrame:
+    index = pd.DatetimeIndex([
+        ts for d in days for ts in pd.date_range(f"{d} 09:00", f"{d} 13:30", freq="1min", tz="Asia/Taipei")
+    ])
+    close = np.linspace(100, 110, len(index))
+    return pd.DataFrame({"Open": close, "High": close + 1, "Low": close - 1, "Close": close,
+                         "Volume": np.full(len(index), 1000.0)}, index=index)
+
+
+def test_downsample_keeps_endpoints_and_aggregates_buckets(make_frame):
+    columns = _chart(make_frame(1000, seed=1), "1d")["columns"]
+    out, selected = _downsample_columns(columns, 50)
+    assert len(out["time"]) == 50 and all(len(v) == 50 for v in out.values())
+    assert out["time"][0] == columns["time"][0] and out["time"][-1] == columns["time"][-1]
+
+    _sel, bounds = _lttb_buckets(np.array(columns["price"], dtype=float), 50)
+    np.testing.assert_array_equal(selected, _sel)
+    for k in range(50):
+        lo, hi = bounds[k], bounds[k + 1]
+        assert lo <= selected[k] < hi
+        assert out["open"][k] == columns["open"][lo]
+        assert out["high"][k] == max(columns["high"][lo:hi])
+        assert out["low"][k] == min(columns["low"][lo:hi])
+        assert out["close"][k] == columns["close"][hi - 1]
+        assert out["volume"][k] == sum(columns["volume"][lo:hi])
+        assert out["price"][k] == columns["price"][selected[k]]
+    assert sum(out["volume"]) == sum(columns["volume"])
+
+
+def test_downsample_keeps_spikes_and_short_series():
+    y = np.full(500, 100.0)
+    y[321] = 150.0
+    selected, _bounds = _lttb_buckets(y, 20)
+    assert 321 in selected
+
+    columns = {f: [1.0] * 10 for f in stock_monitor.CHART_FIELDS}
+    out, selected = _downsample_columns(columns, 20)
+    assert out is columns and selected.tolist() == list(range(10))
+
+
+def test_slice_date_only_end_covers_whole_day():
+    chart = _chart(_minute_frame(["2026-10-15", "2026-10-16", "2026-10-19"]), "1m")
+    day = _slice_chart(chart, "2026-10-16", "2026-10-16")
+    assert day["time"][0] == "10-16 09:00" and day["time"][-1] == "10-16 13:30"
+    assert len(day["time"]) == 271
+
+    window = _slice_chart(chart, "2026-10-16 10:00", "2026-10-16T10:05")
+    assert window["time"] == [f"10-16 10:0{m}" for m in range(6)]
+    assert _slice_chart(chart, "2026-10-19 13:00", None)["time"][-1] == "10-19 13:30"
+
+
+def test_full_range_levels_are_cached_on_the_chart(make_frame, monkeypatch):
+    chart = _chart(make_frame(1200, seed=2), "1d")
+    monkeypatch.setattr(stock_monitor, "_get_chart_columns", lambda ticker, interval: chart)
+    out = stock_monitor.get_chart_data("2330", "1d", columnar=True, max_points=700)
+    assert out["length"] == 500 and list(chart["lod"]) == [500]
+    again = stock_monitor.get_chart_data("2330", "1d", columnar=True, max_points=999)
+    assert again["columns"] is chart["lod"][500]
+
+    # 指定範圍：即時降到 max_points，不寫入層級快取
+    ranged = stock_monitor.get_chart_data("2330", "1d", columnar=True, max_points=40,
+                                          start=chart["keys"][100], end=chart["keys"][899])
+    assert ranged["length"] == 40 and ranged["columns"]["time"][0] == chart["columns"]["time"][100]
+    assert list(chart["lod"]) == [500]
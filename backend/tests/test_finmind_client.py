@@ -0,0 +1,111 @@
+"""FinMindClient：網路請求期間不持鎖、同一筆只抓一次、暫時性錯誤不會永久關閉全市場模式。"""
+import datetime
+import threading
+import time
+
+import requests
+
+import finmind_client
+from finmind_client import FinMindClient, TokenBucket
+
+DAY = datetime.date(2026, 9, 1)   # 週二
+
+
+def _client(tmp_path, responder) -> FinMindClient:
+    client = FinMindClient("token", "http://finmind.invalid", TokenBucket(1000, 1000), str(tmp_path / "fm.db"))
+    client.calls = []
+
+    def request(params):
+        client.calls.append(params)
+        return responder(params)
+    client._request = request
+    return client
+
+
+def _ok(params):
+    return {"status": 200, "data": [
+        {"date": params["start_date"], "stock_id": params.get("data_id", "2330"), "name": "Investment_Trust",
+         "buy": 10, "sell": 4},
+    ]}
+
+
+def test_transient_error_keeps_bulk_mode(tmp_path):
+    def flaky(params):
+        raise requests.HTTPError("503")
+    client = _client(tmp_path, flaky)
+    client.ensure_range(DAY, DAY, ["2330"])
+    assert client.bulk_supported
+    assert all("data_id" not in p for p in client.calls)
+
+    client._request = lambda params: {"status": 500, "msg": "server error"}
+    client.ensure_range(DAY, DAY, ["2330"])
+    assert client.bulk_supported
+
+
+def test_unsupported_falls_back_with_cooldown(tmp_path):
+    def responder(params):
+        return {"status": 400, "msg": "level"} if "data_id" not in params else _ok(params)
+    client = _client(tmp_path, responder)
+    client.ensure_range(DAY, DAY, ["2330"])
+    assert not client.bulk_supported
+    assert [p.get("data_id") for p in client.calls] == [None, "2330"]
+
+    assert client.bulk_disabled_until <= time.time() + finmind_client.BULK_RETRY_AFTER
+    client.bulk_disabled_until = time.time() - 1      # 冷卻期過後再試全市場
+    assert client.bulk_supported
+
+
+def test_concurrent_callers_share_one_fetch(tmp_path):
+    gate = threading.Event()
+
+    def slow(params):
+        gate.wait(5)
+        return _ok(params)
+    client = _client(tmp_path, slow)
+    threads = [threading.Thread(target=client.ensure_range, args=(DAY, DAY, ["2330"])) for _ in range(4)]
+    for t in threads:
+        t.start()
+    time.sleep(0.2)
+    gate.set()
+    for t in threads:
+        t.join(5)
+    assert len(client.calls) == 1
+
+
+def test_slow_fetch_does_not_block_cached_reader(tmp_path):
+    client = _client(tmp_path, _ok)
+    client.ensure_range(DAY, DAY, ["2330"])            # DAY 已在快取
+    gate = threading.Event()
+    client._request = lambda params: (gate.wait(5), _ok(params))[1]
+    other_day = DAY + datetime.timedelta(days=1)
+    slow = threading.Thread(target=client.ensure_range, args=(other_day, other_day, ["2330"]))
+    slow.start()
+    time.sleep(0.1)
+    started = time.monotonic()
+    client.ensure_range(DAY, DAY, ["2330"])            # 不需要網路：不應等慢請求
+    assert time.monotonic() - started < 1
+    gate.set()
+    slow.join(5)
+
+
+def test_first_connections_wait_for_tables(tmp_path):
+    client = _client(tmp_path, _ok)
+    real = client._init_cache
+
+    def slow_init():
+        time.sleep(0.2)
+        real()
+    client._init_cache = slow_init
+    errors = []
+
+    def read():
+        try:
+            client._missing(["*"], [DAY.isoformat()], DAY.isoformat())
+        except Exception as exc:
+            errors.append(exc)
+    threads = [threading.Thread(target=read) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
@@ -0,0 +1,63 @@
+"""全市場分塊掃描：塊內預算、冷啟動預篩、流動性不足名單換日清空。"""
+import time
+
+
+import stock_monitor
+
+
+def _result(t, error=None):
+    r = stock_monitor._empty_scan_result(t)
+    r["score"] = None if error else 1
+    if error:
+        r["error"] = r["signal"] = error
+    return r
+
+
+def test_budget_is_checked_between_batches_inside_a_chunk(monkeypatch):
+    calls = []
+
+    def slow_panel(tickers):
+        calls.append(list(tickers))
+        time.sleep(0.2)
+        return {t: _result(t) for t in tickers}
+
+    monkeypatch.setattr(stock_monitor, "scan_tickers_panel", slow_panel)
+    monkeypatch.setattr(stock_monitor, "_prefilter_cold", lambda tickers: {})
+    monkeypatch.setattr(stock_monitor, "BATCH_CHUNK_SIZE", 2)
+    monkeypatch.setattr(stock_monitor, "FULL_SCAN_CHUNK", 6)
+    monkeypatch.setattr(stock_monitor.signal_history, "record", lambda *a: 0)
+
+    tickers = [f"9{i:03d}" for i in range(6)]
+    out = stock_monitor.scan_full_market(tickers, budget=0.1)
+    assert len(calls) == 1                       # 單一塊，第一批後即超過預算
+    assert out["partial"] and out["skipped"] == tickers[2:]
+    assert [r["ticker"] for r in out["results"]] == tickers[:2]
+
+
+def test_cold_prefilter_skips_full_download_and_resets_next_day(monkeypatch, make_frame):
+    panel_calls, probe_calls = [], []
+    monkeypatch.setattr(stock_monitor.bar_store, "stored_symbols", lambda symbols, interval: set())
+
+    def probe(symbols, period, interval="1d", retry=True, start=None):
+        probe_calls.append((list(symbols), period))
+        return {s: make_frame(5, volume=100_000 if s.startswith("9001") else 5_000_000) for s in symbols}
+
+    def panel(tickers):
+        panel_calls.append(list(tickers))
+        return {t: _result(t) for t in tickers}
+
+    monkeypatch.setattr(stock_monitor, "_download_batch", probe)
+    monkeypatch.setattr(stock_monitor, "scan_tickers_panel", panel)
+    monkeypatch.setattr(stock_monitor, "_illiquid_date", "2026-10-18")
+    stock_monitor._illiquid_today["8888"] = "流動性不足（昨天）"
+
+    results, skipped = stock_monitor._scan_chunk(["9001", "9002"])
+    assert skipped == [] and "8888" not in stock_monitor._illiquid_today   # 換日清空
+    assert probe_calls == [(["9001.TW", "9002.TW"], "5d")]
+    assert panel_calls == [["9002"]]
+    assert results["9001"]["error"].startswith("流動性不足")
+
+    # 同日再掃：9001 直接由名單判定，不再下載
+    results, _ = stock_monitor._scan_chunk(["9001", "9002"])
+    assert len(probe_calls) == 2 and probe_calls[1][0] == ["9002.TW"]
+    assert panel_calls[-1] == ["9002"] and results["9001"]["error"].startswith("流動性不足")
@@ -0,0 +1,117 @@
+"""串流指標狀態與 IndicatorBook：與 scan_ticker 以同一視窗計算的結果一致，含盤中修正與還原權值重播。"""
+import pandas as pd
+import pytest
+
+import bar_store
+import indicator_state
+import stock_monitor
+from indicator_state import IndicatorBook, StreamingIndicators
+
+PERIOD = "120d"
+
+
+def _recursive(df: pd.DataFrame) -> dict:
+    return {
+        "td_count": stock_monitor._calc_td_sequential(df),
+        "rsi": stock_monitor._calc_rsi(df),
+        "atr": stock_monitor._calc_atr(df),
+        "macd": stock_monitor._calc_macd(df),
+        "emas": stock_monitor._calc_emas(df),
+    }
+
+
+def _state_recursive(state: StreamingIndicators) -> dict:
+    values = state.values()
+    return {k: values[k] for k in ("td_count", "rsi", "atr", "macd", "emas")}
+
+
+@pytest.mark.parametrize("n_bars", [10, 20, 40, 80])
+def test_from_frame_matches_full_recompute(n_bars, make_frame):
+    df = make_frame(n_bars, seed=n_bars)
+    assert _state_recursive(StreamingIndicators.from_frame(df)) == _recursive(df)
+
+
+def test_replace_last_equals_replay(make_frame):
+    df = make_frame(70, seed=1)
+    state = StreamingIndicators.from_frame(df.iloc[:-1])
+    last_ts = df.index[-1]
+    for close in (101.0, 97.5, float(df["Close"].iloc[-1])):       # 盤中多次修正最後一根
+        state.on_bar(last_ts, float(df["High"].iloc[-1]), float(df["Low"].iloc[-1]), close,
+                     float(df["Volume"].iloc[-1]))
+    assert state.n == 70
+    assert _state_recursive(state) == _recursive(df)
+
+
+def test_snapshot_is_independent_of_later_updates(make_frame):
+    df = make_frame(60, seed=2)
+    state = StreamingIndicators.from_frame(df)
+    ts, h, lo, c, v = df.index[-1], *df.iloc[-1][["High", "Low", "Close", "Volume"]].astype(float)
+    state.replace_last(ts, h, lo, c * 1.1, v)
+    state.replace_last(ts, h, lo, c, v)
+    assert _state_recursive(state) == _recursive(df)
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(bar_store, "BAR_DB", str(tmp_path / "bars.db"))
+
+
+def _store_window(sym: str) -> pd.DataFrame:
+    df = bar_store.load_bars(sym, "1d", bar_store.period_start(PERIOD))
+    return stock_monitor._clean_stock_frame(df)
+
+
+def test_book_tracks_store_window(store, make_frame, make_fetcher):
+    data = make_frame(100, seed=3)
+    fetch = make_fetcher(data.iloc[:-1])
+    book = IndicatorBook("1d", PERIOD, fetch)
+    state = book.refresh(["X"])["X"]
+    assert _state_recursive(state) == _recursive(_store_window("X"))
+
+    fetch.full = data                                   # 新 K 棒（增量）
+    seeded = state
+    state = book.refresh(["X"])["X"]
+    assert state is seeded                            # 沒有重播
+    assert _state_recursive(state) == _recursive(_store_window("X"))
+
+
+def test_book_reseeds_after_adjustment(store, make_frame, make_fetcher):
+    data = make_frame(100, seed=4)
+    fetch = make_fetcher(data)
+    book = IndicatorBook("1d", PERIOD, fetch)
+    before = book.refresh(["X"])["X"]
+
+    fetch.full = make_frame(100, seed=4, scale=0.5)        # 除權息：整段還原價改寫 → bar_store 整段重抓
+    after = book.refresh(["X"])["X"]
+    assert after is not before
+    assert _state_recursive(after) == _recursive(_store_window("X"))
+
+
+def test_book_reseeds_when_window_start_moves(store, monkeypatch, make_frame, make_fetcher):
+    data = make_frame(100, seed=5)
+    book = IndicatorBook("1d", PERIOD, make_fetcher(data))
+    before = book.refresh(["X"])["X"]
+    later = bar_store.period_start(PERIOD) + pd.Timedelta(days=7)
+    monkeypatch.setattr(bar_store, "period_start", lambda period, now=None: later)
+    after = book.refresh(["X"])["X"]
+    assert after is not before and after.n < before.n
+
+
+def test_scan_tickers_streaming_matches_scan_ticker(store, monkeypatch, make_frame):
+    frames = {"2330": make_frame(100, seed=6), "2317": make_frame(100, seed=7)}
+    by_symbol = {stock_monitor.yahoo_symbol(t): df for t, df in frames.items()}
+
+    def fetch(symbols, interval, period=None, start=None):
+        return {s: by_symbol[s] for s in symbols}
+
+    book = IndicatorBook("1d", PERIOD, fetch)
+    monkeypatch.setattr(stock_monitor, "_watch_book", book)
+    monkeypatch.setattr(stock_monitor, "_get_institution_net_buys", lambda ids: {t: 100 for t in ids})
+    monkeypatch.setattr(stock_monitor, "_get_institution_net_buy", lambda t: 100)
+
+    results = stock_monitor.scan_tickers_streaming(list(frames))
+    for t in frames:
+        assert results[t] == stock_monitor.scan_ticker(t, _store_window(stock_monitor.yahoo_symbol(t)))
+
+    stock_monitor.scan_tickers_streaming(["2330"])
+    assert list(book.states) == [stock_monitor.yahoo_symbol("2330")]
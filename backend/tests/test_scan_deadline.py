@@ -0,0 +1,79 @@
+"""run_scan / stream_scan 的整批時限：批次下載、籌碼、系統性風險都只等到 deadline。"""
+import time
+
+import pytest
+
+import compute_pool
+import stock_monitor
+
+SLOW = 3.0
+TIMEOUT = 0.4
+
+
+def _slow(value):
+    def fn(*args, **kwargs):
+        time.sleep(SLOW)
+        return value
+    return fn
+
+
+@pytest.fixture(autouse=True)
+def _quiet(monkeypatch):
+    monkeypatch.setattr(stock_monitor.signal_history, "record", lambda *a: 0)
+    monkeypatch.setattr(stock_monitor, "check_systemic_risk", lambda: {"flag": False, "msg": "系統正常"})
+    monkeypatch.setattr(stock_monitor, "_get_institution_net_buys", lambda ts: {t: 10 for t in ts})
+    monkeypatch.setattr(stock_monitor, "_get_stock_data", _slow(None))
+
+
+def test_slow_batch_download_is_bounded(monkeypatch):
+    monkeypatch.setattr(stock_monitor, "_get_stock_data_batch", _slow({}))
+    started = time.monotonic()
+    out = stock_monitor.run_scan(["A", "B"], timeout=TIMEOUT)
+    assert time.monotonic() - started < TIMEOUT + 0.5
+    assert out["timed_out"] == ["A", "B"]
+
+
+def test_only_tickers_without_data_time_out(monkeypatch, make_frame):
+    frames = {"A": make_frame(seed=1), "B": None}
+    monkeypatch.setattr(stock_monitor, "_get_stock_data_batch", lambda ts, retry=True: frames)
+    started = time.monotonic()
+    out = stock_monitor.run_scan(["A", "B"], timeout=TIMEOUT)
+    assert time.monotonic() - started < TIMEOUT + 0.5
+    assert out["timed_out"] == ["B"]
+    a = out["results"][0]
+    assert a["ticker"] == "A" and a["error"] is None and a["net_buy"] == 10
+
+
+def test_slow_net_buys_and_systemic_risk_are_bounded(monkeypatch, make_frame):
+    monkeypatch.setattr(stock_monitor, "_get_stock_data_batch", lambda ts, retry=True: {"A": make_frame(seed=2)})
+    monkeypatch.setattr(stock_monitor, "_get_institution_net_buys", _slow({"A": 10}))
+    monkeypatch.setattr(stock_monitor, "check_systemic_risk", _slow({"flag": True, "msg": "x"}))
+    started = time.monotonic()
+    out = stock_monitor.run_scan(["A"], timeout=TIMEOUT)
+    assert time.monotonic() - started < TIMEOUT + 0.5
+    assert out["systemic_risk"] is False and out["systemic_msg"] == ""
+    assert out["timed_out"] == [] and out["results"][0]["net_buy"] is None
+
+    # stream_scan 先等系統性風險（送 start 事件）才開始掃描：慢的系統性風險會用完整批時限
+    started = time.monotonic()
+    events = list(stock_monitor.stream_scan(["A"], timeout=TIMEOUT))
+    assert time.monotonic() - started < TIMEOUT + 0.5
+    assert [e["type"] for e in events] == ["start", "result", "end"]
+    assert events[0]["systemic_risk"] is False
+
+    monkeypatch.setattr(stock_monitor, "check_systemic_risk", lambda: {"flag": False, "msg": "系統正常"})
+    started = time.monotonic()
+    events = list(stock_monitor.stream_scan(["A"], timeout=TIMEOUT))
+    assert time.monotonic() - started < TIMEOUT + 0.5
+    assert events[1]["result"]["error"] is None and events[-1]["timed_out"] == []
+
+
+def test_process_mode_panel_respects_deadline(monkeypatch, make_frame):
+    monkeypatch.setattr(compute_pool, "COMPUTE_MODE", "process")
+    monkeypatch.setattr(stock_monitor, "_get_stock_data_batch", lambda ts, retry=True: {"A": make_frame(seed=3)})
+    monkeypatch.setattr(stock_monitor, "scan_panel", _slow({}))
+    started = time.monotonic()
+    out = stock_monitor.run_scan(["A"], timeout=TIMEOUT)
+    assert time.monotonic() - started < TIMEOUT + 0.5
+    # 行程池未在時限內完成：已有資料的標的改在本行程計算，不算逾時
+    assert out["timed_out"] == [] and out["results"][0]["error"] is None
@@ -0,0 +1,29 @@
+"""多週期區塊：資料格式錯誤回報 error 欄位，其他例外不吞掉。"""
+import pytest
+
+import stock_monitor
+
+
+def _raise(exc):
+    def fn(tickers):
+        raise exc
+    return fn
+
+
+def test_data_shape_errors_become_error_blocks(monkeypatch):
+    monkeypatch.setattr(stock_monitor, "scan_mtf", _raise(KeyError("Close")))
+    out = stock_monitor._scan_mtf_safe(["2330", "2317", "2330"])
+    assert list(out) == ["2330", "2317"]
+    assert all(b["error"].startswith("多週期資料格式錯誤") and "KeyError" in b["error"] for b in out.values())
+
+
+def test_unexpected_errors_propagate(monkeypatch):
+    monkeypatch.setattr(stock_monitor, "scan_mtf", _raise(RuntimeError("bug")))
+    with pytest.raises(RuntimeError):
+        stock_monitor._scan_mtf_safe(["2330"])
+
+
+def test_successful_blocks_carry_error_none(monkeypatch):
+    monkeypatch.setattr(stock_monitor, "get_bars", lambda symbols, period, interval: {})
+    out = stock_monitor.scan_mtf(["2330"])
+    assert out["2330"]["error"] is None and out["2330"]["score"] == 0
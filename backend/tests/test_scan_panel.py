@@ -0,0 +1,73 @@
+"""面板模式（scan_panel）與逐檔 scan_ticker 的逐欄位等價性，以及逐檔錯誤隔離。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import stock_monitor
+from stock_monitor import scan_panel, scan_ticker
+
+FIELDS = ("close", "avwap", "net_buy", "zscore", "td_count", "rsi", "atr", "stop_loss",
+          "rr_ratio", "ema8", "ema21", "macd_hist", "score", "signal", "error")
+
+
+@pytest.fixture
+def net_buys(monkeypatch):
+    values = {"A": 1200, "B": -300, "C": None, "D": 0, "E": 50, "F": None, "G": 10}
+    monkeypatch.setattr(stock_monitor, "_get_institution_net_buy", lambda t: values.get(t))
+    return values
+
+
+def test_panel_matches_scan_ticker(net_buys, make_frame):
+    frames = {
+        "A": make_frame(120, 0),
+        "B": make_frame(60, 1),
+        "C": make_frame(40, 2),           # 不足 56 根：無 EMA
+        "D": make_frame(25, 3),           # 不足 35 根：無 MACD
+        "E": make_frame(19, 4),           # 資料不足 20 日
+        "F": make_frame(90, 5, volume=200_000),   # 流動性不足
+        "G": make_frame(200, 6),
+    }
+    panel = scan_panel(frames, net_buys)
+    for t, df in frames.items():
+        expected = scan_ticker(t, df)
+        for field in FIELDS:
+            assert panel[t][field] == expected[field], (t, field)
+
+
+def test_trending_frames_hit_td_extremes(net_buys, make_frame):
+    up = make_frame(80, 7)
+    up["Close"] = np.linspace(50, 120, 80)
+    up["High"], up["Low"] = up["Close"] * 1.01, up["Close"] * 0.99
+    frames = {"A": up, "B": make_frame(80, 8)}
+    panel = scan_panel(frames, net_buys)
+    assert panel["A"]["td_count"] == 9
+    for t, df in frames.items():
+        expected = scan_ticker(t, df)
+        assert {f: panel[t][f] for f in FIELDS} == {f: expected[f] for f in FIELDS}
+
+
+def test_bad_frames_are_isolated(net_buys, make_frame):
+    good = make_frame(80, 9)
+    no_volume = good.drop(columns=["Volume"])
+    text = good.astype(object)
+    text.loc[text.index[-1], "Close"] = "n/a"
+    frames = {"A": good, "B": None, "C": no_volume, "D": text, "E": pd.DataFrame()}
+    panel = scan_panel(frames, net_buys)
+    assert panel["A"]["error"] is None
+    assert panel["A"]["score"] == scan_ticker("A", good)["score"]
+    assert panel["B"]["error"] == panel["E"]["error"] == "取資料失敗"
+    assert panel["C"]["error"] == panel["D"]["error"] == "資料格式錯誤"
+
+
+def test_scan_tickers_panel_builds_panel_once(monkeypatch, net_buys, make_frame):
+    frames = {"A": make_frame(80, 10), "B": make_frame(80, 11, volume=100_000)}
+    monkeypatch.setattr(stock_monitor, "_get_stock_data_batch", lambda tickers: frames)
+    asked = []
+    monkeypatch.setattr(stock_monitor, "_get_institution_net_buys", lambda ts: asked.append(ts) or {})
+    built = []
+    real = stock_monitor._build_panel
+    monkeypatch.setattr(stock_monitor, "_build_panel", lambda f: built.append(1) or real(f))
+    results = stock_monitor.scan_tickers_panel(["A", "B"])
+    assert len(built) == 1
+    assert asked == [["A"]]          # 只對通過流動性檢查的標的查籌碼
+    assert results["A"]["score"] is not None and results["B"]["error"].startswith("流動性不足")
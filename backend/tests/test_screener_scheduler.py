@@ -0,0 +1,69 @@
+"""Screener 快照：fresh 請求合併、跨 worker 共用掃描結果。"""
+import threading
+import time
+
+import screener_scheduler
+import stock_monitor
+from screener_scheduler import ScreenerScheduler
+
+
+def _stub_scan(monkeypatch, delay=0.0):
+    calls = []
+
+    def scan():
+        calls.append(time.time())
+        time.sleep(delay)
+        return {"results": [{"ticker": "2330", "score": 6}, {"ticker": "2317", "score": 2}],
+                "scanned_at": "2026-10-19T10:00:00", "total": 2}
+
+    monkeypatch.setattr(screener_scheduler, "SCREENER_UNIVERSE", "default")
+    monkeypatch.setattr(stock_monitor, "scan_screener_universe", scan)
+    return calls
+
+
+def test_concurrent_fresh_requests_share_one_scan(tmp_path, monkeypatch):
+    calls = _stub_scan(monkeypatch, delay=0.3)
+    sched = ScreenerScheduler(path=str(tmp_path / "snap.json"))
+    monkeypatch.setattr(screener_scheduler, "scheduler", sched)
+
+    out = []
+    threads = [threading.Thread(target=lambda: out.append(screener_scheduler.get_screener(5, True)))
+               for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(5)
+    assert len(calls) == 1
+    assert {o["snapshot_version"] for o in out} == {1}
+    assert [r["ticker"] for r in out[0]["results"]] == ["2330"]
+
+    # SCREENER_FRESH_MIN_AGE 內再要 fresh 不重掃；過了就重掃
+    screener_scheduler.get_screener(5, True)
+    assert len(calls) == 1
+    monkeypatch.setattr(screener_scheduler, "SCREENER_FRESH_MIN_AGE", 0.0)
+    assert screener_scheduler.get_screener(5, True)["snapshot_version"] == 2
+    assert len(calls) == 2
+
+
+def test_worker_without_snapshot_reads_the_running_scan(tmp_path, monkeypatch):
+    calls = _stub_scan(monkeypatch, delay=0.3)
+    path = str(tmp_path / "snap.json")
+    leader, follower = ScreenerScheduler(path=path), ScreenerScheduler(path=path)
+
+    t = threading.Thread(target=leader.refresh)
+    t.start()
+    time.sleep(0.1)
+    monkeypatch.setattr(screener_scheduler, "scheduler", follower)
+    out = screener_scheduler.get_screener(0, False)
+    t.join(5)
+    assert len(calls) == 1
+    assert out["snapshot_version"] == 1 and out["total_scanned"] == 2
+
+
+def test_leader_skips_scan_finished_by_a_fresh_request(tmp_path, monkeypatch):
+    calls = _stub_scan(monkeypatch)
+    sched = ScreenerScheduler(path=str(tmp_path / "snap.json"))
+    sched.refresh()
+    # 排程判斷要掃，但拿到鎖時快照已夠新
+    assert sched.refresh(newer_than=sched.snapshot.created_at).version == 1
+    assert len(calls) == 1
@@ -0,0 +1,76 @@
+"""板塊輪動矩陣：分組等權平均、排名變化方向、廣度，以及成員不足的組不列入。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+import sector_rotation
+from sector_rotation import RANK_LAG, compute_rotation
+
+N = 60
+LAST = N - 1
+
+
+def _path(start_move: int, end_move: int, gain: float, final: float | None = None) -> np.ndarray:
+    """100 起，在 [start_move, end_move] 線性漲 gain，之後持平（final 可改最後一根）。"""
+    path = np.interp(np.arange(N), [start_move, end_move], [100, 100 * (1 + gain)])
+    if final is not None:
+        path[-1] = final
+    return path
+
+
+@pytest.fixture
+def rotation():
+    # A：最近 RANK_LAG 根才上漲；B：RANK_LAG 根前漲完後持平（B3 最後一根回落）
+    closes = pd.DataFrame({
+        "A1": _path(LAST - RANK_LAG, LAST, 0.10),
+        "A2": _path(LAST - RANK_LAG, LAST, 0.20),
+        "A3": _path(LAST - RANK_LAG, LAST, 0.04),
+        "B1": _path(LAST - 2 * RANK_LAG, LAST - RANK_LAG, 0.10),
+        "B2": _path(LAST - 2 * RANK_LAG, LAST - RANK_LAG, 0.10),
+        "B3": _path(LAST - 2 * RANK_LAG, LAST - RANK_LAG, 0.10, final=100.0),
+        "C1": _path(LAST - RANK_LAG, LAST, 0.50),
+    }, index=pd.bdate_range("2026-07-01", periods=N))
+    benchmark = pd.Series(100.0, index=closes.index)
+    groups = {
+        "A1": ("A", "X"), "A2": ("A", "X"), "A3": ("A", "Y"),
+        "B1": ("B", "Y"), "B2": ("B", "Y"), "B3": ("B", "Y"),
+        "C1": ("C", "X"),
+    }
+    return closes, compute_rotation(closes, benchmark, groups, windows=(RANK_LAG,))
+
+
+def test_group_mean_ranks_and_rank_change(rotation):
+    closes, out = rotation
+    w = str(RANK_LAG)
+    sectors = {r["name"]: r for r in out["sectors"]}
+    assert [r["name"] for r in out["sectors"]] == ["A", "B"]    # C 只有一檔：不列入、不參與排名
+
+    def ret(t, end):
+        return closes[t].iloc[end] / closes[t].iloc[end - RANK_LAG] - 1
+
+    assert sectors["A"]["rs"][w] == pytest.approx(np.mean([ret(t, LAST) for t in ("A1", "A2", "A3")]), abs=1e-4)
+    assert sectors["B"]["rs"][w] == pytest.approx(np.mean([ret(t, LAST) for t in ("B1", "B2", "B3")]), abs=1e-4)
+    assert sectors["A"]["members"] == sectors["B"]["members"] == 3
+
+    # RANK_LAG 根前 B 領先；現在 A 領先 → A 名次上升（正）、B 下降（負）
+    assert sectors["A"]["rank"][w] == 1 and sectors["B"]["rank"][w] == 2
+    assert sectors["A"]["rank_change"][w] == 1 and sectors["B"]["rank_change"][w] == -1
+
+
+def test_breadth_and_industries(rotation):
+    _closes, out = rotation
+    sectors = {r["name"]: r for r in out["sectors"]}
+    assert sectors["A"]["breadth"] == 1.0
+    assert sectors["B"]["breadth"] == pytest.approx(2 / 3, abs=1e-4)    # B3 收盤跌回 EMA21 之下
+    # 產業 X（A1、A2、C1）與 Y（A3、B1–B3）都有 3 檔以上
+    assert [r["name"] for r in out["industries"]] == ["X", "Y"]
+
+
+def test_small_groups_are_dropped(rotation, monkeypatch):
+    closes, _out = rotation
+    monkeypatch.setattr(sector_rotation, "MIN_MEMBERS", 4)
+    groups = {t: ("A" if t.startswith("A") else "B", "Y") for t in closes.columns}
+    out = compute_rotation(closes, pd.Series(100.0, index=closes.index), groups, windows=(RANK_LAG,))
+    assert [r["name"] for r in out["sectors"]] == ["B"]                 # A 只有 3 檔
+    assert out["sectors"][0]["rank"][str(RANK_LAG)] == 1
+    assert out["industries"][0]["members"] == 7
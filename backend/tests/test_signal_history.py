@@ -0,0 +1,116 @@
+"""signal_history：只新增的寫入、各檔最新、since 之後的變動、日期區間查詢與保留策略。"""
+import sqlite3
+
+import numpy as np
+import pytest
+
+import signal_history
+
+
+@pytest.fixture(autouse=True)
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(signal_history, "HISTORY_DB", str(tmp_path / "signal_history.db"))
+
+
+def _row(ticker: str, score: int, signal: str = "觀望", **extra) -> dict:
+    return {"ticker": ticker, "score": score, "signal": signal, "close": 100.0, **extra}
+
+
+def test_record_appends_every_scan():
+    assert signal_history.record([_row("2330", 3)], "2026-10-19T10:00:00", "scan") == 1
+    # 同一秒、不同來源各自保留，不會互相覆寫
+    assert signal_history.record([_row("2330", 5)], "2026-10-19T10:00:00", "screener") == 1
+    signal_history.record([_row("2330", 5)], "2026-10-19T10:00:00", "screener")
+    out = signal_history.history("2330")
+    assert out["score"] == [3, 5, 5]
+    assert out["source"] == ["scan", "screener", "screener"]
+
+
+def test_record_skips_errors_and_nan():
+    rows = [_row("2330", 3, rsi=np.float64("nan"), td_count=np.int64(7)), {"ticker": "2317", "error": "無資料"}]
+    assert signal_history.record(rows, "2026-10-19T10:00:00", "scan") == 1
+    (only,) = signal_history.latest()
+    assert only["ticker"] == "2330" and only["rsi"] is None and only["td_count"] == 7
+
+
+def test_latest_keeps_newest_scan():
+    signal_history.record([_row("2330", 3), _row("2317", 1)], "2026-10-19T10:00:00", "scan")
+    signal_history.record([_row("2330", 6, "強力買進")], "2026-10-19T11:00:00", "scan")
+    # 較舊的掃描晚寫入不會蓋掉最新一筆
+    signal_history.record([_row("2330", -2)], "2026-10-19T09:00:00", "market")
+    out = signal_history.latest()
+    assert [(r["ticker"], r["score"], r["signal"]) for r in out] == [("2330", 6, "強力買進"), ("2317", 1, "觀望")]
+    assert [r["ticker"] for r in signal_history.latest(["2317"])] == ["2317"]
+
+
+def test_changes_since():
+    signal_history.record([_row("2330", 3), _row("2317", 1), _row("2454", 2)], "2026-10-18T13:00:00", "scan")
+    signal_history.record([_row("2330", 5, "買進"), _row("2317", 1), _row("3008", 4)], "2026-10-19T10:00:00", "scan")
+    out = signal_history.changes_since("2026-10-18T13:30")
+    assert [c["ticker"] for c in out] == ["2330", "3008"]    # 2317 無變動、2454 之後沒掃到
+    changed, new = out
+    assert changed["changed"] == ["signal", "score"]
+    assert changed["before"]["score"] == 3 and changed["after"]["score"] == 5
+    assert new["before"] is None and new["changed"] == ["signal", "score"]
+
+    assert [c["ticker"] for c in signal_history.changes_since("2026-10-18T13:30", fields=("close",))] == ["3008"]
+    assert [c["ticker"] for c in signal_history.changes_since("2026-10-18T13:30", tickers=["2317", "2330"])] == ["2330"]
+    assert signal_history.changes_since("2026-10-19T10:00:00") == []
+    with pytest.raises(ValueError):
+        signal_history.changes_since("2026-10-18", fields=("bogus",))
+    with pytest.raises(ValueError):
+        signal_history.changes_since("昨天")
+
+
+def test_history_date_only_end_covers_whole_day():
+    for ts, score in (("2026-10-17T13:00:00", 1), ("2026-10-18T09:00:00", 2), ("2026-10-18T13:30:00", 3),
+                      ("2026-10-19T09:00:00", 4)):
+        signal_history.record([_row("2330", score)], ts, "scan")
+    assert signal_history.history("2330", start="2026-10-18", end="2026-10-18")["score"] == [2, 3]
+    assert signal_history.history("2330", end="2026-10-18T13:30")["score"] == [1, 2, 3]
+    assert signal_history.history("2330", limit=2)["score"] == [3, 4]
+
+
+def test_migrates_legacy_table():
+    conn = sqlite3.connect(signal_history.HISTORY_DB)
+    columns = ", ".join(f"{c} {'TEXT' if c in ('ticker', 'scanned_at', 'source', 'signal') else 'REAL'}"
+                        for c in signal_history._COLUMNS)
+    conn.execute(f"CREATE TABLE signal_history ({columns}, PRIMARY KEY (ticker, scanned_at)) WITHOUT ROWID")
+    conn.execute("INSERT INTO signal_history (ticker, scanned_at, source, score) VALUES ('2330', '2026-10-18T10:00:00', 'scan', 2)")
+    conn.commit()
+    conn.close()
+    signal_history.record([_row("2330", 4)], "2026-10-19T10:00:00", "scan")
+    assert signal_history.history("2330")["score"] == [2, 4]
+    assert signal_history.latest()[0]["score"] == 4
+
+
+def test_timestamps_with_offsets_are_converted_to_taipei():
+    assert signal_history._timestamp("2026-10-19T02:00:00+00:00") == "2026-10-19T10:00:00"
+    assert signal_history._timestamp("2026-10-19T02:00Z", end=True) == "2026-10-19T10:00:59"
+    assert signal_history._timestamp("2026-10-18T23:30-05:00") == "2026-10-19T12:30:00"
+    signal_history.record([_row("2330", 1)], "2026-10-19T09:30:00", "scan")
+    signal_history.record([_row("2330", 2)], "2026-10-19T11:00:00", "scan")
+    assert signal_history.history("2330", end="2026-10-19T02:00:00+00:00")["score"] == [1]
+    assert [c["ticker"] for c in signal_history.changes_since("2026-10-19T02:00:00Z")] == ["2330"]
+
+
+def test_prune_keeps_recent_scans_and_one_row_per_day(monkeypatch):
+    monkeypatch.setattr(signal_history, "HISTORY_KEEP_DAYS", 10_000)    # 寫入時的自動 prune 不刪任何列
+    for ts, score in (("2026-10-01T09:30:00", 1), ("2026-10-01T13:30:00", 2), ("2026-10-02T10:00:00", 3),
+                      ("2026-10-18T09:30:00", 4), ("2026-10-18T13:30:00", 5)):
+        signal_history.record([_row("2330", score), _row("2317", -score)], ts, "scan")
+    assert signal_history.prune(keep_days=7, today="2026-10-19") == 2   # 10/01 兩檔各刪一筆盤中列
+    assert signal_history.history("2330")["score"] == [2, 3, 4, 5]
+    assert signal_history.history("2317")["scanned_at"][0] == "2026-10-01T13:30:00"
+    assert [r["score"] for r in signal_history.latest(["2330"])] == [5]
+    assert signal_history.prune(keep_days=0, today="2026-10-19") == 2   # 10/18 只留收盤列
+    assert signal_history.history("2330")["score"] == [2, 3, 5]
+
+
+def test_record_prunes_once_per_day(monkeypatch):
+    calls = []
+    monkeypatch.setattr(signal_history, "prune", lambda keep_days, today: calls.append(today) or 0)
+    monkeypatch.setattr(signal_history, "_pruned_on", {})
+    for ts in ("2026-10-18T10:00:00", "2026-10-18T11:00:00", "2026-10-19T09:00:00"):
+        signal_history.record([_row("2330", 1)], ts, "scan")
+    assert calls == ["2026-10-18", "2026-10-19"]
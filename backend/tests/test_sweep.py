@@ -0,0 +1,40 @@
+"""參數掃描只算整數得分：與含訊號的向量化版本一致，且不產生訊號字串。"""
+from dataclasses import replace
+
+import numpy as np
+
+import backtest
+import stock_monitor
+import sweep
+
+
+def test_score_vec_matches_score_and_signal_vec(make_frame):
+    ind = backtest.indicator_series(make_frame(400, 1))
+    net_buy = np.where(np.arange(len(ind["close"])) % 3 == 0, np.nan, np.sin(np.arange(len(ind["close"]))))
+    for params in (stock_monitor.DEFAULT_SCORE_PARAMS,
+                   replace(stock_monitor.DEFAULT_SCORE_PARAMS, z_buy=-1.0, rsi_buy=45, rr_good=2.0)):
+        score = stock_monitor.calc_score_vec(ind, net_buy, params)
+        expected, _signal = stock_monitor.calc_score_and_signal_vec(ind, net_buy, params)
+        assert score.dtype == expected.dtype
+        np.testing.assert_array_equal(score, expected)
+
+
+def test_sweep_does_not_build_signal_labels(monkeypatch, make_frame):
+    frames = {"A": make_frame(400, 2), "B": make_frame(400, 3)}
+
+    def forbidden(*args, **kwargs):
+        raise AssertionError("sweep 不應產生訊號字串")
+
+    sets = sweep.grid({"strong_buy": [4, 5], "sell": [-2, -3]})
+    expected = sweep.run_sweep(["A", "B"], sets, frames=frames, workers=1)
+    monkeypatch.setattr(stock_monitor, "calc_score_and_signal_vec", forbidden)
+    monkeypatch.setattr(backtest, "score_series", forbidden)
+    out = sweep.run_sweep(["A", "B"], sets, frames=frames, workers=1)
+    assert out["evaluated"] == 4
+    assert [r["sharpe"] for r in out["results"]] == [r["sharpe"] for r in expected["results"]]
+    # 預設得分路徑與 score_series 一致
+    monkeypatch.undo()
+    ind = backtest.prepare(frames)
+    direct = backtest.evaluate(frames, ind, 5, -3)
+    via_series = backtest.evaluate(frames, ind, 5, -3, scores={t: backtest.score_series(i)[0] for t, i in ind.items()})
+    assert direct == via_series
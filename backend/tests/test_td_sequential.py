@@ -0,0 +1,60 @@
+"""calc_td_sequential_matrix 與逐根迴圈版 _calc_td_sequential 的等價性。"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from stock_monitor import _calc_td_sequential, calc_td_sequential_matrix
+
+
+def _scalar_series(closes: np.ndarray) -> np.ndarray:
+    """每一根 K 棒以「截至該根」的收盤呼叫純量版本。"""
+    return np.array([_calc_td_sequential(pd.DataFrame({"Close": closes[:i + 1]})) for i in range(len(closes))])
+
+
+def _random_walks(n_rows: int, n_bars: int, seed: int) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    steps = rng.choice([-1.0, 0.0, 1.0], size=(n_rows, n_bars), p=[0.45, 0.1, 0.45])
+    return 100 + np.cumsum(steps, axis=1)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_random_walks_match_scalar(seed):
+    closes = _random_walks(8, 120, seed)
+    matrix = calc_td_sequential_matrix(closes)
+    for row, expected in zip(matrix, map(_scalar_series, closes)):
+        np.testing.assert_array_equal(row, expected)
+
+
+def test_long_trends_cap_at_nine():
+    closes = np.vstack([np.arange(40, dtype=float), np.arange(40, 0, -1, dtype=float)])
+    matrix = calc_td_sequential_matrix(closes)
+    assert matrix[0, -1] == 9 and matrix[1, -1] == -9
+    for row, expected in zip(matrix, map(_scalar_series, closes)):
+        np.testing.assert_array_equal(row, expected)
+
+
+def test_flat_series_is_zero():
+    closes = np.full((2, 30), 50.0)
+    np.testing.assert_array_equal(calc_td_sequential_matrix(closes), np.zeros((2, 30), dtype=int))
+
+
+@pytest.mark.parametrize("n_bars", [1, 4, 5, 6])
+def test_short_series(n_bars):
+    closes = _random_walks(3, n_bars, seed=n_bars)
+    matrix = calc_td_sequential_matrix(closes)
+    assert matrix.shape == closes.shape
+    for row, expected in zip(matrix, map(_scalar_series, closes)):
+        np.testing.assert_array_equal(row, expected)
+
+
+def test_left_nan_padding_matches_unpadded_tail():
+    closes = _random_walks(1, 60, seed=7)[0]
+    padded = np.concatenate([np.full(15, np.nan), closes])
+    matrix = calc_td_sequential_matrix(padded)[0]
+    np.testing.assert_array_equal(matrix[15:], _scalar_series(closes))
+    assert not matrix[:15].any()
+
+
+def test_one_dimensional_input():
+    closes = _random_walks(1, 30, seed=3)[0]
+    np.testing.assert_array_equal(calc_td_sequential_matrix(closes)[0], _scalar_series(closes))
@@ -0,0 +1,36 @@
+"""觀察清單輪詢執行緒：無人關注時結束，再次釘選時重新啟動。"""
+import time
+
+import stock_monitor
+import watch_hub
+
+
+def _wait(cond, timeout=2.0):
+    end = time.monotonic() + timeout
+    while time.monotonic() < end:
+        if cond():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+def test_poller_exits_when_nothing_is_watched_and_restarts(monkeypatch):
+    scans = []
+    monkeypatch.setattr(stock_monitor, "check_systemic_risk", lambda: {"flag": False, "msg": ""})
+    monkeypatch.setattr(stock_monitor, "scan_tickers_streaming",
+                        lambda tickers: scans.append(list(tickers)) or {t: {"ticker": t} for t in tickers})
+    hub = watch_hub.WatchHub(interval=60)
+
+    hub.pin("alerts", ["2330"])
+    assert _wait(lambda: scans == [["2330"]])
+    first = hub._thread
+    assert first is not None and first.is_alive()
+
+    hub.pin("alerts", [])
+    first.join(2)
+    assert not first.is_alive() and hub._thread is None and hub.results == {}
+
+    hub.pin("alerts", ["2317"])
+    assert _wait(lambda: scans[-1:] == [["2317"]])
+    assert hub._thread is not None and hub._thread is not first
+    hub.pin("alerts", [])
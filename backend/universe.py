@@ -0,0 +1,102 @@
+"""
+台股全市場標的清單（上市 TWSE + 上櫃 TPEx）。
+
+清單存放於本地 CSV（UNIVERSE_PATH，預設為本模組目錄下的 tw_universe.csv），欄位：
+    ticker,name,market,sector,industry
+market 為 "TWSE" 或 "TPEx"，決定 Yahoo 代號後綴（.TW / .TWO）。
+
+更新清單：python universe.py （從 TWSE ISIN 公開頁面抓上市、上櫃普通股與 ETF）
+"""
+from __future__ import annotations
+
+import csv
+import os
+from dataclasses import dataclass
+
+import requests
+from bs4 import BeautifulSoup
+
+UNIVERSE_PATH = os.environ.get(
+    "UNIVERSE_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tw_universe.csv")
+)
+
+ISIN_URLS = {
+    "TWSE": "https://isin.twse.com.tw/isin/C_public.jsp?strMode=2",
+    "TPEx": "https://isin.twse.com.tw/isin/C_public.jsp?strMode=4",
+}
+# ISIN 頁面的分段標題：只收普通股與 ETF（排除權證、特別股、債券等）
+ISIN_SECTIONS = ("股票", "ETF")
+
+FIELDS = ("ticker", "name", "market", "sector", "industry")
+
+
+@dataclass(frozen=True)
+class Listing:
+    ticker: str
+    name: str
+    market: str = "TWSE"
+    sector: str = ""
+    industry: str = ""
+
+    @property
+    def yahoo_symbol(self) -> str:
+        return f"{self.ticker}.TWO" if self.market == "TPEx" else f"{self.ticker}.TW"
+
+
+def load_listing(path: str = UNIVERSE_PATH) -> list[Listing]:
+    """讀取本地清單；檔案不存在或格式錯誤回傳空 list。"""
+    try:
+        with open(path, encoding="utf-8", newline="") as f:
+            return [
+                Listing(
+                    ticker=row["ticker"].strip(),
+                    name=row.get("name", "").strip(),
+                    market=row.get("market", "TWSE").strip() or "TWSE",
+                    sector=row.get("sector", "").strip(),
+                    industry=row.get("industry", "").strip(),
+                )
+                for row in csv.DictReader(f)
+                if row.get("ticker", "").strip()
+            ]
+    except (OSError, KeyError, csv.Error):
+        return []
+
+
+def save_listing(listings: list[Listing], path: str = UNIVERSE_PATH) -> None:
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(FIELDS)
+        for l in listings:
+            writer.writerow([l.ticker, l.name, l.market, l.sector, l.industry])
+
+
+def fetch_listing() -> list[Listing]:
+    """從 TWSE ISIN 公開頁面抓上市 + 上櫃清單。"""
+    listings: list[Listing] = []
+    for market, url in ISIN_URLS.items():
+        resp = requests.get(url, timeout=30, headers={"User-Agent": "Mozilla/5.0 (compatible)"})
+        resp.raise_for_status()
+        resp.encoding = "cp950"
+        soup = BeautifulSoup(resp.text, "html.parser")
+        section = ""
+        for tr in soup.find_all("tr"):
+            cells = [td.get_text(strip=True) for td in tr.find_all("td")]
+            if len(cells) == 1:
+                section = cells[0]
+                continue
+            # 有價證券代號及名稱 | ISIN | 上市日 | 市場別 | 產業別 | CFICode | 備註
+            if len(cells) < 5 or section not in ISIN_SECTIONS:
+                continue
+            code_name = cells[0].replace("　", " ").split(" ", 1)
+            if len(code_name) != 2:
+                continue
+            ticker, name = code_name[0].strip(), code_name[1].strip()
+            industry = cells[4] or ("ETF" if section == "ETF" else "")
+            listings.append(Listing(ticker, name, market, industry, industry))
+    return listings
+
+
+if __name__ == "__main__":
+    items = fetch_listing()
+    save_listing(items)
+    print(f"Saved {len(items)} listings to {UNIVERSE_PATH}.")
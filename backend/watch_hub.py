@@ -0,0 +1,212 @@
+"""
+觀察清單推播（Server-Sent Events）— 取代用戶端輪詢 /api/stock/scan。
+
+- 用戶端以 GET /api/stock/watch?tickers=... 訂閱；連線期間伺服器主動推送。
+- 單一背景輪詢執行緒合併所有訂閱者的代號（去重），每 WATCH_INTERVAL 秒整批掃描一次
+  （stock_monitor.scan_tickers_streaming：K 棒庫增量同步，指標由串流狀態 O(1) 更新），
+  上游負載只與「不同代號數」有關，與連線數無關。
+- 只推送有變動的欄位；訂閱當下先送一次完整快照。
+- 用戶端佇列滿（太慢）時丟棄增量，下一輪改送完整快照讓它重新同步。
+- 伺服器端元件（如 alerts 警示引擎）可用 pin() 釘選代號、於 listeners 註冊回呼，
+  每輪以 (changes, results) 呼叫（在鎖外執行）。
+- 沒有訂閱者也沒有釘選時輪詢執行緒結束，下次 subscribe() / pin() 再啟動。
+
+事件格式：
+  event: snapshot  data: {"systemic_risk", "systemic_msg", "scanned_at", "results": {ticker: {...}}}
+  event: update    data: {"scanned_at", "systemic_risk"?, "systemic_msg"?, "changes": {ticker: {欄位: 新值}}}
+"""
+from __future__ import annotations
+
+import asyncio
+import datetime
+import itertools
+import json
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Callable
+
+import stock_monitor
+
+WATCH_INTERVAL = float(os.environ.get("WATCH_INTERVAL", "30"))
+WATCH_MAX_TICKERS = 50
+KEEPALIVE_SECONDS = 15
+QUEUE_SIZE = 32
+
+
+@dataclass(eq=False)
+class Subscription:
+    id: int
+    tickers: list[str]
+    loop: asyncio.AbstractEventLoop
+    queue: asyncio.Queue = field(default_factory=lambda: asyncio.Queue(maxsize=QUEUE_SIZE))
+    needs_snapshot: bool = True
+
+
+def _diff(old: dict | None, new: dict) -> dict:
+    if old is None:
+        return new
+    return {k: v for k, v in new.items() if old.get(k) != v}
+
+
+def format_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class WatchHub:
+    def __init__(self, interval: float = WATCH_INTERVAL):
+        self.interval = interval
+        self.subs: dict[int, Subscription] = {}
+        self.pinned: dict[str, list[str]] = {}     # 伺服器端元件釘選的代號（名稱 → 代號）
+        self.listeners: list[Callable[[dict, dict], None]] = []
+        self.results: dict[str, dict] = {}
+        self.systemic: dict = {"flag": False, "msg": ""}
+        self.scanned_at: str | None = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    # ── 訂閱 ─────────────────────────────
+    def subscribe(self, tickers: list[str], loop: asyncio.AbstractEventLoop) -> Subscription:
+        sub = Subscription(next(self._ids), list(dict.fromkeys(tickers))[:WATCH_MAX_TICKERS], loop)
+        with self._lock:
+            self.subs[sub.id] = sub
+            known = all(t in self.results for t in sub.tickers)
+            if known:
+                self._send(sub, self._snapshot(sub))
+        if not known:
+            self._wake.set()  # 有新代號：不等下一輪，立即掃描
+        self._ensure_thread()
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self.subs.pop(sub.id, None)
+            idle = not self._wanted()
+        if idle:
+            self._wake.set()  # 讓輪詢執行緒立即結束
+
+    def pin(self, name: str, tickers: list[str]) -> None:
+        """以 name 釘選一組代號（取代同名的舊清單）；沒有訂閱者時也會持續輪詢。"""
+        with self._lock:
+            if tickers:
+                self.pinned[name] = list(dict.fromkeys(tickers))
+            else:
+                self.pinned.pop(name, None)
+            new = any(t not in self.results for t in tickers)
+        if tickers:
+            if new:
+                self._wake.set()
+            self._ensure_thread()
+        else:
+            self._wake.set()
+
+    def _wanted(self) -> list[str]:
+        subscribed = (t for s in self.subs.values() for t in s.tickers)
+        pinned = (t for ts in self.pinned.values() for t in ts)
+        return list(dict.fromkeys(itertools.chain(subscribed, pinned)))
+
+    def watched(self) -> list[str]:
+        with self._lock:
+            return self._wanted()
+
+    # ── 推送 ─────────────────────────────
+    def _snapshot(self, sub: Subscription) -> tuple[str, dict]:
+        sub.needs_snapshot = False
+        return "snapshot", {
+            "systemic_risk": self.systemic["flag"],
+            "systemic_msg": self.systemic["msg"],
+            "scanned_at": self.scanned_at,
+            "results": {t: self.results[t] for t in sub.tickers if t in self.results},
+        }
+
+    def _send(self, sub: Subscription, message: tuple[str, dict]) -> None:
+        def put() -> None:
+            try:
+                sub.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                sub.needs_snapshot = True
+        try:
+            sub.loop.call_soon_threadsafe(put)
+        except RuntimeError:  # event loop 已關閉
+            self.subs.pop(sub.id, None)
+
+    def publish(self, results: dict[str, dict], systemic: dict) -> None:
+        """套用新一輪掃描結果，對每個訂閱者只送它關心的變動。"""
+        with self._lock:
+            changes = {t: d for t, r in results.items() if (d := _diff(self.results.get(t), r))}
+            systemic_changed = systemic != self.systemic
+            self.results.update(results)
+            self.systemic = systemic
+            self.scanned_at = datetime.datetime.now().isoformat(timespec="seconds")
+            for sub in list(self.subs.values()):
+                if sub.needs_snapshot:
+                    self._send(sub, self._snapshot(sub))
+                    continue
+                mine = {t: changes[t] for t in sub.tickers if t in changes}
+                if not mine and not systemic_changed:
+                    continue
+                data: dict = {"scanned_at": self.scanned_at, "changes": mine}
+                if systemic_changed:
+                    data["systemic_risk"] = systemic["flag"]
+                    data["systemic_msg"] = systemic["msg"]
+                self._send(sub, ("update", data))
+            listeners = list(self.listeners)
+        for listener in listeners:
+            try:
+                listener(changes, results)
+            except Exception:
+                pass
+
+    # ── 輪詢 ─────────────────────────────
+    def poll_once(self) -> None:
+        tickers = self.watched()
+        if not tickers:
+            return
+        systemic = stock_monitor.check_systemic_risk()
+        self.publish(stock_monitor.scan_tickers_streaming(tickers), systemic)
+        # 已無人關注的代號不再保留
+        with self._lock:
+            still = set(self._wanted())
+            for t in [t for t in self.results if t not in still]:
+                del self.results[t]
+
+    def _run(self) -> None:
+        while True:
+            self._wake.clear()
+            with self._lock:
+                if not self._wanted():
+                    # 無人關注：結束執行緒（判斷與 _ensure_thread 同在鎖內，不會漏接新訂閱）
+                    self._thread = None
+                    self.results.clear()
+                    return
+            try:
+                self.poll_once()
+            except Exception:
+                pass
+            self._wake.wait(self.interval)
+
+    def _ensure_thread(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="watch-hub", daemon=True)
+                self._thread.start()
+
+
+hub = WatchHub()
+
+
+async def stream(tickers: list[str]):
+    """SSE 產生器：連線中斷時（generator 被取消）自動退訂。"""
+    sub = hub.subscribe(tickers, asyncio.get_running_loop())
+    try:
+        while True:
+            try:
+                event, data = await asyncio.wait_for(sub.queue.get(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event, data)
+    finally:
+        hub.unsubscribe(sub)